@@ -0,0 +1,13 @@
+"""
+URL configuration for the ASGI application.
+
+Serves the async-native views in brew/async_views.py for products and orders,
+and falls through to app/urls.py for every other route.
+"""
+from django.urls import path, include
+from . import urls
+
+urlpatterns = [
+    path('', include('brew.async_urls')),
+    *urls.urlpatterns,
+]
@@ -12,10 +12,16 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
-from dotenv import load_dotenv
 import os
 
-load_dotenv()
+# STARTUP_MODE=production skips what only development needs, to shorten cold starts:
+# reading a .env file, and the OpenAPI metadata of the views until a schema is generated.
+# Profile startup with `python manage.py profile_startup`.
+STARTUP_MODE = os.getenv('STARTUP_MODE', 'development')
+
+if STARTUP_MODE != 'production':
+    from dotenv import load_dotenv
+    load_dotenv()
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'brew.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,7 +67,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'app.urls'
+# Times every request for the Server-Timing header and /api/metrics/
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', '1') == '1'
+
+# app/asgi.py switches this to app.asgi_urls
+ROOT_URLCONF = os.getenv('DJANGO_ROOT_URLCONF', 'app.urls')
 
 TEMPLATES = [
     {
@@ -84,13 +95,128 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+#
+# DATABASE_PROFILE selects how the SQLite database is opened:
+#   default    - SQLite defaults, a new connection per request
+#   production - WAL journal, busy timeout, persistent connections and IMMEDIATE
+#                write transactions, for concurrent workers
+
+DATABASE_NAME = os.getenv('DATABASE_NAME', BASE_DIR / 'db.sqlite3')
+
+DATABASE_PROFILES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': DATABASE_NAME,
+    },
+    'production': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_NAME,
+        # Keep connections open between requests
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so two readers never
+            # deadlock trying to upgrade to writers
+            'transaction_mode': 'IMMEDIATE',
+            # Run on every new connection
+            'init_command': ';'.join([
+                'PRAGMA journal_mode=WAL',
+                f"PRAGMA busy_timeout={int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', 5000))}",
+                'PRAGMA synchronous=NORMAL',
+                f"PRAGMA cache_size={int(os.getenv('DATABASE_CACHE_SIZE_KB', 20000)) * -1}",
+            ]),
+        },
+    },
 }
 
+DATABASES = {
+    'default': DATABASE_PROFILES[os.getenv('DATABASE_PROFILE', 'default')],
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# CATALOG_CACHE selects the backend for the product catalog cache:
+#   locmem - per-process memory (default)
+#   file   - files in CATALOG_CACHE_LOCATION, shared by every worker on the host
+#   shm    - files in /dev/shm, shared memory for every worker on the host
+
+CATALOG_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'brew-catalog',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CATALOG_CACHE_LOCATION', BASE_DIR / 'catalog_cache'),
+    },
+    'shm': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/dev/shm/brew-catalog-cache',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        **CATALOG_CACHE_BACKENDS[os.getenv('CATALOG_CACHE', 'locmem')],
+        'TIMEOUT': int(os.getenv('CATALOG_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            # Oldest entries are culled once the cache holds this many
+            'MAX_ENTRIES': int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+    # Users resolved by brew.authentication.CachedJWTAuthentication. Changes made in
+    # another process are picked up once the entry times out.
+    'users': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'brew-users',
+        'TIMEOUT': int(os.getenv('USER_CACHE_TIMEOUT', 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+    # Responses stored by brew.idempotency for retried requests, in this process only.
+    # See IDEMPOTENCY_STORE to share them between workers.
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'brew-idempotency',
+        'TIMEOUT': int(os.getenv('IDEMPOTENCY_CACHE_TIMEOUT', 86400)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('IDEMPOTENCY_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
+# Where brew.idempotency claims Idempotency-Key values and stores their responses:
+# 'cache' (default), the `idempotency` cache above, or 'database', the IdempotencyRecord
+# table, so that a duplicate sent to another worker waits for the first request too.
+IDEMPOTENCY_STORE = os.getenv('IDEMPOTENCY_STORE', 'cache')
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.1/topics/auth/passwords/
+#
+# Passwords are hashed on a bounded pool of PASSWORD_HASH_WORKERS threads, with up to
+# PASSWORD_HASH_QUEUE more hashes waiting. Logins and signups beyond that get a 503.
+# PASSWORD_HASH_ITERATIONS sets the PBKDF2 cost, Django's default when unset. Users
+# are rehashed with the new cost the next time they log in.
+
+PASSWORD_HASHERS = [
+    'brew.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 0)) or None
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 8))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -133,12 +259,16 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Defers the @extend_schema metadata and drf-spectacular's AutoSchema until a schema
+# is generated, see brew.openapi.extend_schema
+LAZY_SCHEMA = STARTUP_MODE == 'production'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'brew.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_SCHEMA_CLASS': 'brew.openapi.PendingSchema' if LAZY_SCHEMA else 'drf_spectacular.openapi.AutoSchema',
     'PAGE_SIZE': 10 
 }
 
@@ -147,6 +277,8 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'The Brew Ha Ha API allows third-party applications to access our extensive line of coffee and snack products. As a developer, you can access various endpoints to get a single product, get a collection of products, or place orders. Our API enables seamless integration with popular e-commerce platforms such as Shopify, Wix, and Square.',
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
+    # Also registers the extensions in brew/schema.py
+    'DEFAULT_GENERATOR_CLASS': 'brew.schema.SchemaGenerator',
     'TAGS': [
         {
             'name': 'tokens',
@@ -0,0 +1,145 @@
+"""
+In-process ASGI load benchmark for the sync and async view stacks
+
+Drives Django's ASGIHandler directly with many concurrent requests and
+compares the DRF views (app.urls, run in a thread under ASGI) with the
+async-native views (app.asgi_urls) for products and orders.
+
+Usage:
+    python -m benchmarks.asgi_load --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import setup_django, create_database, destroy_database, get_token, summarize
+
+STACKS = {
+    'sync': 'app.urls',
+    'async': 'app.asgi_urls',
+}
+
+
+async def call(application, method, path, token, body=b''):
+    """
+    Sends one request through an ASGI application and returns (status, body)
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+        'headers': [
+            (b'host', b'testserver'),
+            (b'authorization', f'Bearer {token}'.encode()),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    }
+    finished = asyncio.Event()
+    received = False
+    response = {'body': b''}
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+            if not message.get('more_body'):
+                finished.set()
+
+    await application(scope, receive, send)
+    return response['status'], response['body']
+
+
+async def load(application, requests, concurrency, make_request):
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    latencies = []
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        while not queue.empty():
+            i = queue.get_nowait()
+            started = time.perf_counter()
+            status, _ = await make_request(application, i)
+            latencies.append(time.perf_counter() - started)
+            failures += status >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - started), failures, latencies
+
+
+def run(requests, concurrency):
+    from django.core.handlers.asgi import ASGIHandler
+    from django.test import Client, override_settings
+    from brew.models import Product, Order, OrderItem
+
+    products = Product.objects.bulk_create([
+        Product(product_name=f'product {i}', price=3.0, description='A benchmark product', quantity=10 ** 9)
+        for i in range(50)
+    ])
+    order = Order.objects.create(payment_method='Credit')
+    OrderItem.objects.bulk_create([OrderItem(order=order, product=product, quantity=1) for product in products[:5]])
+    token = get_token(Client())
+    order_body = json.dumps({'payment_method': 'Credit', 'order_items': [{'product_id': products[0].id, 'quantity': 1}]}).encode()
+
+    scenarios = {
+        'GET products': lambda app, i: call(app, 'GET', '/api/products/', token),
+        'GET product': lambda app, i: call(app, 'GET', f'/api/products/{products[i % 50].id}/', token),
+        'GET order': lambda app, i: call(app, 'GET', f'/api/orders/{order.id}/', token),
+        'POST order': lambda app, i: call(app, 'POST', '/api/orders/', token, order_body),
+    }
+
+    results = []
+    application = ASGIHandler()
+    for stack, urlconf in STACKS.items():
+        with override_settings(ROOT_URLCONF=urlconf):
+            for name, make_request in scenarios.items():
+                # Warm up the user and catalog caches
+                asyncio.run(make_request(application, 0))
+                throughput, failures, latencies = asyncio.run(load(application, requests, concurrency, make_request))
+                results.append({'stack': stack, 'scenario': name, 'requests_per_sec': throughput, 'failures': failures, **summarize(latencies)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per scenario and stack')
+    parser.add_argument('--concurrency', type=int, default=50, help='Number of concurrent requests in flight')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database()
+    try:
+        results = run(args.requests, args.concurrency)
+    finally:
+        destroy_database(old_name)
+
+    print(f'{"stack":>6} {"scenario":>13} {"req/sec":>9} {"p50_ms":>8} {"p99_ms":>8} {"failures":>9}')
+    for result in results:
+        print(f'{result["stack"]:>6} {result["scenario"]:>13} {result["requests_per_sec"]:>9.1f} '
+              f'{result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f} {result["failures"]:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Request latency benchmark for JWT user resolution
+
+Measures GET /api/ping/ and GET /api/products/ with simplejwt's
+JWTAuthentication, which loads the user from the database on every
+request, and with CachedJWTAuthentication.
+
+Usage:
+    python -m benchmarks.auth_latency --requests 2000
+"""
+import argparse
+import time
+from unittest.mock import patch
+
+from benchmarks.common import setup_django, create_database, destroy_database, get_token, summarize
+
+URLS = ['/api/ping/', '/api/products/']
+
+
+def run(requests, products):
+    from django.test import Client
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from brew.authentication import CachedJWTAuthentication
+    from brew.models import Product
+    from brew.views import ProductViewSet, PingView
+
+    Product.objects.bulk_create([
+        Product(product_name=f'product {i}', price=3.0, description='A benchmark product', quantity=10)
+        for i in range(products)
+    ])
+    client = Client()
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {get_token(client)}'}
+
+    results = []
+    for authentication in (JWTAuthentication, CachedJWTAuthentication):
+        with patch.object(ProductViewSet, 'authentication_classes', [authentication]), \
+                patch.object(PingView, 'authentication_classes', [authentication]):
+            for url in URLS:
+                # Warm up the catalog and user caches
+                client.get(url, **headers)
+                samples = []
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    client.get(url, **headers)
+                    samples.append(time.perf_counter() - started)
+                results.append({'authentication': authentication.__name__, 'url': url, **summarize(samples)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and authentication class')
+    parser.add_argument('--products', type=int, default=20, help='Number of products to seed')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database()
+    try:
+        results = run(args.requests, args.products)
+    finally:
+        destroy_database(old_name)
+
+    print(f'{"authentication":>24} {"url":>15} {"mean_ms":>8} {"p50_ms":>8} {"p99_ms":>8}')
+    for result in results:
+        print(f'{result["authentication"]:>24} {result["url"]:>15} {result["mean_ms"]:>8.3f} {result["p50_ms"]:>8.3f} {result["p99_ms"]:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Throughput of the import_products and export_products commands
+
+Writes a catalog file of --rows products, imports it into an empty table
+(every row created), imports it again (every row updated) and exports it,
+reporting rows per second and the peak memory of the process after each
+step. Peak memory should stay flat as --rows grows.
+
+Usage:
+    python -m benchmarks.catalog_io --rows 1000000 --format csv
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.common import setup_django, create_database, destroy_database
+
+
+def write_catalog(path, rows, file_format):
+    with open(path, 'w') as file:
+        if file_format == 'csv':
+            file.write('product_name,temperature,caffeine_amount,price,description,quantity\n')
+        for i in range(rows):
+            product = {'product_name': f'product {i}', 'temperature': 'hot', 'caffeine_amount': i % 200, 'price': 3.5, 'description': 'A benchmark product', 'quantity': i % 50}
+            if file_format == 'csv':
+                file.write(','.join(str(value) for value in product.values()) + '\n')
+            else:
+                file.write(json.dumps(product) + '\n')
+
+
+def peak_memory_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(rows, file_format, chunk_size):
+    from io import StringIO
+    from django.core.management import call_command
+
+    directory = tempfile.mkdtemp(prefix='brew-catalog-')
+    source = os.path.join(directory, f'catalog.{file_format}')
+    export = os.path.join(directory, f'export.{file_format}')
+    write_catalog(source, rows, file_format)
+
+    results = []
+    steps = [
+        ('import (create)', 'import_products', source),
+        ('import (update)', 'import_products', source),
+        ('export', 'export_products', export),
+    ]
+    try:
+        for name, command, path in steps:
+            started = time.perf_counter()
+            call_command(command, path, chunk_size=chunk_size, stdout=StringIO())
+            elapsed = time.perf_counter() - started
+            results.append({'step': name, 'rows': rows, 'seconds': elapsed, 'rows_per_sec': rows / elapsed, 'peak_mb': peak_memory_mb()})
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='Number of products in the catalog file')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv', help='Catalog file format')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='Records per chunk')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database()
+    try:
+        baseline = peak_memory_mb()
+        results = run(args.rows, args.format, args.chunk_size)
+    finally:
+        destroy_database(old_name)
+
+    print(f'peak memory before: {baseline:.1f} MB')
+    print(f'{"step":>16} {"rows":>9} {"seconds":>8} {"rows/s":>9} {"peak MB":>8}')
+    for result in results:
+        print(f'{result["step"]:>16} {result["rows"]:>9} {result["seconds"]:>8.1f} {result["rows_per_sec"]:>9.0f} {result["peak_mb"]:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
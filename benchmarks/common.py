@@ -0,0 +1,87 @@
+"""
+Shared helpers for the Brew Ha Ha benchmarks.
+
+Each benchmark runs against a throwaway SQLite database file so it never
+touches db.sqlite3.
+"""
+import os
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """
+    Configures Django for a standalone benchmark run
+    """
+    if str(BASE_DIR) not in sys.path:
+        sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+
+    import django
+    django.setup()
+
+    from django.test.utils import setup_test_environment
+    setup_test_environment(debug=False)
+
+
+def create_database():
+    """
+    Creates and migrates a temporary database file
+    
+    Returns:
+        str: The original database name, needed by destroy_database
+    """
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    fd, path = tempfile.mkstemp(prefix='brew-bench-', suffix='.sqlite3')
+    os.close(fd)
+    connection.settings_dict['TEST']['NAME'] = path
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    return old_name
+
+
+def destroy_database(old_name):
+    """
+    Removes the temporary database created by create_database
+    """
+    from django.db import connection
+
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def get_token(client, username='benchmark', password='benchmark123'):
+    """
+    Signs up a benchmark user and returns a JWT access token
+    """
+    client.post('/api/signup/', {'username': username, 'password': password})
+    response = client.post('/api/tokens/', {'username': username, 'password': password})
+    return response.json()['access']
+
+
+def percentile(samples, pct):
+    """
+    Returns the pct-th percentile of a list of samples
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """
+    Summarizes a list of latencies in seconds as milliseconds
+    """
+    return {
+        'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
@@ -0,0 +1,68 @@
+"""
+Compares two runs of benchmarks.endpoints and fails on regressions
+
+Results are matched by handler, scale and scenario. A result regresses when
+its p95 latency grows, or its throughput drops, by more than the allowed
+fraction, or when it runs more SQL queries per request than allowed. The
+command exits with status 1 if any result regresses, so it can gate a CI job.
+
+Usage:
+    python -m benchmarks.compare baseline.json current.json --latency 0.2 --throughput 0.2 --queries 0
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as results_file:
+        report = json.load(results_file)
+    return {(result['handler'], result['scale'], result['scenario']): result for result in report['results']}
+
+
+def regressions(baseline, current, latency, throughput, queries):
+    """
+    Returns the reasons a result regressed compared to its baseline, empty if it did not
+    """
+    reasons = []
+    if baseline['p95_ms'] and current['p95_ms'] > baseline['p95_ms'] * (1 + latency):
+        reasons.append(f'p95 {baseline["p95_ms"]:.2f} -> {current["p95_ms"]:.2f} ms')
+    if current['requests_per_sec'] < baseline['requests_per_sec'] * (1 - throughput):
+        reasons.append(f'throughput {baseline["requests_per_sec"]:.1f} -> {current["requests_per_sec"]:.1f} req/s')
+    if baseline['queries_per_request'] is not None and current['queries_per_request'] is not None:
+        if current['queries_per_request'] > baseline['queries_per_request'] + queries:
+            reasons.append(f'queries {baseline["queries_per_request"]:.1f} -> {current["queries_per_request"]:.1f} per request')
+    if current['failures'] > baseline['failures']:
+        reasons.append(f'failures {baseline["failures"]} -> {current["failures"]}')
+    return reasons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline', help='JSON results of the baseline run')
+    parser.add_argument('current', help='JSON results of the run to check')
+    parser.add_argument('--latency', type=float, default=0.2, help='Largest allowed p95 latency increase, as a fraction (default: 0.2)')
+    parser.add_argument('--throughput', type=float, default=0.2, help='Largest allowed throughput decrease, as a fraction (default: 0.2)')
+    parser.add_argument('--queries', type=float, default=0, help='Largest allowed increase in queries per request (default: 0)')
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    failed = 0
+    print(f'{"handler":>5} {"scale":>7} {"scenario":>17} {"p95_ms":>17} {"req/sec":>19}  result')
+    for key in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[key], current[key]
+        reasons = regressions(old, new, args.latency, args.throughput, args.queries)
+        failed += bool(reasons)
+        handler, scale, scenario = key
+        print(f'{handler:>5} {scale:>7} {scenario:>17} {old["p95_ms"]:>8.2f} {new["p95_ms"]:>8.2f} '
+              f'{old["requests_per_sec"]:>9.1f} {new["requests_per_sec"]:>9.1f}  {"; ".join(reasons) or "ok"}')
+    for key in sorted(baseline.keys() ^ current.keys()):
+        print(f'{" ".join(map(str, key))} is only in {"the baseline" if key in baseline else "the current run"}, skipped')
+
+    if failed:
+        sys.exit(f'{failed} result(s) regressed.')
+    print('No regressions.')
+
+
+if __name__ == '__main__':
+    main()
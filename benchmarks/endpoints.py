@@ -0,0 +1,307 @@
+"""
+Endpoint benchmark suite for every API route, under WSGI and ASGI
+
+Seeds a deterministic dataset at each scale (N products and N orders of one
+to three items), then sends requests to each route in-process through
+Django's WSGIHandler (app.urls) and ASGIHandler (app.asgi_urls, as served by
+app/asgi.py). For each handler, scale and route it reports throughput, latency
+percentiles, SQL queries per request (from the Server-Timing header) and the
+peak Python memory allocated while handling a request.
+
+Signups and logins hash a password, so they are sent --auth-requests times
+rather than --requests times.
+
+Results are written as JSON for python -m benchmarks.compare.
+
+Usage:
+    python -m benchmarks.endpoints --scales 100 1000 10000 --requests 500 --output baseline.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import re
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+from benchmarks.common import setup_django, create_database, destroy_database, get_token, summarize
+
+HANDLERS = {
+    'wsgi': 'app.urls',
+    'asgi': 'app.asgi_urls',
+}
+AUTH_SCENARIOS = {'signup', 'tokens'}
+QUERY_COUNT = re.compile(r'desc="(\d+) quer')
+
+
+def seed(scale, seed_value):
+    """
+    Creates scale products and scale orders, the same ones for the same seed
+
+    Returns:
+        list: The product ids
+    """
+    from brew.models import Product, Order, OrderItem
+    from brew.analytics import rebuild_sales
+    from brew.serializers import to_amount
+
+    rng = random.Random(seed_value)
+    Product.objects.bulk_create([
+        Product(
+            product_name=f'product {i}',
+            temperature=rng.choice(['hot', 'iced', None]),
+            caffeine_amount=rng.randrange(0, 200),
+            price=rng.randrange(150, 700) / 100,
+            description=f'Benchmark product number {i}',
+            quantity=10 ** 9,
+        )
+        for i in range(scale)
+    ], batch_size=2000)
+    prices = {product_id: to_amount(price) for product_id, price in Product.objects.order_by('id').values_list('id', 'price')}
+    product_ids = list(prices)
+    # Spread over 90 days, so the sales report has a realistic number of rollup rows
+    now = datetime.now(timezone.utc)
+    orders = Order.objects.bulk_create([
+        Order(payment_method=rng.choice(['Credit', 'Debit', 'Cash']), order_date=now - timedelta(days=i % 90))
+        for i in range(scale)
+    ], batch_size=2000)
+    order_items = []
+    for order in orders:
+        for product_id in rng.sample(product_ids, min(len(product_ids), rng.randrange(1, 4))):
+            quantity = rng.randrange(1, 4)
+            order_items.append(OrderItem(order=order, product_id=product_id, quantity=quantity, unit_price=prices[product_id], line_total=prices[product_id] * quantity))
+            order.total += order_items[-1].line_total
+            order.item_count += quantity
+    OrderItem.objects.bulk_create(order_items, batch_size=2000)
+    Order.objects.bulk_update(orders, ['total', 'item_count'], batch_size=2000)
+    rebuild_sales(chunk_size=2000)
+    return product_ids
+
+
+def scenarios(product_ids, order_ids, handler, scale):
+    """
+    Returns the request to send for each route, as a function of the request number
+    """
+    rng = random.Random(scale)
+    products = [rng.choice(product_ids) for _ in range(1000)]
+    orders = [rng.choice(order_ids) for _ in range(1000)]
+
+    def order_body(i):
+        return {'payment_method': 'Credit', 'order_items': [{'product_id': products[i % 1000], 'quantity': 1}]}
+
+    return {
+        'ping': lambda i: ('GET', '/api/ping/', None),
+        'products list': lambda i: ('GET', '/api/products/', None),
+        'product retrieve': lambda i: ('GET', f'/api/products/{products[i % 1000]}/', None),
+        'order create': lambda i: ('POST', '/api/orders/', order_body(i)),
+        'order retrieve': lambda i: ('GET', f'/api/orders/{orders[i % 1000]}/', None),
+        'sales report': lambda i: ('GET', '/api/analytics/sales/?group_by=product&top=10', None),
+        'signup': lambda i: ('POST', '/api/signup/', {'username': f'bench{handler}{scale}n{i}', 'password': 'benchmark123'}),
+        'tokens': lambda i: ('POST', '/api/tokens/', {'username': 'benchmark', 'password': 'benchmark123'}),
+    }
+
+
+def wsgi_request(application, token, method, path, data):
+    """
+    Sends one request through a WSGI application
+
+    Returns:
+        tuple: The status code and the response headers
+    """
+    from django.test import RequestFactory
+
+    body = json.dumps(data) if data is not None else ''
+    environ = RequestFactory().generic(method, path, body, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}').environ
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split()[0])
+        started['headers'] = dict(headers)
+
+    response = application(environ, start_response)
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return started['status'], started['headers']
+
+
+async def asgi_request(application, token, method, path, data):
+    """
+    Sends one request through an ASGI application
+
+    Returns:
+        tuple: The status code and the response headers
+    """
+    body = json.dumps(data).encode() if data is not None else b''
+    url = urlsplit(path)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode(),
+        'query_string': url.query.encode(),
+        'root_path': '',
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+        'headers': [
+            (b'host', b'testserver'),
+            (b'authorization', f'Bearer {token}'.encode()),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    }
+    finished = asyncio.Event()
+    received = False
+    response = {}
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {name.decode(): value.decode() for name, value in message['headers']}
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            finished.set()
+
+    await application(scope, receive, send)
+    return response['status'], response['headers']
+
+
+def measure(send, make_request, requests, memory_requests, offset):
+    """
+    Sends requests one at a time and summarizes them
+
+    A second, shorter pass runs under tracemalloc, which slows requests down, to find
+    the peak memory allocated by one request.
+    """
+    latencies, queries, failures = [], [], 0
+    started = time.perf_counter()
+    for i in range(offset, offset + requests):
+        request_started = time.perf_counter()
+        status, headers = send(*make_request(i))
+        latencies.append(time.perf_counter() - request_started)
+        failures += status >= 400
+        match = QUERY_COUNT.search(headers.get('Server-Timing', ''))
+        if match:
+            queries.append(int(match.group(1)))
+    elapsed = time.perf_counter() - started
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for i in range(offset + requests, offset + requests + memory_requests):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            send(*make_request(i))
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'requests': requests,
+        'failures': failures,
+        'requests_per_sec': requests / elapsed if elapsed else 0.0,
+        **summarize(latencies),
+        'queries_per_request': sum(queries) / len(queries) if queries else None,
+        'peak_memory_kb': peak / 1024,
+    }
+
+
+def run_scale(scale, handlers, requests, auth_requests, memory_requests, seed_value):
+    from django.core.handlers.asgi import ASGIHandler
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.cache import caches
+    from django.test import Client, override_settings
+    from brew.models import Order
+
+    for alias in ('catalog', 'users', 'idempotency'):
+        caches[alias].clear()
+    product_ids = seed(scale, seed_value)
+    order_ids = list(Order.objects.values_list('id', flat=True))
+    token = get_token(Client())
+
+    results = []
+    for handler in handlers:
+        with override_settings(ROOT_URLCONF=HANDLERS[handler]):
+            if handler == 'wsgi':
+                application = WSGIHandler()
+
+                def send(method, path, data):
+                    return wsgi_request(application, token, method, path, data)
+            else:
+                application = ASGIHandler()
+                loop = asyncio.new_event_loop()
+
+                def send(method, path, data):
+                    return loop.run_until_complete(asgi_request(application, token, method, path, data))
+            try:
+                for name, make_request in scenarios(product_ids, order_ids, handler, scale).items():
+                    count = auth_requests if name in AUTH_SCENARIOS else requests
+                    # Warm up the user and catalog caches
+                    send(*make_request(-1))
+                    result = measure(send, make_request, count, min(memory_requests, count), 0)
+                    results.append({'handler': handler, 'scale': scale, 'scenario': name, **result})
+                    print(f'{handler:>5} {scale:>7} {name:>17} {result["requests_per_sec"]:>9.1f} {result["p50_ms"]:>8.2f} '
+                          f'{result["p99_ms"]:>8.2f} {result["queries_per_request"] or 0:>8.1f} {result["peak_memory_kb"]:>10.1f} '
+                          f'{result["failures"]:>9}', flush=True)
+            finally:
+                if handler == 'asgi':
+                    loop.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000, 10000], help='Numbers of products and orders to seed')
+    parser.add_argument('--handlers', choices=list(HANDLERS), nargs='+', default=list(HANDLERS), help='Handlers to benchmark')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per route, handler and scale')
+    parser.add_argument('--auth-requests', type=int, default=20, help='Requests for the signup and tokens routes, which hash a password')
+    parser.add_argument('--memory-requests', type=int, default=20, help='Requests sent under tracemalloc to find the peak memory')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the generated data')
+    parser.add_argument('--output', default='endpoints.json', help='JSON file the results are written to')
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+
+    print(f'{"handler":>5} {"scale":>7} {"scenario":>17} {"req/sec":>9} {"p50_ms":>8} {"p99_ms":>8} {"queries":>8} {"peak_kb":>10} {"failures":>9}')
+    results = []
+    for scale in args.scales:
+        old_name = create_database()
+        try:
+            results += run_scale(scale, args.handlers, args.requests, args.auth_requests, args.memory_requests, args.seed)
+        finally:
+            destroy_database(old_name)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'arguments': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f'Results written to {args.output}.')
+    if any(result['failures'] for result in results):
+        sys.exit('Some requests failed.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Catalog latency under a burst of logins
+
+Runs clients that log in through POST /api/tokens/ in a loop alongside clients
+that read GET /api/products/, and reports catalog latency and login outcomes:
+
+    baseline - catalog traffic only
+    inline   - logins hash on the request thread without a limit (PASSWORD_HASH_WORKERS=0)
+    pooled   - logins hash on the bounded pool, extra logins get a 503
+
+Usage:
+    python -m benchmarks.login_contention --duration 10 --login-threads 8 --catalog-threads 4
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import setup_django, create_database, destroy_database, get_token, summarize
+
+
+def run(mode, token, duration, login_threads, catalog_threads, workers, queue_size):
+    from django.db import connection
+    from django.test import Client
+    from brew.hashers import hashing_pool
+
+    hashing_pool.configure(workers if mode == 'pooled' else 0, queue_size)
+    stop = threading.Event()
+    catalog_samples, logins = [], []
+    lock = threading.Lock()
+
+    def read_catalog():
+        client = Client()
+        samples = []
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}')
+            samples.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            catalog_samples.extend(samples)
+
+    def log_in():
+        client = Client()
+        codes = []
+        while not stop.is_set():
+            codes.append(client.post('/api/tokens/', {'username': 'benchmark', 'password': 'benchmark123'}).status_code)
+            if codes[-1] == 503:
+                # Honour Retry-After loosely so rejected clients keep the pressure on
+                time.sleep(0.05)
+        connection.close()
+        with lock:
+            logins.extend(codes)
+
+    threads = [threading.Thread(target=read_catalog) for _ in range(catalog_threads)]
+    if mode != 'baseline':
+        threads += [threading.Thread(target=log_in) for _ in range(login_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'mode': mode,
+        'catalog_reads': len(catalog_samples),
+        'logins_ok': logins.count(200),
+        'logins_503': logins.count(503),
+        **summarize(catalog_samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run each mode')
+    parser.add_argument('--login-threads', type=int, default=8, help='Number of clients logging in')
+    parser.add_argument('--catalog-threads', type=int, default=4, help='Number of clients reading the catalog')
+    parser.add_argument('--workers', type=int, default=1, help='Hashing pool workers in pooled mode')
+    parser.add_argument('--queue', type=int, default=1, help='Hashing pool queue size in pooled mode')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database()
+    try:
+        from django.test import Client
+        from brew.models import Product
+        token = get_token(Client())
+        Product.objects.bulk_create([
+            Product(product_name=f'product {i}', price=3.0, description='A benchmark product', quantity=10)
+            for i in range(20)
+        ])
+        results = [
+            run(mode, token, args.duration, args.login_threads, args.catalog_threads, args.workers, args.queue)
+            for mode in ('baseline', 'inline', 'pooled')
+        ]
+    finally:
+        destroy_database(old_name)
+
+    columns = list(results[0])
+    print(' '.join(f'{column:>13}' for column in columns))
+    for result in results:
+        print(' '.join(f'{result[column]:>13.2f}' if isinstance(result[column], float) else f'{result[column]!s:>13}' for column in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Throughput benchmark for POST /api/orders/bulk/
+
+Submits the same number of orders one request at a time through
+POST /api/orders/ and in batches of several sizes through the bulk
+endpoint, and reports orders/sec for each.
+
+Usage:
+    python -m benchmarks.order_bulk --orders 1000 --batch-sizes 1 10 100 500
+"""
+import argparse
+import time
+
+from benchmarks.common import setup_django, create_database, destroy_database, get_token
+
+
+def run(orders, batch_sizes, mode):
+    from django.test import Client
+    from brew.models import Product
+
+    products = Product.objects.bulk_create([
+        Product(product_name=f'product {i}', price=3.0, description='A benchmark product', quantity=10 ** 9)
+        for i in range(20)
+    ])
+    client = Client()
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {get_token(client)}'}
+
+    def order(i):
+        return {
+            'payment_method': 'Credit',
+            'order_items': [
+                {'product_id': products[i % 20].id, 'quantity': 1},
+                {'product_id': products[(i + 7) % 20].id, 'quantity': 2},
+            ],
+        }
+
+    results = {}
+    started = time.perf_counter()
+    for i in range(orders):
+        response = client.post('/api/orders/', data=order(i), content_type='application/json', **headers)
+        assert response.status_code == 201, response.content
+    results['single'] = orders / (time.perf_counter() - started)
+
+    for batch_size in batch_sizes:
+        started = time.perf_counter()
+        for offset in range(0, orders, batch_size):
+            batch = [order(i) for i in range(offset, min(offset + batch_size, orders))]
+            response = client.post(f'/api/orders/bulk/?mode={mode}', data=batch, content_type='application/json', **headers)
+            assert response.status_code == 201, response.content
+        results[f'bulk x{batch_size}'] = orders / (time.perf_counter() - started)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=1000, help='Number of orders to submit per run')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 10, 100, 500], help='Bulk batch sizes to measure')
+    parser.add_argument('--mode', choices=['all-or-nothing', 'partial'], default='all-or-nothing', help='Bulk mode')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database()
+    try:
+        results = run(args.orders, args.batch_sizes, args.mode)
+    finally:
+        destroy_database(old_name)
+
+    for name, orders_per_sec in results.items():
+        print(f'{name:>12}: {orders_per_sec:8.1f} orders/sec')
+
+
+if __name__ == '__main__':
+    main()
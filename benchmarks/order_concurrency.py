@@ -0,0 +1,92 @@
+"""
+Concurrency stress benchmark for POST /api/orders/
+
+Fires many simultaneous orders at a single product from a thread pool and
+checks that stock never goes below zero and that the number of accepted
+orders matches the stock that was sold.
+
+Usage:
+    python -m benchmarks.order_concurrency --orders 500 --threads 32 --stock 200
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import setup_django, create_database, destroy_database, get_token, summarize
+
+
+def run(orders, threads, stock, quantity):
+    from django.db import connection
+    from django.test import Client
+    from brew.models import Product, Order, OrderItem
+
+    product = Product.objects.create(product_name='espresso', price=3.0, description='A single shot', quantity=stock)
+    token = get_token(Client())
+    start_barrier = threading.Barrier(threads)
+    local = threading.local()
+
+    def place_order(_):
+        if not hasattr(local, 'client'):
+            local.client = Client(raise_request_exception=False)
+            start_barrier.wait()
+        started = time.perf_counter()
+        response = local.client.post('/api/orders/', data={
+            'payment_method': 'Credit',
+            'order_items': [{'product_id': product.id, 'quantity': quantity}],
+        }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return response.status_code, time.perf_counter() - started
+
+    def close_connection(_):
+        start_barrier.wait()
+        connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(place_order, range(orders)))
+        list(pool.map(close_connection, range(threads)))
+    elapsed = time.perf_counter() - started
+
+    product.refresh_from_db()
+    created = sum(1 for code, _ in results if code == 201)
+    rejected = sum(1 for code, _ in results if code == 400)
+    errors = len(results) - created - rejected
+    sold = OrderItem.objects.filter(product=product).count() * quantity
+
+    return {
+        'orders': orders,
+        'threads': threads,
+        'created': created,
+        'rejected': rejected,
+        'errors': errors,
+        'orders_per_sec': created / elapsed,
+        'requests_per_sec': len(results) / elapsed,
+        'final_stock': product.quantity,
+        'oversold': sold > stock or product.quantity != stock - sold or Order.objects.count() != created,
+        **summarize([latency for _, latency in results]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=500, help='Number of orders to submit')
+    parser.add_argument('--threads', type=int, default=32, help='Number of concurrent clients')
+    parser.add_argument('--stock', type=int, default=200, help='Starting stock of the product')
+    parser.add_argument('--quantity', type=int, default=1, help='Quantity requested by each order')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database()
+    try:
+        result = run(args.orders, args.threads, args.stock, args.quantity)
+    finally:
+        destroy_database(old_name)
+
+    for key, value in result.items():
+        print(f'{key:>17}: {value:.2f}' if isinstance(value, float) else f'{key:>17}: {value}')
+    if result['oversold']:
+        raise SystemExit('Stock was oversold')
+
+
+if __name__ == '__main__':
+    main()
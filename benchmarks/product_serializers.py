@@ -0,0 +1,104 @@
+"""
+Micro-benchmark of ProductSerializer against ProductRowSerializer
+
+Measures rows/sec peak traced memory and allocated blocks for fetching and serializing the
+whole catalog at several catalog sizes, and checks that both serializers
+render the same bytes.
+
+Usage:
+    python -m benchmarks.product_serializers --sizes 1000 10000 100000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from benchmarks.common import setup_django, create_database, destroy_database
+from benchmarks.product_streaming import seed
+
+
+def model_serializer():
+    from brew.models import Product
+    from brew.serializers import ProductSerializer
+
+    return ProductSerializer(Product.objects.all(), many=True).data
+
+
+def row_serializer():
+    from brew.models import Product
+    from brew.serializers import ProductRowSerializer
+
+    serializer = ProductRowSerializer()
+    return serializer.serialize(serializer.select(Product.objects.all()))
+
+
+SERIALIZERS = {
+    'ProductSerializer': model_serializer,
+    'ProductRowSerializer': row_serializer,
+}
+
+
+def measure(serialize, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        serialize()
+        best = min(best, time.perf_counter() - started)
+
+    # Count the memory blocks allocated by the call that are still held by its result
+    gc.collect()
+    tracemalloc.start()
+    data = serialize()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+    del data
+    return best, peak, blocks
+
+
+def run(sizes, repeat):
+    from rest_framework.renderers import JSONRenderer
+    from brew.models import Product
+
+    results = []
+    for size in sizes:
+        Product.objects.all().delete()
+        seed(size)
+        renderer = JSONRenderer()
+        if renderer.render(model_serializer()) != renderer.render(row_serializer()):
+            raise SystemExit(f'Serializers disagree at {size} products')
+
+        for name, serialize in SERIALIZERS.items():
+            best, peak, blocks = measure(serialize, repeat)
+            results.append({
+                'products': size,
+                'serializer': name,
+                'rows_per_sec': size / best,
+                'peak_mb': peak / 1024 / 1024,
+                'blocks': blocks,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Catalog sizes to measure')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per size, the best is reported')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database()
+    try:
+        results = run(args.sizes, args.repeat)
+    finally:
+        destroy_database(old_name)
+
+    print(f'{"products":>9} {"serializer":>21} {"rows/sec":>11} {"peak_mb":>9} {"blocks":>12}')
+    for result in results:
+        print(f'{result["products"]:>9} {result["serializer"]:>21} {result["rows_per_sec"]:>11.0f} '
+              f'{result["peak_mb"]:>9.1f} {result["blocks"]:>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Peak memory and time-to-first-byte benchmark for GET /api/products/
+
+Compares the buffered list response with the ?stream=1 and NDJSON
+streaming modes on a seeded catalog.
+
+Usage:
+    python -m benchmarks.product_streaming --products 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import setup_django, create_database, destroy_database, get_token
+
+MODES = {
+    'buffered': ('/api/products/', {}),
+    'stream': ('/api/products/?stream=1', {}),
+    'ndjson': ('/api/products/', {'HTTP_ACCEPT': 'application/x-ndjson'}),
+}
+
+
+def seed(count):
+    from brew.models import Product
+
+    Product.objects.bulk_create((
+        Product(product_name=f'product {i}', temperature='hot', caffeine_amount=i % 200, price=3.5,
+                description='A benchmark product with a reasonably long description', quantity=i % 50)
+        for i in range(count)
+    ), batch_size=5000)
+
+
+def fetch(client, url, headers):
+    """
+    Returns (time to first byte, total time, body size) for one request
+    """
+    started = time.perf_counter()
+    response = client.get(url, **headers)
+    if response.streaming:
+        size = 0
+        first_byte = None
+        for chunk in response.streaming_content:
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+        response.close()
+    else:
+        first_byte = time.perf_counter() - started
+        size = len(response.content)
+    return first_byte, time.perf_counter() - started, size
+
+
+def run(products):
+    from django.test import Client
+    from brew.cache import catalog_cache
+
+    seed(products)
+    client = Client()
+    headers = {'HTTP_AUTHORIZATION': f'Bearer {get_token(client)}'}
+    results = {}
+
+    for mode, (url, extra) in MODES.items():
+        catalog_cache.cache.clear()
+        first_byte, total, size = fetch(client, url, {**headers, **extra})
+
+        catalog_cache.cache.clear()
+        tracemalloc.start()
+        fetch(client, url, {**headers, **extra})
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results[mode] = {
+            'ttfb_ms': first_byte * 1000,
+            'total_ms': total * 1000,
+            'peak_mb': peak / 1024 / 1024,
+            'body_mb': size / 1024 / 1024,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000, help='Number of products to seed')
+    args = parser.parse_args()
+
+    setup_django()
+    old_name = create_database()
+    try:
+        results = run(args.products)
+    finally:
+        destroy_database(old_name)
+
+    print(f'{"mode":>9} {"ttfb_ms":>10} {"total_ms":>10} {"peak_mb":>9} {"body_mb":>9}')
+    for mode, result in results.items():
+        print(f'{mode:>9} {result["ttfb_ms"]:>10.1f} {result["total_ms"]:>10.1f} {result["peak_mb"]:>9.1f} {result["body_mb"]:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Write-contention benchmark for the SQLite database profiles
+
+Runs a mix of product reads and order writes from several processes,
+each with several threads, against a database opened with each
+DATABASE_PROFILE, and reports throughput and "database is locked" errors.
+
+Usage:
+    python -m benchmarks.sqlite_profiles --processes 4 --threads 4 --seconds 5 --write-ratio 0.2
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import BASE_DIR, setup_django
+
+PROFILES = ['default', 'production']
+PRODUCTS = 100
+
+
+def prepare(profile, path):
+    """
+    Migrates and seeds a fresh database file for a profile
+    """
+    env = {**os.environ, 'DATABASE_PROFILE': profile, 'DATABASE_NAME': path, 'SECRET_KEY': 'benchmark-secret-key'}
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'], cwd=BASE_DIR, env=env, check=True)
+    subprocess.run([sys.executable, '-c', (
+        'from benchmarks.common import setup_django; setup_django(); '
+        'from brew.models import Product; '
+        f'Product.objects.bulk_create([Product(product_name=f"product {{i}}", price=3.0, description="d", quantity=10 ** 9) for i in range({PRODUCTS})])'
+    )], cwd=BASE_DIR, env=env, check=True)
+
+
+def worker(args):
+    """
+    Runs the read/write mix on several threads in one process and returns its counts
+    """
+    profile, path, threads, seconds, write_ratio = args
+    os.environ.update({'DATABASE_PROFILE': profile, 'DATABASE_NAME': path})
+    setup_django()
+
+    from django.db import connection, OperationalError
+    from brew.models import Product
+    from brew.serializers import OrderSerializer, ProductRowSerializer
+
+    counts = {'reads': 0, 'writes': 0, 'locked': 0, 'other_errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def run():
+        serializer = ProductRowSerializer()
+        rng = random.Random()
+        local = {key: 0 for key in counts}
+        while time.perf_counter() < deadline:
+            product_id = rng.randint(1, PRODUCTS)
+            try:
+                if rng.random() < write_ratio:
+                    OrderSerializer.create_many([{
+                        'payment_method': 'Credit',
+                        'order_items': [{'product': {'id': product_id}, 'quantity': 1}],
+                    }])
+                    local['writes'] += 1
+                else:
+                    serializer.to_representation(serializer.select(Product.objects.all()).get(pk=product_id))
+                    local['reads'] += 1
+            except OperationalError as error:
+                local['locked' if 'locked' in str(error) else 'other_errors'] += 1
+        connection.close()
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return counts
+
+
+def run(processes, threads, seconds, write_ratio):
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for profile in PROFILES:
+        fd, path = tempfile.mkstemp(prefix=f'brew-bench-{profile}-', suffix='.sqlite3')
+        os.close(fd)
+        try:
+            prepare(profile, path)
+            with context.Pool(processes) as pool:
+                counts = pool.map(worker, [(profile, path, threads, seconds, write_ratio)] * processes)
+        finally:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        totals = {key: sum(count[key] for count in counts) for key in counts[0]}
+        totals['ops_per_sec'] = (totals['reads'] + totals['writes']) / seconds
+        totals['writes_per_sec'] = totals['writes'] / seconds
+        results[profile] = totals
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4, help='Number of worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per worker process')
+    parser.add_argument('--seconds', type=float, default=5, help='How long each profile runs')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='Fraction of operations that create an order')
+    args = parser.parse_args()
+
+    results = run(args.processes, args.threads, args.seconds, args.write_ratio)
+
+    print(f'{"profile":>11} {"ops/sec":>9} {"writes/sec":>11} {"reads":>8} {"writes":>8} {"locked":>8} {"other":>6}')
+    for profile, result in results.items():
+        print(f'{profile:>11} {result["ops_per_sec"]:>9.1f} {result["writes_per_sec"]:>11.1f} {result["reads"]:>8} '
+              f'{result["writes"]:>8} {result["locked"]:>8} {result["other_errors"]:>6}')
+
+
+if __name__ == '__main__':
+    main()
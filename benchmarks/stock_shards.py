@@ -0,0 +1,98 @@
+"""
+Single-product order throughput with sharded stock
+
+Fires concurrent orders for one product through POST /api/orders/ with its
+stock held in the product row (1 shard) and split across more stock shards,
+and checks that no shard was oversold.
+
+SQLite takes one lock for the whole database on every write, so shards only
+spread row updates, not the write lock. Run with DATABASE_PROFILE=production
+to measure the configuration used in production.
+
+Usage:
+    python -m benchmarks.stock_shards --shards 1 4 16 --orders 2000 --threads 16
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import setup_django, create_database, destroy_database, get_token, summarize
+
+
+def run(shards, orders, threads, token):
+    from django.db import connection
+    from django.test import Client
+    from brew.inventory import shard_stock
+    from brew.models import Product, OrderItem, StockShard
+
+    stock = orders
+    product = Product.objects.create(product_name=f'espresso-{shards}', price=3.0, description='A single shot', quantity=stock)
+    shard_stock(product.id, shards)
+    start_barrier = threading.Barrier(threads)
+    local = threading.local()
+
+    def place_order(_):
+        if not hasattr(local, 'client'):
+            local.client = Client(raise_request_exception=False)
+            start_barrier.wait()
+        started = time.perf_counter()
+        response = local.client.post('/api/orders/', data={
+            'payment_method': 'Credit',
+            'order_items': [{'product_id': product.id, 'quantity': 1}],
+        }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return response.status_code, time.perf_counter() - started
+
+    def close_connection(_):
+        start_barrier.wait()
+        connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(place_order, range(orders)))
+        list(pool.map(close_connection, range(threads)))
+    elapsed = time.perf_counter() - started
+
+    product.refresh_from_db()
+    created = sum(1 for code, _ in results if code == 201)
+    sold = OrderItem.objects.filter(product=product).count()
+    negative_shards = StockShard.objects.filter(product=product, quantity__lt=0).count()
+
+    return {
+        'shards': shards,
+        'created': created,
+        'errors': sum(1 for code, _ in results if code not in (201, 400)),
+        'orders_per_sec': created / elapsed,
+        'final_stock': product.total_quantity,
+        'oversold': negative_shards > 0 or product.total_quantity != stock - sold,
+        **summarize([latency for _, latency in results]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 4, 16], help='Shard counts to compare')
+    parser.add_argument('--orders', type=int, default=2000, help='Number of orders per shard count, equal to the starting stock')
+    parser.add_argument('--threads', type=int, default=16, help='Number of concurrent clients')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+
+    old_name = create_database()
+    try:
+        token = get_token(Client())
+        results = [run(shards, args.orders, args.threads, token) for shards in args.shards]
+    finally:
+        destroy_database(old_name)
+
+    columns = list(results[0])
+    print(' '.join(f'{column:>14}' for column in columns))
+    for result in results:
+        print(' '.join(f'{result[column]:>14.2f}' if isinstance(result[column], float) else f'{result[column]!s:>14}' for column in columns))
+    if any(result['oversold'] for result in results):
+        raise SystemExit('Stock was oversold')
+
+
+if __name__ == '__main__':
+    main()
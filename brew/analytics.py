@@ -0,0 +1,96 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import Order, OrderItem, DailySales
+
+
+def daily_sales(order_items, sign=1):
+    """
+    Sums order items into units and revenue per (day, product)
+
+    Parameters:
+        order_items (iterable): OrderItems, with their order loaded
+        sign (int): 1 to add the items to the rollup, -1 to take them out
+    Returns:
+        dict: [units, revenue] per (day, product_id)
+    """
+    sales = defaultdict(lambda: [0, Decimal(0)])
+    for order_item in order_items:
+        row = sales[timezone.localdate(order_item.order.order_date), order_item.product_id]
+        row[0] += sign * order_item.quantity
+        row[1] += sign * order_item.line_total
+    return sales
+
+
+def add_sales(sales):
+    """
+    Adds units and revenue to the DailySales rollup, inside the caller's transaction
+
+    Missing (day, product) rows are inserted first, skipping the ones that already exist,
+    and then each row is incremented in place by one prepared UPDATE, so concurrent
+    orders never overwrite each other's sales. Like import_products, the UPDATE is run
+    with executemany() rather than as a CASE expression, which takes longer to compile
+    than to run once a rebuild chunk touches thousands of rows.
+
+    Parameters:
+        sales (dict): (units, revenue) per (day, product_id), negative to subtract
+    """
+    if not sales:
+        return
+    DailySales.objects.bulk_create([DailySales(day=day, product_id=product_id) for day, product_id in sales], ignore_conflicts=True)
+
+    fields = {name: DailySales._meta.get_field(name) for name in ('units', 'revenue', 'day', 'product')}
+    quote_name = connection.ops.quote_name
+    sql = 'UPDATE {table} SET {units} = {units} + %s, {revenue} = {revenue} + %s WHERE {day} = %s AND {product} = %s'.format(
+        table=quote_name(DailySales._meta.db_table),
+        **{name: quote_name(field.column) for name, field in fields.items()},
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [
+                fields['units'].get_db_prep_save(units, connection),
+                fields['revenue'].get_db_prep_save(revenue, connection),
+                fields['day'].get_db_prep_save(day, connection),
+                product_id,
+            ]
+            for (day, product_id), (units, revenue) in sales.items()
+        ])
+
+
+def rebuild_sales(chunk_size=1000):
+    """
+    Regenerates the DailySales rollup from the orders, chunk_size orders per transaction
+
+    The rollup is emptied and the highest order id is read in one transaction. Orders
+    up to that id are then summed in the database chunk by chunk, while newer orders add
+    themselves to the rollup as usual, so orders can keep coming in during a rebuild.
+    Stop the order processing workers first: an order canceled in a chunk that has not
+    been summed yet would be taken out of the rollup twice.
+
+    Returns:
+        tuple: The number of orders summed and of DailySales rows afterwards
+    """
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        last_id = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    summed, start_id = 0, 0
+    while start_id < last_id:
+        chunk = list(Order.objects.filter(id__gt=start_id, id__lte=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not chunk:
+            break
+        with transaction.atomic():
+            rows = (
+                OrderItem.objects.filter(order_id__gte=chunk[0], order_id__lte=chunk[-1])
+                .exclude(order__status=Order.CANCELED)
+                .annotate(day=TruncDate('order__order_date'))
+                .values('day', 'product_id')
+                .annotate(units=Sum('quantity'), revenue=Sum('line_total'))
+            )
+            add_sales({(row['day'], row['product_id']): (row['units'], row['revenue']) for row in rows})
+        summed += len(chunk)
+        start_id = chunk[-1]
+    return summed, DailySales.objects.count()
@@ -0,0 +1,430 @@
+"""
+OpenAPI metadata of the views in brew/views.py
+
+Only schema generation needs it, so brew.openapi.apply_view_schemas imports this module
+when the first schema is generated, or at startup in development. The views themselves
+never import it, which keeps drf-spectacular and this metadata out of a production
+process until the schema is requested.
+"""
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiExample, OpenApiParameter, extend_schema
+from .models import Order
+from .serializers import ProductSerializer, OrderSerializer, BulkOrderResultSerializer, SalesQuerySerializer, SalesReportSerializer, BadRequestSerializer, UnauthorizedSerializer, NotFoundSerializer
+from .views import ProductViewSet, UserSignupView, PingView, MetricsView, SalesView, OrderViewSet
+
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        name="fields",
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description="Comma-separated list of fields to return, e.g. `id,product_name,quantity`"
+    ),
+    OpenApiParameter(
+        name="exclude",
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description="Comma-separated list of fields to leave out of the response"
+    ),
+]
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    name="Idempotency-Key",
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.HEADER,
+    required=False,
+    description="Unique value for this request, e.g. a UUID. A retry with the same key returns the first response instead of submitting again."
+)
+
+
+def document_views():
+    """
+    Applies extend_schema to each view method, in the order the views are declared
+    """
+    extend_schema(
+        operation_id="retrieve_products",
+        description="Returns a single product from the database",
+        parameters=SPARSE_FIELDSET_PARAMETERS,
+        responses={
+            200: ProductSerializer,
+            400: BadRequestSerializer,
+            401: UnauthorizedSerializer,
+            404: NotFoundSerializer
+        },
+        examples=[
+            OpenApiExample(
+                name="Successful Response",
+                description="",
+                value=[
+                    {
+                        "id": 1,
+                        "product_name": "mocha",
+                        "temperature": "hot",
+                        "caffeine_amount": 105,
+                        "price": 3.75,
+                        "description": "A rich, decadent blend of espresso and chocolate",
+                        "quantity": 8
+                    },
+                ],
+                status_codes=["200"]
+            ),
+            OpenApiExample(
+                name="Bad Request",
+                description="",
+                value={"detail": "The request body could not be read properly."},
+                response_only=True,
+                status_codes=["400"],
+            ),
+            OpenApiExample(
+                name="Unauthorized",
+                description="",
+                value={"detail": "Authentication credentials were not provided."},
+                response_only=True,
+                status_codes=["401"],
+            ),
+            OpenApiExample(
+                name="Not Found",
+                description="",
+                value={"detail": "No product matches the given query."},
+                response_only=True,
+                status_codes=["404"],
+            ),
+        ]
+    )(ProductViewSet.retrieve)
+
+    extend_schema(
+        operation_id="list_products",
+        description="Returns a list of all products in the database. Large catalogs can be streamed with `?stream=1`, or as newline-delimited JSON with `Accept: application/x-ndjson`.",
+        parameters=[
+            *SPARSE_FIELDSET_PARAMETERS,
+            OpenApiParameter(
+                name="stream",
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Stream the products in chunks instead of building the whole response in memory"
+            ),
+        ],
+        responses={
+            200: ProductSerializer,
+            400: BadRequestSerializer,
+            401: UnauthorizedSerializer,
+            404: NotFoundSerializer
+        },
+        examples=[
+            OpenApiExample(
+                name="Successful Response",
+                description="",
+                value=[
+                        {
+                            "id": 1,
+                            "product_name": "mocha",
+                            "temperature": "hot",
+                            "caffeine_amount": 105,
+                            "price": 3.75,
+                            "description": "A rich, decadent blend of espresso and chocolate",
+                            "quantity": 8
+                        },
+                        {
+                            "id": 2,
+                            "product_name": "muffin",
+                            "price": 2.50,
+                            "description": "A fluffy, warm blueberry muffin",
+                            "quantity": 5
+                        },
+                        {
+                            "id": 3,
+                            "product_name": "cortado",
+                            "temperature": "hot",
+                            "caffeine_amount": 130,
+                            "price": 4.0,
+                            "description": "Made with beans picked from the coast of Spain",
+                            "quantity": 5
+                        }
+                    ],
+                status_codes=["200"]
+            ),
+            OpenApiExample(
+                name="Bad Request",
+                description="",
+                value={"detail": "The request body could not be read properly."},
+                response_only=True,
+                status_codes=["400"],
+            ),
+            OpenApiExample(
+                name="Unauthorized",
+                description="",
+                value={"detail": "Authentication credentials were not provided."},
+                response_only=True,
+                status_codes=["401"],
+            ),
+            OpenApiExample(
+                name="Not Found",
+                description="",
+                value={"detail": "No product matches the given query."},
+                response_only=True,
+                status_codes=["404"],
+            ),
+        ]
+    )(ProductViewSet.list)
+
+    extend_schema(exclude=True)(UserSignupView.post)
+
+    extend_schema(exclude=True)(PingView.get)
+
+    extend_schema(exclude=True)(MetricsView.get)
+
+    extend_schema(
+        operation_id="sales_report",
+        description="Returns the units sold and revenue per day or per product between two dates. Canceled orders are not counted.",
+        parameters=[SalesQuerySerializer],
+        responses={
+            200: SalesReportSerializer,
+            400: BadRequestSerializer,
+            401: UnauthorizedSerializer,
+        },
+        examples=[
+            OpenApiExample(
+                name="Top products",
+                description="GET /api/analytics/sales/?start=2025-01-01&end=2025-01-31&group_by=product&top=1",
+                value={
+                    "start": "2025-01-01",
+                    "end": "2025-01-31",
+                    "group_by": "product",
+                    "currency": "USD",
+                    "units": 12,
+                    "revenue": 45.0,
+                    "results": [
+                        {"product_id": 2, "product_name": "mocha", "units": 12, "revenue": 45.0}
+                    ]
+                },
+                response_only=True,
+                status_codes=["200"],
+            ),
+        ]
+    )(SalesView.get)
+
+    extend_schema(
+        operation_id="list_orders",
+        description="Returns orders from the database, newest first. Follow the `next` link to get the next page.",
+        parameters=[
+            OpenApiParameter(
+                name="status",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Only return orders with this status, e.g. `in progress`"
+            ),
+            OpenApiParameter(
+                name="payment_method",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                enum=[value for value, _ in Order.payment_methods],
+                description="Only return orders paid with this payment method"
+            ),
+            OpenApiParameter(
+                name="order_date_after",
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Only return orders submitted at or after this date and time"
+            ),
+            OpenApiParameter(
+                name="order_date_before",
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Only return orders submitted before this date and time"
+            ),
+            *SPARSE_FIELDSET_PARAMETERS,
+        ],
+        responses={
+            200: OrderSerializer(many=True),
+            400: BadRequestSerializer,
+            401: UnauthorizedSerializer,
+        },
+    )(OrderViewSet.list)
+
+    extend_schema(
+        operation_id="retrieve_orders",
+        description="Returns a single order from the database",
+        parameters=SPARSE_FIELDSET_PARAMETERS,
+        responses={
+            200: OrderSerializer,
+            400: BadRequestSerializer,
+            401: UnauthorizedSerializer,
+            404: NotFoundSerializer
+        },
+        examples=[
+            OpenApiExample(
+                name="Successful Response",
+                description="",
+                value=[
+                    {
+                        "id": "13",
+                        "payment_method": "Credit",
+                        "order_date": "2025-01-11T03:17:47.746025Z",
+                        "status": "in progress",
+                        "total": 3.75,
+                        "item_count": 1,
+                        "currency": "USD",
+                        "order_items": [
+                            {
+                                "product_id": 2,
+                                "quantity": 1,
+                                "unit_price": 3.75,
+                                "line_total": 3.75
+                            }
+                        ]
+                    },
+                ],
+                status_codes=["200"]
+            ),
+            OpenApiExample(
+                name="Bad Request",
+                description="",
+                value={"detail": "The request body could not be read properly."},
+                response_only=True,
+                status_codes=["400"],
+            ),
+            OpenApiExample(
+                name="Unauthorized",
+                description="",
+                value={"detail": "Authentication credentials were not provided."},
+                response_only=True,
+                status_codes=["401"],
+            ),
+            OpenApiExample(
+                name="Not Found",
+                description="",
+                value={"detail": "No product matches the given query."},
+                response_only=True,
+                status_codes=["404"],
+            ),
+        ]
+    )(OrderViewSet.retrieve)
+
+    extend_schema(
+        operation_id="create_order",
+        description="Order available products from the database",
+        parameters=[IDEMPOTENCY_KEY_PARAMETER],
+        responses={
+            201: OrderSerializer,
+            400: BadRequestSerializer,
+            401: UnauthorizedSerializer,
+            404: NotFoundSerializer
+        },
+        examples=[
+            OpenApiExample(
+            name="Example Request",
+            description="Example of a request to create an order",
+            value={
+                "payment_method": "Credit",
+                "order_items": [
+                    {
+                        "product_id": 2,
+                        "quantity": 1,
+                    }
+                ]
+            },
+            request_only=True,  # Indicates this is for the request
+        ),
+            OpenApiExample(
+                name="Example response",
+                description="",
+                value=[
+                    {
+                        "id": 13,
+                        "payment_method": "Credit",
+                        "order_date": "2025-01-11T03:17:47.746025Z",
+                        "status": "in progress",
+                        "total": 3.75,
+                        "item_count": 1,
+                        "currency": "USD",
+                        "order_items": [
+                            {
+                                "product_id": 2,
+                                "quantity": 1,
+                                "unit_price": 3.75,
+                                "line_total": 3.75,
+                            }
+                        ]
+                    },
+                ],
+                status_codes=["201"],
+                response_only=True
+            ),
+            OpenApiExample(
+                name="Bad Request",
+                description="",
+                value={"detail": "The request body could not be read properly."},
+                response_only=True,
+                status_codes=["400"],
+            ),
+            OpenApiExample(
+                name="Unauthorized",
+                description="",
+                value={"detail": "Authentication credentials were not provided."},
+                response_only=True,
+                status_codes=["401"],
+            ),
+            OpenApiExample(
+                name="Not Found",
+                description="",
+                value={"detail": "The requested resource was not found"},
+                response_only=True,
+                status_codes=["404"]
+            )
+        ]
+    )(OrderViewSet.create)
+
+    extend_schema(
+        operation_id="bulk_create_orders",
+        description="Submits several orders in one request. With `mode=all-or-nothing` (the default) either every order is created or none is. With `mode=partial` valid orders are created and the others are returned with their errors.",
+        parameters=[
+            OpenApiParameter(
+                name="mode",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                enum=OrderViewSet.bulk_modes,
+                description="Whether one rejected order rejects the whole batch"
+            ),
+            IDEMPOTENCY_KEY_PARAMETER,
+        ],
+        request=OrderSerializer(many=True),
+        responses={
+            201: BulkOrderResultSerializer(many=True),
+            400: BulkOrderResultSerializer(many=True),
+            401: UnauthorizedSerializer,
+        },
+        examples=[
+            OpenApiExample(
+                name="Example Request",
+                description="Example of a request to create two orders",
+                value=[
+                    {
+                        "payment_method": "Credit",
+                        "order_items": [{"product_id": 2, "quantity": 1}]
+                    },
+                    {
+                        "payment_method": "Debit",
+                        "order_items": [{"product_id": 3, "quantity": 2}]
+                    }
+                ],
+                request_only=True,
+            ),
+            OpenApiExample(
+                name="Example response",
+                description="",
+                value=[
+                    {"id": 14},
+                    {"errors": {"non_field_errors": ["cortado is out of stock."]}}
+                ],
+                status_codes=["201"],
+                response_only=True
+            ),
+        ]
+    )(OrderViewSet.bulk)
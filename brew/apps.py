@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class BrewConfig(AppConfig):
@@ -6,4 +7,8 @@ class BrewConfig(AppConfig):
     name = 'brew'
     
     def ready(self):
-        import brew.schema
+        # brew.schema is loaded through SPECTACULAR_SETTINGS when a schema is generated
+        import brew.signals
+        if not settings.LAZY_SCHEMA:
+            from .openapi import apply_view_schemas
+            apply_view_schemas()
@@ -0,0 +1,10 @@
+from django.urls import path
+from .async_views import AsyncProductListView, AsyncProductDetailView, AsyncOrderCreateView, AsyncOrderDetailView
+
+# Async-native routes, served before brew/urls.py by app/asgi_urls.py
+urlpatterns = [
+    path('api/products/', AsyncProductListView.as_view(), name='async-product-list'),
+    path('api/products/<int:pk>/', AsyncProductDetailView.as_view(), name='async-product-detail'),
+    path('api/orders/', AsyncOrderCreateView.as_view(), name='async-order-list'),
+    path('api/orders/<int:pk>/', AsyncOrderDetailView.as_view(), name='async-order-detail'),
+]
@@ -0,0 +1,187 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, Http404, StreamingHttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from .authentication import CachedJWTAuthentication
+from .cache import catalog_cache
+from .idempotency import IdempotencyStore
+from .instrumentation import timed
+from .models import Product, Order
+from .renderers import NDJSONRenderer, astream_serialized
+from .serializers import ProductRowSerializer, OrderSerializer
+from .views import ProductViewSet, OrderViewSet
+
+
+class AsyncAPIView(View):
+    """
+    Base class for the async-native views served through app/asgi.py.
+    
+    Handles JWT authentication with CachedJWTAuthentication.aauthenticate and renders
+    JSON exactly like the DRF views in brew/views.py. Requests that need a feature only
+    the DRF view has, such as the browsable API or a method without an async handler,
+    are passed to `sync_view`.
+    
+    Attributes:
+        sync_view (callable): The DRF view that serves this route under WSGI
+        sync_query_params (list): Query parameters that are only supported by the sync view
+    """
+    sync_view = None
+    sync_query_params = []
+    authentication = CachedJWTAuthentication()
+    renderer = JSONRenderer()
+    
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Authentication uses JWTs rather than cookies, like the DRF views
+        return csrf_exempt(super().as_view(**initkwargs))
+    
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if handler is None or self.needs_sync_view(request):
+            return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+        
+        try:
+            user_auth = await self.authentication.aauthenticate(request)
+            if user_auth is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = user_auth
+            return await handler(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.error_response(exc)
+        except Http404:
+            return self.error_response(exceptions.NotFound())
+        
+    def needs_sync_view(self, request):
+        """
+        Returns True for requests that only the DRF view can serve
+        """
+        if any(param in request.GET for param in self.sync_query_params):
+            return True
+        accept = request.headers.get('Accept', '')
+        return 'text/html' in accept or (bool(accept) and '*/*' not in accept and 'application/json' not in accept)
+    
+    @timed('render')
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data), content_type='application/json', status=status_code)
+    
+    def error_response(self, exc):
+        """
+        Builds the same response as DRF's exception handler
+        """
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(data, exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response.status_code = status.HTTP_401_UNAUTHORIZED
+            response['WWW-Authenticate'] = self.authentication.authenticate_header(None)
+        return response
+    
+    
+class AsyncProductListView(AsyncAPIView):
+    """
+    Async version of ProductViewSet.list
+    
+    `?stream=1` and NDJSON are streamed from an async iterator, so the catalog is never
+    held in memory. Sparse fieldsets are only served by the DRF view when not streaming.
+    """
+    sync_view = staticmethod(ProductViewSet.as_view({'get': 'list'}))
+    sync_query_params = ['fields', 'exclude', 'format']
+    
+    def needs_sync_view(self, request):
+        if self.streams(request):
+            return 'format' in request.GET
+        return super().needs_sync_view(request)
+    
+    def accepts_ndjson(self, request):
+        """
+        Returns True when content negotiation would pick NDJSONRenderer over JSON or HTML
+        """
+        accept = request.headers.get('Accept', '')
+        return NDJSONRenderer.media_type in accept and 'application/json' not in accept and 'text/html' not in accept
+    
+    def streams(self, request):
+        """
+        Returns True for requests that ProductViewSet.list streams
+        """
+        return self.accepts_ndjson(request) or request.GET.get('stream') in ('1', 'true')
+    
+    async def get(self, request):
+        if self.streams(request):
+            ndjson = self.accepts_ndjson(request)
+            serializer = ProductRowSerializer(fields=ProductViewSet(request=Request(request)).get_sparse_fields())
+            return StreamingHttpResponse(
+                astream_serialized(serializer.select(Product.objects.order_by('pk')), serializer.serialize, ProductViewSet.stream_chunk_size, ndjson),
+                content_type=NDJSONRenderer.media_type if ndjson else 'application/json'
+            )
+        
+        serializer = ProductRowSerializer()
+        
+        async def build():
+            return serializer.serialize([row async for row in serializer.select(Product.objects.all())])
+        
+        return self.render(await catalog_cache.aget_or_set('list', build))
+    
+    
+class AsyncProductDetailView(AsyncAPIView):
+    """
+    Async version of ProductViewSet.retrieve
+    """
+    sync_view = staticmethod(ProductViewSet.as_view({'get': 'retrieve'}))
+    sync_query_params = ['fields', 'exclude', 'format']
+    
+    async def get(self, request, pk):
+        serializer = ProductRowSerializer()
+        
+        async def build():
+            row = await serializer.select(Product.objects.all()).filter(pk=pk).afirst()
+            if row is None:
+                raise exceptions.NotFound("No Product matches the given query.")
+            return serializer.to_representation(row)
+        
+        return self.render(await catalog_cache.aget_or_set(f'product:{pk}', build))
+    
+    
+class AsyncOrderCreateView(AsyncAPIView):
+    """
+    Async version of OrderViewSet.create. Listing orders is served by the DRF view.
+    
+    Validation and the order transaction run in a thread, the response is read with the async ORM.
+    Requests with an Idempotency-Key are served by the DRF view, which may wait for an in-flight duplicate.
+    """
+    sync_view = staticmethod(OrderViewSet.as_view({'get': 'list', 'post': 'create'}))
+    
+    def needs_sync_view(self, request):
+        return IdempotencyStore.header in request.headers or super().needs_sync_view(request)
+    
+    async def post(self, request):
+        try:
+            data = JSONParser().parse(request)
+        except exceptions.ParseError as exc:
+            return self.error_response(exc)
+        
+        serializer = OrderSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return self.render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        order = await sync_to_async(serializer.save)()
+        
+        order = await OrderViewSet.queryset.aget(pk=order.pk)
+        return self.render(OrderSerializer(order).data, status.HTTP_201_CREATED)
+    
+    
+class AsyncOrderDetailView(AsyncAPIView):
+    """
+    Async version of OrderViewSet.retrieve
+    """
+    sync_view = staticmethod(OrderViewSet.as_view({'get': 'retrieve'}))
+    sync_query_params = ['fields', 'exclude', 'format']
+    
+    async def get(self, request, pk):
+        try:
+            order = await OrderViewSet.queryset.aget(pk=pk)
+        except Order.DoesNotExist:
+            raise exceptions.NotFound("No Order matches the given query.")
+        return self.render(OrderSerializer(order).data)
@@ -0,0 +1,86 @@
+from django.core.cache import caches
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def user_cache_key(user_id):
+    return f'user:{user_id}'
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the user from the `users` cache.
+    
+    The first request for a user loads it from the database like JWTAuthentication and
+    caches it. Later requests skip the query until the entry expires or the user is saved
+    or deleted, which removes the entry (see brew/signals.py). The cache is bounded by
+    the `users` alias TIMEOUT and MAX_ENTRIES in the CACHES setting.
+    
+    aauthenticate() is the async counterpart used by the views in brew/async_views.py.
+    """
+    cache_alias = 'users'
+    
+    def get_user(self, validated_token):
+        """
+        Returns the user for a validated token, from the cache when possible
+        """
+        user_id = self.get_user_id(validated_token)
+        user = caches[self.cache_alias].get(user_cache_key(user_id))
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            caches[self.cache_alias].set(user_cache_key(user_id), user)
+        return self.check_user(user, validated_token)
+    
+    async def aauthenticate(self, request):
+        """
+        Async version of authenticate() for a Django HttpRequest
+        
+        Only a cache miss touches the database, through the async ORM.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        
+        user_id = self.get_user_id(validated_token)
+        # The users cache is in local memory, so reading it does not block
+        user = caches[self.cache_alias].get(user_cache_key(user_id))
+        if user is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            caches[self.cache_alias].set(user_cache_key(user_id), user)
+        return self.check_user(user, validated_token), validated_token
+    
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+    
+    def check_user(self, user, validated_token):
+        """
+        Applies the same checks as JWTAuthentication.get_user
+        """
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+        return user
+    
+    @classmethod
+    def invalidate(cls, user_id):
+        """
+        Removes a user from the cache
+        """
+        caches[cls.cache_alias].delete(user_cache_key(user_id))
@@ -0,0 +1,110 @@
+import threading
+import time
+from django.core.cache import caches
+
+
+class CatalogCache:
+    """
+    Versioned cache for the serialized product catalog.
+    
+    Entries are stored under keys that include the current catalog version, so bumping
+    the version invalidates every entry at once. Stale entries are never read again and
+    are evicted by the backend's MAX_ENTRIES culling or their timeout.
+    
+    The backend is the `catalog` alias in the CACHES setting. See CATALOG_CACHE in settings.py.
+    
+    Attributes:
+        alias (str): The CACHES alias the catalog is stored in
+        hits (int): Number of lookups served from the cache by this process
+        misses (int): Number of lookups that had to be rebuilt by this process
+    """
+    version_key = 'catalog:version'
+    
+    def __init__(self, alias='catalog'):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+    @property
+    def cache(self):
+        return caches[self.alias]
+    
+    def get_version(self):
+        """
+        Returns the current catalog version, starting a new one if the backend lost it
+        """
+        version = self.cache.get(self.version_key)
+        if version is None:
+            # Start from the clock so a lost version key can never reuse an old version
+            self.cache.add(self.version_key, time.time_ns(), timeout=None)
+            version = self.cache.get(self.version_key)
+        return version
+    
+    def bump_version(self, **kwargs):
+        """
+        Invalidates every cached catalog entry. Accepts signal keyword arguments.
+        """
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.set(self.version_key, time.time_ns(), timeout=None)
+            
+    def get_or_set(self, name, build):
+        """
+        Returns the entry for name in the current version, building and storing it on a miss
+        
+        Parameters:
+            name (str): The entry name, e.g. 'list' or 'product:4'
+            build (callable): Returns the value to cache. Exceptions are not cached.
+        """
+        key = f'catalog:{self.get_version()}:{name}'
+        value = self.cache.get(key)
+        if value is not None:
+            self._count(hit=True)
+            return value
+        
+        self._count(hit=False)
+        value = build()
+        self.cache.set(key, value)
+        return value
+    
+    async def aget_or_set(self, name, build):
+        """
+        Async version of get_or_set, where build is a coroutine function
+        
+        The catalog backends are local memory or local files, so the cache itself is read
+        directly rather than through a thread.
+        """
+        key = f'catalog:{self.get_version()}:{name}'
+        value = self.cache.get(key)
+        if value is not None:
+            self._count(hit=True)
+            return value
+        
+        self._count(hit=False)
+        value = await build()
+        self.cache.set(key, value)
+        return value
+    
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+                
+    def stats(self):
+        """
+        Returns the hit and miss counters for this process
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'version': self.get_version()}
+        
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingPoolSaturated(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The server is busy, try again shortly."
+    default_code = 'hashing_pool_saturated'
+    # DRF's exception handler sends this as the Retry-After header
+    wait = 1
+
+
+class HashingPool:
+    """
+    Bounded thread pool that password hashing runs on.
+
+    At most `workers` hashes run at a time and at most `queue_size` more wait for a
+    worker. Any request beyond that is rejected with HashingPoolSaturated, a 503, instead
+    of queueing, so a burst of logins cannot take the CPU time product reads need.
+    PBKDF2 releases the GIL while it runs, so the pool threads do not block the rest of
+    the process either.
+
+    The sizes come from the PASSWORD_HASH_WORKERS and PASSWORD_HASH_QUEUE settings the
+    first time the pool is used. With 0 workers hashes run on the calling thread without
+    admission control.
+
+    Attributes:
+        rejected (int): Number of hashes this process rejected because the pool was full
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self.workers = None
+        self.queue_size = None
+        self.rejected = 0
+
+    def configure(self, workers, queue_size):
+        """
+        Replaces the pool with one of a new size
+        """
+        with self._lock:
+            self._configure(workers, queue_size)
+
+    def _configure(self, workers, queue_size):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher') if workers else None
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self.queue_size = queue_size
+        # Set last, run() reads it without the lock
+        self.workers = workers
+
+    def disable(self):
+        """
+        Hashes on the calling thread from now on, e.g. in a worker process forked from a server
+
+        A forked process inherits the pool object but not its threads, so it must not be used there.
+        """
+        with self._lock:
+            self._executor = None
+            self._slots = None
+            self.workers = 0
+
+    def run(self, func, *args, **kwargs):
+        """
+        Runs func on the pool and returns its result
+
+        Raises:
+            HashingPoolSaturated: If every worker is busy and the queue is full
+        """
+        if self.workers is None:
+            with self._lock:
+                if self.workers is None:
+                    self._configure(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE)
+        if not self.workers:
+            return func(*args, **kwargs)
+
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingPoolSaturated()
+        try:
+            return self._executor.submit(func, *args, **kwargs).result()
+        finally:
+            slots.release()
+
+
+hashing_pool = HashingPool()
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher, run on hashing_pool with a configurable cost.
+
+    The iteration count comes from the PASSWORD_HASH_ITERATIONS setting, e.g. lower in
+    development than in production. Passwords hashed with another count still verify,
+    and Django rehashes them with the current count the next time the user logs in.
+    The algorithm name is unchanged, so existing hashes keep working.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+    def encode(self, password, salt, iterations=None):
+        # verify() and harden_runtime() also hash through encode()
+        return hashing_pool.run(super().encode, password, salt, iterations)
@@ -0,0 +1,207 @@
+import hashlib
+import itertools
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from .models import IdempotencyRecord
+
+
+class IdempotencyStore:
+    """
+    Stores the first response for each `Idempotency-Key` so retries are replayed instead of run again.
+
+    The first request with a key claims it atomically and runs. Duplicates that arrive
+    while it is in flight poll the store until its response is saved, then replay it.
+    Replays never run the view, so they do not touch orders or stock.
+
+    Successful and client error responses are stored for the `idempotency` cache timeout.
+    Server errors and exceptions release the key so the client can retry.
+
+    This store keeps the keys in the `idempotency` alias of the CACHES setting, in the
+    memory of one process, so duplicates only wait for each other within a worker. Use
+    DatabaseIdempotencyStore, with IDEMPOTENCY_STORE=database, to deduplicate across workers.
+
+    Attributes:
+        alias (str): The CACHES alias responses are stored in
+        lock_timeout (int): Seconds before an in-flight claim from a crashed worker expires
+        wait_timeout (float): Seconds a duplicate waits for the in-flight request before giving up with a 409
+        wait_interval (float): Seconds between polls while waiting
+    """
+    header = 'Idempotency-Key'
+    max_key_length = 255
+
+    def __init__(self, alias='idempotency', lock_timeout=60, wait_timeout=10, wait_interval=0.05):
+        self.alias = alias
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.wait_interval = wait_interval
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def claim(self, key, fingerprint):
+        """
+        Claims key for a request that is about to run
+
+        Returns:
+            bool: False if the key is already claimed or has a stored response
+        """
+        return self.cache.add(key, {'fingerprint': fingerprint, 'response': None}, timeout=self.lock_timeout)
+
+    def load(self, key):
+        """
+        Returns the fingerprint and, once stored, the (status code, data) response of a claimed key, or None
+        """
+        return self.cache.get(key)
+
+    def save(self, key, fingerprint, response):
+        # Store plain data so the entry can be pickled by any backend
+        self.cache.set(key, {'fingerprint': fingerprint, 'response': (response.status_code, response.data)})
+
+    def release(self, key):
+        self.cache.delete(key)
+
+    def run(self, key, fingerprint, handler):
+        """
+        Returns the stored response for key, or runs handler and stores its response
+
+        Parameters:
+            key (str): The cache key, already scoped to the user and route
+            fingerprint (str): Identifies the request body. A key reused with another body is rejected.
+            handler (callable): Runs the request and returns a DRF Response
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            if self.claim(key, fingerprint):
+                return self._run_first(key, fingerprint, handler)
+
+            entry = self.load(key)
+            if entry is None:
+                # The first request failed or its claim expired, try to claim the key again
+                continue
+            if entry['fingerprint'] != fingerprint:
+                return Response(
+                    {"detail": f"This {self.header} was already used with a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if entry['response'] is not None:
+                status_code, data = entry['response']
+                return Response(data, status=status_code, headers={'Idempotent-Replayed': 'true'})
+            if time.monotonic() >= deadline:
+                return Response(
+                    {"detail": f"A request with this {self.header} is still in progress."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            time.sleep(self.wait_interval)
+
+    def _run_first(self, key, fingerprint, handler):
+        try:
+            response = handler()
+        except BaseException:
+            self.release(key)
+            raise
+        if response.status_code >= 500:
+            self.release(key)
+        else:
+            self.save(key, fingerprint, response)
+        return response
+
+
+class DatabaseIdempotencyStore(IdempotencyStore):
+    """
+    IdempotencyStore that keeps the keys in the IdempotencyRecord table, shared by every worker
+
+    A key is claimed by inserting its row, which the unique constraint on the key makes
+    atomic across processes. The claim commits before the request runs, so the other
+    workers see it and wait. Expired rows are deleted when their key is next used, and
+    all of them every purge_interval claims.
+
+    Attributes:
+        purge_interval (int): Claims between two deletions of every expired row
+    """
+    purge_interval = 1000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._claims = itertools.count(1)
+
+    def claim(self, key, fingerprint):
+        now = timezone.now()
+        if next(self._claims) % self.purge_interval == 0:
+            IdempotencyRecord.objects.filter(expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                IdempotencyRecord.objects.create(key=key, fingerprint=fingerprint, expires_at=now + timedelta(seconds=self.lock_timeout))
+        except IntegrityError:
+            return False
+        return True
+
+    def load(self, key):
+        now = timezone.now()
+        record = IdempotencyRecord.objects.filter(key=key, expires_at__gt=now).first()
+        if record is None:
+            # Lets the key be claimed again if its claim or response has expired
+            IdempotencyRecord.objects.filter(key=key, expires_at__lte=now).delete()
+            return None
+        response = None if record.status_code is None else (record.status_code, record.response)
+        return {'fingerprint': record.fingerprint, 'response': response}
+
+    def save(self, key, fingerprint, response):
+        IdempotencyRecord.objects.filter(key=key).update(
+            status_code=response.status_code,
+            response=response.data,
+            expires_at=timezone.now() + timedelta(seconds=self.cache.default_timeout),
+        )
+
+    def release(self, key):
+        IdempotencyRecord.objects.filter(key=key).delete()
+
+
+idempotency_store = DatabaseIdempotencyStore() if settings.IDEMPOTENCY_STORE == 'database' else IdempotencyStore()
+
+
+def request_fingerprint(request):
+    """
+    Returns a hash of the parsed request body
+    """
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def idempotent(view_method):
+    """
+    Decorator for view methods that honours the `Idempotency-Key` header.
+
+    Keys are scoped to the authenticated user and the request path. Requests
+    without the header run as usual.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IdempotencyStore.header)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyStore.max_key_length:
+            return Response(
+                {"detail": f"{IdempotencyStore.header} must be at most {IdempotencyStore.max_key_length} characters."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        def handler():
+            try:
+                return view_method(self, request, *args, **kwargs)
+            except APIException as exc:
+                # Store errors such as an out of stock rejection like any other client error
+                return self.handle_exception(exc)
+
+        scoped_key = 'idempotency:' + hashlib.sha256(f'{request.user.pk}:{request.path}:{key}'.encode()).hexdigest()
+        return idempotency_store.run(scoped_key, request_fingerprint(request), handler)
+    return wrapper
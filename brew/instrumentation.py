@@ -0,0 +1,287 @@
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# The timings of the request being handled. asgiref copies the context into the threads
+# sync views and ORM calls run in, so they record into the same RequestTimings.
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Time spent in each phase of one request.
+
+    Phases can overlap, e.g. queries run while a serializer walks a relation count
+    towards both 'db' and 'serialize'.
+
+    Attributes:
+        queries (int): Number of SQL queries run
+        phases (dict): Seconds spent per phase: 'db', 'view', 'serialize' and 'render'
+        active (set): Phases being timed right now, so nested calls are only counted once
+    """
+    __slots__ = ('started', 'queries', 'phases', 'active', 'view_started', 'view_finished')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.phases = {'db': 0.0, 'view': 0.0, 'serialize': 0.0, 'render': 0.0}
+        self.active = set()
+        self.view_started = None
+        self.view_finished = None
+
+    def server_timing(self, total):
+        """
+        Returns the value of the Server-Timing header, in milliseconds
+        """
+        phases = self.phases
+        queries = '1 query' if self.queries == 1 else f'{self.queries} queries'
+        return (
+            f'db;dur={phases["db"] * 1000:.2f};desc="{queries}", '
+            f'view;dur={phases["view"] * 1000:.2f}, '
+            f'serialize;dur={phases["serialize"] * 1000:.2f}, '
+            f'render;dur={phases["render"] * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+
+
+def timed(phase):
+    """
+    Decorator that adds the time spent in a function to a phase of the current request
+
+    Calls made outside a request, or inside another call timed for the same phase, only
+    cost a context variable lookup.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None or phase in timings.active:
+                return func(*args, **kwargs)
+            timings.active.add(phase)
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.phases[phase] += perf_counter() - started
+                timings.active.discard(phase)
+        return wrapper
+    return decorator
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that counts the queries of the current request and times them
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.phases['db'] += perf_counter() - started
+
+
+def install_query_timer(connection, **kwargs):
+    """
+    Adds time_query to a connection's execute wrappers. Accepts signal keyword arguments.
+    """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class RequestMetrics:
+    """
+    Per-view latency histograms and counters, aggregated in memory by each process.
+
+    Series are keyed by the view name of the matched URL pattern and the HTTP method, so
+    their number is bounded by the routes rather than by the URLs requested.
+
+    Attributes:
+        buckets (tuple): Upper bounds of the latency histogram buckets, in seconds
+    """
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    phases = ('db', 'view', 'serialize', 'render')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+            self._responses = {}
+
+    def record(self, view, method, status_code, timings, duration):
+        key = (view, method)
+        bucket = bisect_left(self.buckets, duration)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'buckets': [0] * (len(self.buckets) + 1),
+                    'sum': 0.0,
+                    'count': 0,
+                    'queries': 0,
+                    'phases': dict.fromkeys(self.phases, 0.0),
+                }
+            series['buckets'][bucket] += 1
+            series['sum'] += duration
+            series['count'] += 1
+            series['queries'] += timings.queries
+            for phase, seconds in timings.phases.items():
+                series['phases'][phase] += seconds
+            response_key = (view, method, status_code)
+            self._responses[response_key] = self._responses.get(response_key, 0) + 1
+
+    def snapshot(self):
+        """
+        Returns a copy of the series and response counters
+        """
+        with self._lock:
+            series = {
+                key: {**values, 'buckets': list(values['buckets']), 'phases': dict(values['phases'])}
+                for key, values in self._series.items()
+            }
+            return series, dict(self._responses)
+
+    def render(self, gauges=()):
+        """
+        Returns the metrics in the Prometheus text exposition format
+
+        Parameters:
+            gauges (iterable): Extra (name, type, help, value) samples without labels
+        """
+        series, responses = self.snapshot()
+        lines = [
+            '# HELP brew_http_request_duration_seconds Time to handle a request, by view and method',
+            '# TYPE brew_http_request_duration_seconds histogram',
+        ]
+        for (view, method), values in sorted(series.items()):
+            labels = f'view="{escape_label(view)}",method="{escape_label(method)}"'
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), values['buckets']):
+                cumulative += count
+                lines.append(f'brew_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'brew_http_request_duration_seconds_sum{{{labels}}} {values["sum"]:.6f}')
+            lines.append(f'brew_http_request_duration_seconds_count{{{labels}}} {values["count"]}')
+
+        lines += [
+            '# HELP brew_http_responses_total Responses sent, by view, method and status code',
+            '# TYPE brew_http_responses_total counter',
+        ]
+        for (view, method, status_code), count in sorted(responses.items()):
+            lines.append(f'brew_http_responses_total{{view="{escape_label(view)}",method="{escape_label(method)}",status="{status_code}"}} {count}')
+
+        lines += [
+            '# HELP brew_http_db_queries_total SQL queries run by requests, by view and method',
+            '# TYPE brew_http_db_queries_total counter',
+        ]
+        for (view, method), values in sorted(series.items()):
+            lines.append(f'brew_http_db_queries_total{{view="{escape_label(view)}",method="{escape_label(method)}"}} {values["queries"]}')
+
+        lines += [
+            '# HELP brew_http_phase_seconds_total Time spent per request phase, by view and method',
+            '# TYPE brew_http_phase_seconds_total counter',
+        ]
+        for (view, method), values in sorted(series.items()):
+            for phase in self.phases:
+                lines.append(
+                    f'brew_http_phase_seconds_total{{view="{escape_label(view)}",method="{escape_label(method)}",phase="{phase}"}} {values["phases"][phase]:.6f}'
+                )
+
+        for name, metric_type, help_text, value in gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_metrics = RequestMetrics()
+
+
+class InstrumentationMiddleware:
+    """
+    Times every request and records it in request_metrics.
+
+    The response gets a Server-Timing header with the number of SQL queries, the time
+    spent in the database, the view, serializers and rendering, and the total. Browsers
+    show it in their developer tools.
+
+    Queries are timed by an execute wrapper on each database connection, serializers by
+    the @timed('serialize') methods and DRF responses by a post-render callback. Put the
+    middleware near the top of MIDDLEWARE so the total covers the other middleware.
+    Set REQUEST_METRICS to False to leave it out, along with the execute wrapper.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Connections are per thread, so every new one gets the wrapper as it connects,
+        # and the ones opened before the middleware was loaded, e.g. by the test runner, now
+        connection_created.connect(install_query_timer)
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called between the view returning a DRF Response and the response being rendered
+        timings = _current.get()
+        if timings is not None:
+            timings.view_finished = started = perf_counter()
+
+            def record_render(response):
+                timings.phases['render'] += perf_counter() - started
+
+            response.add_post_render_callback(record_render)
+        return response
+
+    def finish(self, request, response, timings):
+        finished = perf_counter()
+        if timings.view_started is not None:
+            timings.phases['view'] = (timings.view_finished or finished) - timings.view_started
+        total = finished - timings.started
+
+        match = request.resolver_match
+        request_metrics.record(match.view_name if match else 'unmatched', request.method, response.status_code, timings, total)
+        response['Server-Timing'] = timings.server_timing(total)
+        return response
@@ -0,0 +1,110 @@
+import random
+from django.db import transaction
+from django.db.models import Case, When, F, Sum
+from .cache import catalog_cache
+from .models import Product, StockShard
+
+
+def shard_stock(product_id, shards):
+    """
+    Splits a product's stock evenly across a number of StockShard rows
+
+    Existing shards and the stock in the product row are merged first, so this also
+    reshards a product. With shards of 1 or less the stock is moved back into the product row.
+
+    Parameters:
+        product_id (int): The product to shard
+        shards (int): The number of shards
+    Returns:
+        Product: The updated product
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(pk=product_id)
+        total = product.quantity + (product.shards.aggregate(total=Sum('quantity'))['total'] or 0)
+        product.shards.all().delete()
+
+        if shards <= 1:
+            product.quantity, product.stock_shards = total, 0
+        else:
+            base, extra = divmod(total, shards)
+            StockShard.objects.bulk_create([
+                StockShard(product=product, shard=shard, quantity=base + (shard < extra))
+                for shard in range(shards)
+            ])
+            product.quantity, product.stock_shards = 0, shards
+        # Saving the product also invalidates the cached catalog
+        product.save(update_fields=['quantity', 'stock_shards'])
+    return product
+
+
+def decrement_shards(product_id, shards, quantity):
+    """
+    Takes quantity from a sharded product's stock, inside the caller's transaction
+
+    A random shard is tried first so concurrent orders update different rows. If it
+    does not have enough, another shard that does is used, and failing that the
+    quantity is taken from several shards. Each update is conditional on the shard
+    still having the stock, so a shard never goes below zero.
+
+    Parameters:
+        product_id (int): The product to take stock from
+        shards (int): The product's number of shards
+        quantity (int): The quantity to take
+    Returns:
+        bool: False if the shards do not hold enough stock, in which case the caller must roll back
+    """
+    product_shards = StockShard.objects.filter(product_id=product_id)
+    start = random.randrange(shards)
+    if product_shards.filter(shard=start, quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+        return True
+
+    # Visit the shards after the random one first, so fallbacks are spread out too
+    available = sorted(
+        product_shards.filter(quantity__gt=0).values_list('shard', 'quantity'),
+        key=lambda row: (row[0] - start) % shards
+    )
+    if sum(shard_quantity for _, shard_quantity in available) < quantity:
+        return False
+
+    enough = [shard for shard, shard_quantity in available if shard_quantity >= quantity]
+    if enough:
+        takes = [(enough[0], quantity)]
+    else:
+        takes, remaining = [], quantity
+        for shard, shard_quantity in available:
+            takes.append((shard, min(remaining, shard_quantity)))
+            remaining -= takes[-1][1]
+            if not remaining:
+                break
+
+    for shard, take in takes:
+        if not product_shards.filter(shard=shard, quantity__gte=take).update(quantity=F('quantity') - take):
+            return False
+    return True
+
+
+def restock(requested):
+    """
+    Returns stock to products, e.g. for canceled orders
+
+    Products in the product row get it back with one update, sharded products
+    in a random shard.
+
+    Parameters:
+        requested (dict): The quantity to return per product id
+    """
+    if not requested:
+        return
+    sharded = dict(Product.objects.filter(id__in=requested, stock_shards__gt=0).values_list('id', 'stock_shards'))
+    unsharded = {product_id: quantity for product_id, quantity in requested.items() if product_id not in sharded}
+    if unsharded:
+        Product.objects.filter(id__in=unsharded).update(
+            quantity=Case(
+                *[When(id=product_id, then=F('quantity') + quantity) for product_id, quantity in unsharded.items()],
+                default=F('quantity'),
+            )
+        )
+    for product_id, shards in sharded.items():
+        StockShard.objects.filter(product_id=product_id, shard=random.randrange(shards)).update(quantity=F('quantity') + requested[product_id])
+    # Cached products could be rebuilt from the old stock until the caller's transaction commits
+    transaction.on_commit(catalog_cache.bump_version)
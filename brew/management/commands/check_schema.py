@@ -0,0 +1,45 @@
+import difflib
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from brew.openapi import SchemaArtifact, generate_schema
+
+
+class Command(BaseCommand):
+    """
+    Fails when the committed schema.yml no longer matches the schema generated from the views.
+
+    Run it in CI after changing a view, serializer or @extend_schema block. With --write
+    the file is regenerated instead, the same as `manage.py spectacular --file schema.yml`.
+    """
+    help = "Checks that schema.yml matches the OpenAPI schema generated from the views"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=str(settings.BASE_DIR / 'schema.yml'), help="Schema file to check (default: schema.yml)")
+        parser.add_argument('--write', action='store_true', help="Regenerate the file instead of checking it")
+
+    def handle(self, *args, **options):
+        path = options['file']
+        generated = SchemaArtifact(generate_schema()).bodies['yaml', 'identity']
+        if options['write']:
+            with open(path, 'wb') as schema_file:
+                schema_file.write(generated)
+            self.stdout.write(f"Wrote {path}.")
+            return
+
+        try:
+            with open(path, 'rb') as schema_file:
+                committed = schema_file.read()
+        except FileNotFoundError:
+            raise CommandError(f"{path} does not exist, create it with --write.")
+        if committed == generated:
+            self.stdout.write(f"{path} is up to date.")
+            return
+
+        diff = difflib.unified_diff(
+            committed.decode().splitlines(keepends=True),
+            generated.decode().splitlines(keepends=True),
+            fromfile=path,
+            tofile='generated',
+        )
+        self.stdout.write(''.join(diff))
+        raise CommandError(f"{path} is stale, regenerate it with `manage.py check_schema --write`.")
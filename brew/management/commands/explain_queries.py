@@ -0,0 +1,54 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+from brew.models import Product, Order, OrderItem, StockShard
+from brew.pagination import KeysetPagination
+from brew.serializers import ProductRowSerializer
+
+
+class Command(BaseCommand):
+    """
+    Prints the SQLite query plan for each main query the API issues.
+    
+    Use it to check that the indexes are used as the tables grow, e.g. a plan that
+    says SCAN instead of SEARCH ... USING INDEX for a filtered query.
+    """
+    help = "Prints EXPLAIN QUERY PLAN for the main queries the API issues"
+    
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write(f"EXPLAIN QUERY PLAN output is SQLite specific, this database is {connection.vendor}.")
+        
+        for name, queryset in self.get_queries():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain())
+            self.stdout.write('')
+            
+    def get_queries(self):
+        """
+        Returns (name, queryset) for each query, built the way the API builds it
+        """
+        product_id = Product.objects.values_list('id', flat=True).first() or 1
+        order_id = Order.objects.values_list('id', flat=True).first() or 1
+        since = timezone.now() - timedelta(days=30)
+        serializer = ProductRowSerializer()
+        
+        return [
+            ("GET /api/products/", serializer.select(Product.objects.all())),
+            ("GET /api/products/{id}/", serializer.select(Product.objects.filter(pk=product_id))),
+            ("GET /api/orders/{id}/ order", Order.objects.filter(pk=order_id)),
+            # The prefetch OrderViewSet.queryset runs for the order's items
+            ("GET /api/orders/{id}/ items and products", OrderItem.objects.select_related('product').filter(order_id__in=[order_id])),
+            ("POST /api/orders/ product validation", Product.objects.filter(id__in=[product_id]).values_list('id', flat=True)),
+            ("POST /api/orders/ stock update rows", Product.objects.filter(id=product_id, stock_shards=0, quantity__gte=1)),
+            ("POST /api/orders/ stock shard update rows", StockShard.objects.filter(product_id=product_id, shard=0, quantity__gte=1)),
+            ("Orders by status, newest first", Order.objects.filter(status="in progress").order_by('-order_date', '-id')),
+            # The cursor condition of every page after the first, see KeysetPagination.after
+            ("GET /api/orders/?cursor=", Order.objects.filter(KeysetPagination().after(since, order_id)).order_by('-order_date', '-id')),
+            ("Orders by date range", Order.objects.filter(order_date__gte=since).order_by('order_date', 'id')),
+            ("Order items of a product by order", OrderItem.objects.filter(product_id=product_id).order_by('order_id')),
+            ("Units sold per product", OrderItem.objects.values('product_id').annotate(units=Sum('quantity')).order_by('product_id')),
+        ]
@@ -0,0 +1,62 @@
+import csv
+import json
+import time
+from django.core.management.base import BaseCommand
+from brew.models import Product
+from brew.records import detect_format
+
+
+class Command(BaseCommand):
+    """
+    Writes every product to a CSV or JSONL file that import_products can read back.
+    
+    Products are read in order of id with a chunked iterator, --chunk-size rows per
+    fetch, so memory use does not depend on the size of the catalog. Quantities
+    include the stock held in stock shards.
+    """
+    help = "Writes every product to a CSV or JSONL file"
+    fields = ['product_name', 'temperature', 'caffeine_amount', 'price', 'description', 'quantity']
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help="File to write (default: standard output)")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Output format (default: from the file extension, CSV for standard output)")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched from the database at a time (default: 2000)")
+        
+    def handle(self, *args, **options):
+        path = options['path']
+        output_format = detect_format(path or '', options['format'])
+        rows = Product.objects.with_total_quantity().order_by('pk').values_list(
+            *['stock_total' if name == 'quantity' else name for name in self.fields]
+        ).iterator(chunk_size=options['chunk_size'])
+        
+        started = time.perf_counter()
+        output = open(path, 'w', newline='') if path else self.stdout
+        try:
+            count = self.write(output, output_format, rows)
+        finally:
+            if path:
+                output.close()
+        
+        if path:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{count} products written to {path} ({count / elapsed if elapsed else 0:.0f} rows/s).")
+        else:
+            self.stderr.write(f"{count} products written.")
+            
+    def write(self, output, output_format, rows):
+        """
+        Writes rows to output and returns how many were written
+        """
+        count = 0
+        if output_format == 'csv':
+            writer = csv.writer(output)
+            writer.writerow(self.fields)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            fields = self.fields
+            for row in rows:
+                output.write(json.dumps(dict(zip(fields, row))) + '\n')
+                count += 1
+        return count
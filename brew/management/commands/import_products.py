@@ -0,0 +1,163 @@
+import json
+import time
+from itertools import islice
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from brew.cache import catalog_cache
+from brew.inventory import shard_stock
+from brew.models import Product, StockShard
+from brew.records import detect_format, read_records
+
+
+class Command(BaseCommand):
+    """
+    Creates and updates products from a CSV or JSONL file.
+
+    Each record has the export_products fields. Products are matched by product_name:
+    a record for an existing name updates that product, and any other record creates one.
+    When several products share a name, the oldest is updated.
+
+    The file is read in chunks of --chunk-size records. Each chunk takes one query to look
+    up its names, one prepared update and one bulk insert, in its own transaction, so memory
+    use does not depend on the size of the file. Rejected records are written to the rejects file.
+    """
+    help = "Creates and updates products from a CSV or JSONL file, matched by product_name"
+    fields = ['product_name', 'temperature', 'caffeine_amount', 'price', 'description', 'quantity']
+    required_fields = ['product_name', 'price', 'quantity']
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file of products")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Records written at a time (default: 2000)")
+        parser.add_argument('--rejects', help="File rejected records are written to (default: <path>.rejects.jsonl)")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        rejects_path = options['rejects'] or f'{path}.rejects.jsonl'
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        totals = {'records': 0, 'created': 0, 'updated': 0, 'rejected': 0}
+        started = time.perf_counter()
+        try:
+            with open(path, newline='') as input_file, open(rejects_path, 'w') as rejects_file:
+                records = read_records(input_file, detect_format(path, options['format']))
+                while chunk := list(islice(records, options['chunk_size'])):
+                    created, updated, rejects = self.import_chunk(chunk)
+                    for reject in rejects:
+                        rejects_file.write(json.dumps(reject) + '\n')
+                    totals['records'] += len(chunk)
+                    totals['created'] += created
+                    totals['updated'] += updated
+                    totals['rejected'] += len(rejects)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"{totals['records']} records")
+        except FileNotFoundError as exc:
+            raise CommandError(f"{exc.filename} does not exist.")
+        finally:
+            # Bulk writes send no signals, so invalidate the cached catalog once here
+            if totals['created'] or totals['updated']:
+                catalog_cache.bump_version()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{totals['records']} records: {totals['created']} created, {totals['updated']} updated, "
+            f"{totals['rejected']} rejected ({totals['records'] / elapsed if elapsed else 0:.0f} rows/s)."
+        )
+        if totals['rejected']:
+            self.stdout.write(f"Rejected records are in {rejects_path}.")
+
+    def clean(self, data):
+        """
+        Converts a record into model field values
+
+        Raises:
+            ValidationError: With a message per invalid field
+        """
+        values, errors = {}, {}
+        for name in self.fields:
+            field = Product._meta.get_field(name)
+            value = data.get(name)
+            if value in (None, ''):
+                if name in self.required_fields:
+                    errors[name] = ["This field is required."]
+                else:
+                    values[name] = None if field.null else field.get_default()
+                continue
+            try:
+                values[name] = field.clean(field.to_python(value), None)
+            except ValidationError as exc:
+                errors[name] = exc.messages
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def import_chunk(self, chunk):
+        """
+        Upserts one chunk of records
+
+        Returns:
+            tuple: The number of products created and updated, and the rejected records
+        """
+        rows, rejects = {}, []
+        for number, data in chunk:
+            if not isinstance(data, dict):
+                rejects.append({'record': number, 'errors': {'non_field_errors': ["Not a JSON object."]}})
+                continue
+            try:
+                values = self.clean(data)
+            except ValidationError as exc:
+                rejects.append({'record': number, 'product_name': data.get('product_name'), 'errors': exc.message_dict})
+                continue
+            # A name repeated within the chunk keeps its last record
+            rows[values['product_name']] = values
+
+        with transaction.atomic():
+            existing = {}
+            for product in Product.objects.filter(product_name__in=rows).only('id', 'product_name', 'stock_shards').order_by('-id'):
+                existing[product.product_name] = product
+
+            to_update, to_create = [], []
+            for name, values in rows.items():
+                product = existing.get(name)
+                if product is None:
+                    to_create.append(Product(**values))
+                else:
+                    for field, value in values.items():
+                        setattr(product, field, value)
+                    to_update.append(product)
+
+            self.update_products(to_update)
+            Product.objects.bulk_create(to_create)
+
+            # The imported quantity replaces the stock held in shards too
+            sharded = [product for product in to_update if product.stock_shards]
+            if sharded:
+                StockShard.objects.filter(product__in=sharded).delete()
+                for product in sharded:
+                    shard_stock(product.id, product.stock_shards)
+        return len(to_create), len(to_update), rejects
+
+    def update_products(self, products):
+        """
+        Saves the import fields of products with one prepared UPDATE run for every product
+
+        bulk_update() builds a CASE expression with a branch per product for each field,
+        which costs about 2 ms per product to compile and grows with the square of the
+        batch on SQLite. executemany() reuses one statement and stays linear.
+        """
+        if not products:
+            return
+        fields = [Product._meta.get_field(name) for name in self.fields]
+        quote_name = connection.ops.quote_name
+        sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+            quote_name(Product._meta.db_table),
+            ', '.join(f'{quote_name(field.column)} = %s' for field in fields),
+            quote_name(Product._meta.pk.column),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                [*(field.get_db_prep_save(getattr(product, field.attname), connection) for field in fields), product.pk]
+                for product in products
+            ])
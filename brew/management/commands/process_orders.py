@@ -0,0 +1,67 @@
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from brew.processing import OrderQueue, OrderWorker, WorkerMetrics
+
+
+class Command(BaseCommand):
+    """
+    Runs order-processing workers that move queued orders to their final status.
+    
+    Each worker thread claims a batch of 'in progress' orders, processes it and saves the
+    new statuses in bulk. Throughput, lag and the queue depth are printed every
+    --report-interval seconds. Stop it with Ctrl+C, or pass --drain to exit once the
+    queue is empty.
+    """
+    help = "Processes queued orders in background worker threads"
+    worker_class = OrderWorker
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help="Number of worker threads (default: 1)")
+        parser.add_argument('--batch-size', type=int, default=100, help="Orders claimed per batch (default: 100)")
+        parser.add_argument('--lease-seconds', type=int, default=60, help="Seconds before a claimed batch can be claimed again (default: 60)")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to wait when the queue is empty (default: 1)")
+        parser.add_argument('--report-interval', type=float, default=10.0, help="Seconds between metrics reports (default: 10)")
+        parser.add_argument('--drain', action='store_true', help="Exit when the queue is empty")
+        
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--concurrency and --batch-size must be at least 1.")
+        
+        queue = OrderQueue()
+        metrics = WorkerMetrics()
+        stop = threading.Event()
+        
+        def work():
+            worker = self.worker_class(
+                queue=queue,
+                metrics=metrics,
+                batch_size=options['batch_size'],
+                lease_seconds=options['lease_seconds'],
+                poll_interval=options['poll_interval'],
+            )
+            try:
+                worker.run(stop, drain=options['drain'])
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=work, name=f'order-worker-{i}') for i in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(options['report_interval'])
+                    if thread.is_alive():
+                        break
+                self.report(metrics, queue)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the current batches...")
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self.report(metrics, queue)
+            
+    def report(self, metrics, queue):
+        snapshot = {**metrics.snapshot(), 'queue_depth': queue.depth()}
+        self.stdout.write(' '.join(f'{key}={value:.2f}' if isinstance(value, float) else f'{key}={value}' for key, value in snapshot.items()))
@@ -0,0 +1,99 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter, so nothing is imported yet: starts the WSGI application and serves one request
+BOOTSTRAP = '''
+import io, json, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+ready = time.perf_counter()
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http',
+}
+status = []
+response = application(environ, lambda response_status, headers, exc_info=None: status.append(response_status))
+b''.join(response)
+response.close()
+served = time.perf_counter()
+print(json.dumps({'setup_ms': (ready - started) * 1000, 'first_response_ms': (served - ready) * 1000, 'status': status[0]}))
+'''
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    """
+    Measures how long a new server process takes to serve its first request.
+
+    Each run starts a fresh Python process that sets up Django, loads the WSGI
+    application and serves one GET request, like a new container does. The request has
+    no token, so it is timed up to the 401 once authentication has run. The command
+    reports the median time to start the interpreter, set up Django and serve the first
+    response. It then runs once more with `python -X importtime` and lists the modules
+    that take longest to import, and the time per top-level package.
+
+    Set STARTUP_MODE=production in the environment to profile the production mode.
+    """
+    help = "Profiles process start to first response, with import times per module"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/ping/', help="Path of the first request, sent without a token, so the default /api/ping/ is answered with a 401 after authentication runs (default: /api/ping/)")
+        parser.add_argument('--runs', type=int, default=5, help="Number of processes to time (default: 5)")
+        parser.add_argument('--top', type=int, default=15, help="Number of modules to list (default: 15)")
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1.")
+
+        runs = [self.run_process(options['path']) for _ in range(options['runs'])]
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Startup, median of {len(runs)} processes (first response: {runs[0]['status']})"))
+        for key, label in (('process_ms', 'process start to exit'), ('setup_ms', 'Django setup'), ('first_response_ms', 'first response')):
+            self.stdout.write(f"  {label:<24}{statistics.median(run[key] for run in runs):>8.1f} ms")
+
+        imports = self.run_process(options['path'], import_time=True)['imports']
+        self.stdout.write(self.style.MIGRATE_HEADING("Slowest imports, including their own imports (-X importtime)"))
+        for name, (_, cumulative) in sorted(imports.items(), key=lambda item: -item[1][1])[:options['top']]:
+            self.stdout.write(f"  {name:<48}{cumulative / 1000:>8.1f} ms")
+
+        packages = defaultdict(int)
+        for name, (own, _) in imports.items():
+            packages[name.split('.')[0]] += own
+        self.stdout.write(self.style.MIGRATE_HEADING("Import time per top-level package"))
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"  {package:<48}{own / 1000:>8.1f} ms")
+
+    def run_process(self, path, import_time=False):
+        """
+        Starts a process that serves one request and returns its timings
+
+        Returns:
+            dict: process_ms, setup_ms, first_response_ms and status, and with import_time
+                the own and cumulative import time of each module in microseconds
+        """
+        command = [sys.executable, *(['-X', 'importtime'] if import_time else []), '-c', BOOTSTRAP, path]
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'app.settings')}
+        started = time.perf_counter()
+        result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise CommandError(f"The startup process failed:\n{result.stderr}")
+
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        timings['process_ms'] = elapsed * 1000
+        if import_time:
+            timings['imports'] = {}
+            for line in result.stderr.splitlines():
+                match = IMPORT_TIME.match(line)
+                if match:
+                    timings['imports'][match.group(4)] = (int(match.group(1)), int(match.group(2)))
+        return timings
@@ -0,0 +1,151 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from brew.hashers import hashing_pool
+from brew.records import detect_format, read_records
+from brew.serializers import UserSignupSerializer
+
+
+def init_hashing_process():
+    """
+    Prepares a worker process to hash passwords
+    """
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        # Worker processes that are spawned rather than forked start without Django
+        django.setup()
+    hashing_pool.disable()
+
+
+class Command(BaseCommand):
+    """
+    Creates users in bulk from a CSV or JSONL file.
+
+    Each record needs a `username` and a `password`, e.g. a CSV file with a
+    `username,password` header or one `{"username": ..., "password": ...}` object per line.
+    Records are validated with the same rules as UserSignupSerializer, so the accounts are
+    the same as ones created through /api/signup/.
+
+    The file is read in chunks of --chunk-size records, so memory use does not depend on its
+    size. Passwords in a chunk are hashed across --processes worker processes and the users
+    are inserted with one bulk insert per chunk. After each chunk the number of records
+    done is saved to the progress file, and --resume skips them. Rejected records are
+    written to the rejects file, without their password.
+    """
+    help = "Creates users in bulk from a CSV or JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file of users")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Records validated, hashed and inserted at a time (default: 1000)")
+        parser.add_argument('--processes', type=int, default=os.cpu_count(), help="Hashing processes, 0 to hash in this process (default: number of CPUs)")
+        parser.add_argument('--rejects', help="File rejected records are written to (default: <path>.rejects.jsonl)")
+        parser.add_argument('--progress', help="File progress is saved to (default: <path>.progress.json)")
+        parser.add_argument('--resume', action='store_true', help="Skip the records the progress file says are done")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = detect_format(path, options['format'])
+        rejects_path = options['rejects'] or f'{path}.rejects.jsonl'
+        progress_path = options['progress'] or f'{path}.progress.json'
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        progress = {'records': 0, 'created': 0, 'rejected': 0}
+        if options['resume'] and os.path.exists(progress_path):
+            with open(progress_path) as progress_file:
+                progress = json.load(progress_file)
+        skip = progress['records']
+
+        self.processes = options['processes']
+        pool = None
+        if self.processes:
+            pool = ProcessPoolExecutor(max_workers=self.processes, initializer=init_hashing_process)
+        started = time.perf_counter()
+        try:
+            with open(path, newline='') as input_file, open(rejects_path, 'a' if skip else 'w') as rejects_file:
+                records = read_records(input_file, input_format)
+                for _ in islice(records, skip):
+                    pass
+                while chunk := list(islice(records, options['chunk_size'])):
+                    created, rejects = self.provision_chunk(chunk, pool)
+                    for reject in rejects:
+                        rejects_file.write(json.dumps(reject) + '\n')
+                    rejects_file.flush()
+
+                    progress['records'] += len(chunk)
+                    progress['created'] += created
+                    progress['rejected'] += len(rejects)
+                    self.save_progress(progress_path, progress)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"{progress['records']} records, {progress['created']} created, {progress['rejected']} rejected")
+        except FileNotFoundError as exc:
+            raise CommandError(f"{exc.filename} does not exist.")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{progress['records']} records: {progress['created']} created, {progress['rejected']} rejected "
+            f"({(progress['records'] - skip) / elapsed if elapsed else 0:.0f} records/s)."
+        )
+        if progress['rejected']:
+            self.stdout.write(f"Rejected records are in {rejects_path}.")
+
+    def provision_chunk(self, chunk, pool):
+        """
+        Validates, hashes and inserts one chunk of records
+
+        Returns:
+            tuple: The number of users created and the rejected records
+        """
+        validator = UserSignupSerializer()
+        valid, rejects = [], []
+        for number, data in chunk:
+            if not isinstance(data, dict):
+                rejects.append({'record': number, 'errors': {'non_field_errors': ["Not a JSON object."]}})
+                continue
+            try:
+                # Missing fields are left out, so the messages match a signup request's
+                validated = validator.run_validation({key: data[key] for key in ('username', 'password') if data.get(key) is not None})
+            except ValidationError as exc:
+                rejects.append({'record': number, 'username': data.get('username'), 'errors': exc.detail})
+                continue
+            valid.append((number, User.normalize_username(validated['username']), validated['password']))
+
+        # Usernames that are taken, or repeated within the file
+        taken = set(User.objects.filter(username__in=[username for _, username, _ in valid]).values_list('username', flat=True))
+        accepted = []
+        for number, username, password in valid:
+            if username in taken:
+                rejects.append({'record': number, 'username': username, 'errors': {'username': ["A user with that username already exists."]}})
+            else:
+                taken.add(username)
+                accepted.append((number, username, password))
+
+        passwords = [password for _, _, password in accepted]
+        if pool is None:
+            hashes = [make_password(password) for password in passwords]
+        else:
+            hashes = list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (self.processes * 4))))
+
+        with transaction.atomic():
+            User.objects.bulk_create([User(username=username, password=password_hash) for (_, username, _), password_hash in zip(accepted, hashes)])
+        rejects.sort(key=lambda reject: reject['record'])
+        return len(accepted), rejects
+
+    def save_progress(self, progress_path, progress):
+        # Replace the file in one step so a crash never leaves half of it
+        temporary_path = f'{progress_path}.tmp'
+        with open(temporary_path, 'w') as progress_file:
+            json.dump(progress, progress_file)
+        os.replace(temporary_path, progress_path)
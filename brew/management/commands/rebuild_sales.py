@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from brew.analytics import rebuild_sales
+
+
+class Command(BaseCommand):
+    """
+    Regenerates the daily sales rollup behind /api/analytics/sales/ from the order history.
+
+    Run it once after migrating, or whenever the rollup is suspected to be wrong. Orders
+    are summed in chunks, each in its own transaction, so orders can still be created
+    while it runs. Stop `process_orders` first, see brew.analytics.rebuild_sales.
+    """
+    help = "Rebuilds the daily sales rollup from the orders"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Orders summed per transaction (default: 1000)")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        started = time.perf_counter()
+        orders, rows = rebuild_sales(options['chunk_size'])
+        self.stdout.write(f"Summed {orders} orders into {rows} daily sales rows in {time.perf_counter() - started:.1f}s.")
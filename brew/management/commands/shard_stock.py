@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from brew.inventory import shard_stock
+from brew.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Splits a hot product's stock across several rows so concurrent orders for it
+    update different rows. Run it with --shards 1 to move the stock back into the product row.
+    """
+    help = "Splits a product's stock across a number of stock shards"
+    
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int, help="The product to shard")
+        parser.add_argument('--shards', type=int, default=4, help="Number of shards, 1 to stop sharding (default: 4)")
+        
+    def handle(self, *args, **options):
+        if not 1 <= options['shards'] <= 256:
+            raise CommandError("--shards must be between 1 and 256.")
+        try:
+            product = shard_stock(options['product_id'], options['shards'])
+        except Product.DoesNotExist:
+            raise CommandError(f"Product {options['product_id']} does not exist.")
+        self.stdout.write(f"{product.product_name}: {product.total_quantity} in stock across {product.stock_shards or 1} row(s).")
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brew', '0007_stock_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='lease_token',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+from decimal import Decimal
+from django.db import migrations, transaction
+
+# Orders per transaction, so the backfill never holds the write lock for long
+CHUNK_SIZE = 1000
+CENT = Decimal('0.01')
+
+
+def update_rows(connection, model, names, rows):
+    """
+    Sets the named fields of each row with one prepared UPDATE, run with executemany()
+    
+    Like brew.analytics.add_sales, this avoids the CASE WHEN of bulk_update(), which takes
+    longer to compile than to run once a chunk touches thousands of rows.
+    
+    Parameters:
+        rows (list): The primary key of each row, followed by the value of each named field
+    """
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in names]
+    sql = 'UPDATE {table} SET {assignments} WHERE {pk} = %s'.format(
+        table=quote_name(model._meta.db_table),
+        assignments=', '.join(f'{quote_name(field.column)} = %s' for field in fields),
+        pk=quote_name(model._meta.pk.column),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(value, connection) for field, value in zip(fields, values)] + [pk]
+            for pk, *values in rows
+        ])
+
+
+def backfill_order_totals(apps, schema_editor):
+    """
+    Prices the items of existing orders at the current product price and stores each order's totals
+
+    Orders are processed in id order, CHUNK_SIZE at a time, each chunk in its own transaction.
+    """
+    Order = apps.get_model('brew', 'Order')
+    OrderItem = apps.get_model('brew', 'OrderItem')
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            orders = {order.id: order for order in Order.objects.filter(id__gt=last_id).order_by('id').only('id')[:CHUNK_SIZE]}
+            if not orders:
+                return
+            items = list(OrderItem.objects.filter(order_id__in=orders).select_related('product').only('id', 'order_id', 'quantity', 'product__price'))
+            for order in orders.values():
+                order.total, order.item_count = Decimal(0), 0
+            for item in items:
+                item.unit_price = Decimal(str(item.product.price)).quantize(CENT)
+                item.line_total = item.unit_price * item.quantity
+                order = orders[item.order_id]
+                order.total += item.line_total
+                order.item_count += item.quantity
+            update_rows(schema_editor.connection, OrderItem, ['unit_price', 'line_total'], [(item.id, item.unit_price, item.line_total) for item in items])
+            update_rows(schema_editor.connection, Order, ['total', 'item_count'], [(order.id, order.total, order.item_count) for order in orders.values()])
+            last_id = max(orders)
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits on its own
+    atomic = False
+
+    dependencies = [
+        ('brew', '0010_order_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
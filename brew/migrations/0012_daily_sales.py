@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brew', '0011_backfill_order_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='brew.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'day'], name='dailysales_product_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'product'), name='dailysales_day_product_unique')],
+            },
+        ),
+    ]
@@ -1,8 +1,26 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
 
 # Create your models here.
 
+class ProductQuerySet(models.QuerySet):
+    
+    def with_total_quantity(self):
+        """
+        Annotates each product with `stock_total`, its stock including every stock shard
+        """
+        shard_quantity = StockShard.objects.filter(product=models.OuterRef('pk')).values('product').annotate(
+            total=models.Sum('quantity')
+        ).values('total')
+        return self.annotate(stock_total=models.Case(
+            # Only sharded products pay for the subquery
+            models.When(stock_shards=0, then=models.F('quantity')),
+            default=models.F('quantity') + Coalesce(models.Subquery(shard_quantity), 0),
+        ))
+
+
 class Product(models.Model):
     """
     Model representing a product in the Brew Ha Ha database
@@ -13,7 +31,8 @@ class Product(models.Model):
         caffeine_amount (int): The amount of caffeine in milligrams
         price (float): The price of the product
         description (str): A short description of the product
-        quantity (int): Amount of product available
+        quantity (int): Amount of product available, not counting stock shards
+        stock_shards (int): Number of StockShard rows the stock is split across, 0 when it is not sharded
     """    
     product_name = models.CharField(max_length=200, default='Default Description')
     temperature = models.CharField(max_length=500, blank=True, null=True)
@@ -21,6 +40,46 @@ class Product(models.Model):
     price = models.FloatField()
     description = models.CharField(max_length=200, default='Default Description')  
     quantity = models.IntegerField(default=True)
+    stock_shards = models.PositiveSmallIntegerField(default=0)
+    
+    objects = ProductQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Matching imported products by name, see the import_products command
+            models.Index(fields=['product_name'], name='product_name_idx'),
+        ]
+    
+    @property
+    def total_quantity(self):
+        """
+        Amount of product available, including every stock shard
+        """
+        if not self.stock_shards:
+            return self.quantity
+        return self.quantity + (self.shards.aggregate(total=models.Sum('quantity'))['total'] or 0)
+
+
+class StockShard(models.Model):
+    """
+    Model for one slice of a hot product's stock
+    
+    Orders for a sharded product decrement a random shard instead of the product row, so
+    concurrent orders for the same product update different rows. See brew/inventory.py.
+    
+    Attributes:
+        product (ForeignKey): The product this stock belongs to
+        shard (int): The shard number, from 0 to product.stock_shards - 1
+        quantity (int): Amount of product available in this shard
+    """
+    product = models.ForeignKey(Product, related_name='shards', on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'shard'], name='stockshard_product_shard_unique'),
+        ]
     
 class Order(models.Model):
     """
@@ -30,15 +89,38 @@ class Order(models.Model):
         payment_method (str): Accepted payment choices, e.g. 'Credit', 'Debit')
         order_date (str): The date the order is submitted
         status (str): The status of the order, e.g. 'in progress', 'canceled', 'completed'
+        lease_token (str): Identifies the worker batch processing the order, see brew/processing.py
+        leased_until (datetime): When the lease expires and another worker may claim the order
+        total (Decimal): Sum of the line totals, stored when the order is created
+        item_count (int): Number of units ordered, summed over the order items
+        currency (str): ISO 4217 code of the currency the prices are in
     """
     payment_methods = [ 
         ('Credit', 'Credit'),
         ('Debit', 'Debit'),
     ]
+    IN_PROGRESS = 'in progress'
+    COMPLETED = 'completed'
+    CANCELED = 'canceled'
+    # Product prices are in USD, see ProductSerializer
+    CURRENCY = 'USD'
     
     payment_method = models.CharField(max_length=20, choices=payment_methods)
     order_date = models.DateTimeField(default=timezone.now)
-    status = models.CharField(max_length=20, default="in progress")
+    status = models.CharField(max_length=20, default=IN_PROGRESS)
+    lease_token = models.CharField(max_length=32, blank=True, null=True)
+    leased_until = models.DateTimeField(blank=True, null=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    currency = models.CharField(max_length=3, default=CURRENCY)
+    
+    class Meta:
+        indexes = [
+            # Orders with a status, newest or oldest first
+            models.Index(fields=['status', 'order_date', 'id'], name='order_status_date_idx'),
+            # Orders in a date range, and paging through orders by date
+            models.Index(fields=['order_date', 'id'], name='order_date_idx'),
+        ]
 
 class OrderItem(models.Model):
     """Model for order items in the Brew Ha Ha database
@@ -47,10 +129,73 @@ class OrderItem(models.Model):
         order (ForeignKey): References the Order model and links orders to order items
         Product (ForeignKey): References the Product model and links products to order items for matching
         quantity (PositiveIntegerField): The amount of product in stock
+        unit_price (Decimal): The product's price when the order was created
+        line_total (Decimal): unit_price times quantity
     """
     # Because an order can have multiple items but an item can only be in one order
     order = models.ForeignKey(Order, related_name='order_items', on_delete=models.CASCADE)
     # Because a product can appear in multiple order items but an order item is associated with 1 product only
-    product = models.ForeignKey('Product', on_delete=models.CASCADE) 
+    # orderitem_product_order_idx starts with product, so it also serves the foreign key
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, db_index=False)
     # Make sure stock quantity is zero or above
-    quantity = models.PositiveIntegerField()
\ No newline at end of file
+    quantity = models.PositiveIntegerField()
+    # Copied from the product, so later price changes do not rewrite past orders
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        indexes = [
+            # Sales of a product, grouped or joined by order
+            models.Index(fields=['product', 'order'], name='orderitem_product_order_idx'),
+        ]
+
+
+class DailySales(models.Model):
+    """
+    Units sold and revenue per product per day, kept up to date as orders are created and canceled
+
+    See brew/analytics.py. Canceled orders are not counted.
+
+    Attributes:
+        day (date): The day the orders were submitted, in the TIME_ZONE setting
+        product (ForeignKey): The product sold
+        units (int): The number of units sold
+        revenue (Decimal): The sum of the line totals, in Order.CURRENCY
+    """
+    day = models.DateField()
+    # dailysales_product_day_idx starts with product, so it also serves the foreign key
+    product = models.ForeignKey('Product', related_name='daily_sales', on_delete=models.CASCADE, db_index=False)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the sales in a date range
+            models.UniqueConstraint(fields=['day', 'product'], name='dailysales_day_product_unique'),
+        ]
+        indexes = [
+            # Sales of one product in a date range
+            models.Index(fields=['product', 'day'], name='dailysales_product_day_idx'),
+        ]
+
+
+class IdempotencyRecord(models.Model):
+    """
+    A claimed `Idempotency-Key` and, once the request has run, its response
+
+    Used by brew.idempotency.DatabaseIdempotencyStore. The unique key makes the claim
+    atomic for every worker that shares the database.
+
+    Attributes:
+        key (str): The key, scoped to the user and route
+        fingerprint (str): Hash of the request body the key was first used with
+        status_code (int): The status of the stored response, empty while the request runs
+        response (dict): The data of the stored response
+        expires_at (datetime): When an in-flight claim or the stored response expires
+    """
+    key = models.CharField(max_length=100, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    # The encoder REST framework renders responses with, so replays render the same
+    response = models.JSONField(blank=True, null=True, encoder=JSONEncoder)
+    expires_at = models.DateTimeField(db_index=True)
@@ -0,0 +1,111 @@
+import gzip
+import hashlib
+import threading
+from rest_framework.schemas.inspectors import ViewInspector
+from rest_framework.settings import api_settings
+
+# The DRF views document the API, app/asgi_urls.py only serves the same routes faster
+SCHEMA_URLCONF = 'app.urls'
+
+_documented = False
+_documented_lock = threading.Lock()
+
+
+class PendingSchema(ViewInspector):
+    """
+    DEFAULT_SCHEMA_CLASS with LAZY_SCHEMA, until apply_view_schemas replaces it with drf-spectacular's AutoSchema
+
+    DRF's router reads every viewset's `schema` attribute while it builds the URLs, which
+    would otherwise import drf_spectacular.openapi at startup.
+    """
+
+
+def apply_view_schemas():
+    """
+    Applies the OpenAPI metadata in brew/api_docs.py to the views, the first time it is called
+
+    brew.schema.SchemaGenerator calls it before it generates. Without LAZY_SCHEMA it is
+    also called at startup, so that a mistake in the metadata shows up straight away.
+    """
+    global _documented
+    with _documented_lock:
+        if api_settings.DEFAULT_SCHEMA_CLASS is PendingSchema:
+            from drf_spectacular.openapi import AutoSchema
+            api_settings.DEFAULT_SCHEMA_CLASS = AutoSchema
+        if not _documented:
+            from .api_docs import document_views
+            document_views()
+            _documented = True
+
+
+def generate_schema():
+    """
+    Runs drf-spectacular over the API, like `manage.py spectacular`
+
+    Returns:
+        dict: The OpenAPI schema
+    """
+    from drf_spectacular.settings import spectacular_settings
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(urlconf=SCHEMA_URLCONF)
+    return generator.get_schema(request=None, public=True)
+
+
+class SchemaArtifact:
+    """
+    The OpenAPI schema rendered once, in every format and encoding it is served in.
+
+    Each representation is keyed by format ('yaml' or 'json') and encoding ('identity'
+    or 'gzip'), and has its own strong ETag derived from the schema's content hash.
+
+    Attributes:
+        version (str): Hash of the YAML schema, which changes whenever the schema does
+        bodies (dict): The bytes per (format, encoding)
+        etags (dict): The ETag per (format, encoding)
+    """
+    content_types = {
+        'yaml': 'application/vnd.oai.openapi',
+        'json': 'application/vnd.oai.openapi+json',
+    }
+
+    def __init__(self, schema):
+        # The renderers import PyYAML, which serving requests does not need
+        from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+        rendered = {
+            'yaml': OpenApiYamlRenderer().render(schema, renderer_context={}),
+            'json': OpenApiJsonRenderer().render(schema, renderer_context={}),
+        }
+        self.version = hashlib.sha256(rendered['yaml']).hexdigest()[:16]
+        self.bodies, self.etags = {}, {}
+        for schema_format, body in rendered.items():
+            # mtime=0 keeps the compressed bytes the same for the same schema
+            for encoding, encoded in (('identity', body), ('gzip', gzip.compress(body, compresslevel=9, mtime=0))):
+                self.bodies[schema_format, encoding] = encoded
+                self.etags[schema_format, encoding] = f'"{self.version}-{schema_format}-{encoding}"'
+
+
+class SchemaStore:
+    """
+    Builds the SchemaArtifact the first time it is needed and keeps it for the life of the process
+
+    Generating the schema introspects every view, so it is done once rather than per request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._artifact = None
+
+    def get(self):
+        artifact = self._artifact
+        if artifact is None:
+            with self._lock:
+                if self._artifact is None:
+                    self._artifact = SchemaArtifact(generate_schema())
+                artifact = self._artifact
+        return artifact
+
+    def clear(self):
+        with self._lock:
+            self._artifact = None
+
+
+schema_store = SchemaStore()
@@ -0,0 +1,239 @@
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, deque, defaultdict
+from datetime import timedelta
+from django.db import connection, transaction, OperationalError
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from .analytics import add_sales, daily_sales
+from .inventory import restock
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+
+class OrderQueue:
+    """
+    Database-backed queue of the orders waiting to be processed.
+
+    Every order with the status 'in progress' is queued, oldest first. A worker claims a
+    batch by leasing it: the orders get the worker's lease token and an expiry time, and
+    other workers skip leased orders until the lease expires. A worker that dies
+    mid-batch therefore only delays its orders by the lease time.
+
+    On databases that support it the claim uses SELECT ... FOR UPDATE SKIP LOCKED. SQLite
+    has no row locks, so there the claim is an UPDATE that only matches orders that are
+    still unleased, which is atomic because SQLite serializes writes.
+    """
+
+    def claimable(self, now):
+        return Order.objects.filter(status=Order.IN_PROGRESS).filter(Q(leased_until__isnull=True) | Q(leased_until__lt=now))
+
+    def claim(self, batch_size, lease_seconds):
+        """
+        Leases up to batch_size of the oldest unleased orders
+
+        Returns:
+            tuple: The lease token and the leased orders, with their items and products
+        """
+        now = timezone.now()
+        token = uuid.uuid4().hex
+        with transaction.atomic():
+            candidates = self.claimable(now).order_by('order_date', 'id')
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            ids = list(candidates.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return token, []
+            # Only matches the candidates no other worker has leased in the meantime
+            self.claimable(now).filter(id__in=ids).update(lease_token=token, leased_until=now + timedelta(seconds=lease_seconds))
+
+        orders = Order.objects.filter(id__in=ids, lease_token=token).prefetch_related(
+            Prefetch('order_items', queryset=OrderItem.objects.select_related('product'))
+        )
+        return token, list(orders)
+
+    def finish(self, token, statuses):
+        """
+        Sets the new status of leased orders in one update per status and ends their lease
+
+        Canceled orders return their stock and are taken out of the daily sales rollup.
+        Orders whose lease has expired and been claimed by another worker are left alone.
+
+        Parameters:
+            token (str): The lease token returned by claim
+            statuses (dict): The new status per order id
+        Returns:
+            int: The number of orders updated
+        """
+        by_status = defaultdict(list)
+        for order_id, status in statuses.items():
+            by_status[status].append(order_id)
+
+        updated = 0
+        with transaction.atomic():
+            canceled = by_status.get(Order.CANCELED)
+            if canceled:
+                # Only orders still leased by this worker, so stock is never returned twice
+                canceled = list(Order.objects.filter(id__in=canceled, lease_token=token).values_list('id', flat=True))
+                by_status[Order.CANCELED] = canceled
+                order_items = OrderItem.objects.filter(order_id__in=canceled).select_related('order').only('product_id', 'quantity', 'line_total', 'order__order_date')
+                requested = Counter()
+                for order_item in order_items:
+                    requested[order_item.product_id] += order_item.quantity
+                restock(requested)
+                add_sales(daily_sales(order_items, sign=-1))
+
+            for status, ids in by_status.items():
+                updated += Order.objects.filter(id__in=ids, lease_token=token).update(status=status, lease_token=None, leased_until=None)
+        return updated
+
+    def release(self, token, ids):
+        """
+        Ends the lease on orders without changing their status, so they can be claimed again right away
+        """
+        return Order.objects.filter(id__in=ids, lease_token=token).update(lease_token=None, leased_until=None)
+
+    def depth(self):
+        """
+        Returns the number of orders waiting to be processed, leased or not
+        """
+        return Order.objects.filter(status=Order.IN_PROGRESS).count()
+
+
+class WorkerMetrics:
+    """
+    Throughput and lag counters shared by the worker threads of one process.
+
+    Lag is the time between an order being submitted and its final status being saved.
+
+    Attributes:
+        max_samples (int): Number of recent lag samples kept for the percentiles
+    """
+
+    def __init__(self, max_samples=10000):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.processed = Counter()
+        self.batches = 0
+        self.failures = 0
+        self.lag = deque(maxlen=max_samples)
+
+    def record(self, orders, statuses, finished_at):
+        with self._lock:
+            self.batches += 1
+            self.processed.update(statuses[order.id] for order in orders if order.id in statuses)
+            self.lag.extend((finished_at - order.order_date).total_seconds() for order in orders if order.id in statuses)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def snapshot(self):
+        """
+        Returns the counters, throughput since start and lag percentiles in seconds
+        """
+        with self._lock:
+            lag = sorted(self.lag)
+            total = sum(self.processed.values())
+            elapsed = time.monotonic() - self.started
+
+            def lag_percentile(pct):
+                return lag[min(len(lag) - 1, int(pct / 100 * len(lag)))] if lag else 0.0
+
+            return {
+                'processed': total,
+                **{status: count for status, count in sorted(self.processed.items())},
+                'batches': self.batches,
+                'failures': self.failures,
+                'orders_per_sec': total / elapsed if elapsed else 0.0,
+                'lag_p50_s': lag_percentile(50),
+                'lag_p95_s': lag_percentile(95),
+                'lag_max_s': lag[-1] if lag else 0.0,
+            }
+
+
+class OrderWorker:
+    """
+    Claims batches of orders from the queue, processes them and saves their new status.
+
+    Subclass it and override process_batch to plug in real fulfilment work.
+
+    Attributes:
+        batch_size (int): Largest number of orders claimed at a time
+        lease_seconds (int): How long a batch is leased before other workers may claim it again
+        poll_interval (float): Seconds to wait when the queue is empty or the database is busy
+        finish_attempts (int): Number of tries to save a processed batch while the database is busy
+    """
+    finish_attempts = 5
+
+    def __init__(self, queue=None, metrics=None, batch_size=100, lease_seconds=60, poll_interval=1.0):
+        self.queue = queue or OrderQueue()
+        self.metrics = metrics or WorkerMetrics()
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def process_batch(self, orders):
+        """
+        Returns the new status for each order. Orders left out stay leased and are retried once the lease expires.
+
+        Every order is completed by default.
+        """
+        return {order.id: Order.COMPLETED for order in orders}
+
+    def run_once(self):
+        """
+        Claims and processes one batch
+
+        Returns:
+            int: The number of orders claimed, 0 when the queue is empty
+        """
+        token, orders = self.queue.claim(self.batch_size, self.lease_seconds)
+        if not orders:
+            return 0
+        try:
+            statuses = self.process_batch(orders)
+            self.finish(token, statuses)
+        except Exception:
+            self.metrics.record_failure()
+            self.queue.release(token, [order.id for order in orders])
+            raise
+        self.metrics.record(orders, statuses, timezone.now())
+        return len(orders)
+
+    def finish(self, token, statuses):
+        """
+        Saves the statuses, retrying while the database is busy so the batch is not processed twice
+        """
+        for attempt in range(self.finish_attempts):
+            try:
+                return self.queue.finish(token, statuses)
+            except OperationalError:
+                if attempt == self.finish_attempts - 1:
+                    raise
+                time.sleep(self.poll_interval)
+
+    def run(self, stop, drain=False):
+        """
+        Processes batches until stop is set, or until the queue is empty with drain
+
+        Parameters:
+            stop (threading.Event): Set to stop the worker after its current batch
+            drain (bool): Return as soon as no order can be claimed
+        """
+        while not stop.is_set():
+            try:
+                claimed = self.run_once()
+            except OperationalError:
+                # e.g. the SQLite database is locked by another writer
+                claimed = None
+            except Exception:
+                logger.exception("Processing a batch of orders failed, its orders will be retried")
+                claimed = None
+            if claimed == 0 and drain:
+                return
+            if not claimed:
+                stop.wait(self.poll_interval)
@@ -0,0 +1,30 @@
+import csv
+import json
+
+
+def detect_format(path, input_format=None):
+    """
+    Returns 'csv' or 'jsonl', from input_format when given or else the file extension
+    """
+    return input_format or ('jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv')
+
+
+def read_records(input_file, input_format):
+    """
+    Yields (record number, data) for each record in a CSV or JSONL file, numbered from 1
+
+    CSV records are dictionaries keyed by the header. A JSONL line that is not valid
+    JSON is yielded as None so the caller can reject it. Blank JSONL lines are skipped.
+    """
+    if input_format == 'csv':
+        yield from enumerate(csv.DictReader(input_file), start=1)
+        return
+    number = 0
+    for line in input_file:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError:
+            yield number, None
@@ -0,0 +1,82 @@
+from asgiref.sync import sync_to_async
+from itertools import islice
+from rest_framework.renderers import JSONRenderer
+
+
+class NDJSONRenderer(JSONRenderer):
+    """
+    Renderer for newline-delimited JSON (one JSON document per line).
+    
+    Lists are rendered as one line per item, anything else as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+        return b''.join(super(NDJSONRenderer, self).render(item) + b'\n' for item in data)
+
+
+def stream_serialized(queryset, serialize, chunk_size=2000, ndjson=False):
+    """
+    Yields a queryset as JSON bytes, serializing chunk_size rows at a time
+    
+    Rows are read with a chunked iterator, so memory stays flat whatever the number of rows.
+    The output is the same as JSONRenderer for a JSON array, or NDJSONRenderer when ndjson is set.
+    
+    Parameters:
+        queryset (QuerySet): The rows to stream
+        serialize (callable): Converts a list of rows into a list of dictionaries
+        chunk_size (int): Number of rows fetched and serialized at a time
+        ndjson (bool): Stream one JSON document per line instead of a JSON array
+    """
+    renderer = NDJSONRenderer() if ndjson else JSONRenderer()
+    rows = queryset.iterator(chunk_size=chunk_size)
+    separator = b''
+    
+    if not ndjson:
+        yield b'['
+    while chunk := list(islice(rows, chunk_size)):
+        body = renderer.render(serialize(chunk))
+        if ndjson:
+            yield body
+        else:
+            # Strip the brackets of the chunk's array and join it onto the outer array
+            yield separator + body[1:-1]
+            separator = b','
+    if not ndjson:
+        yield b']'
+
+
+async def astream_serialized(queryset, serialize, chunk_size=2000, ndjson=False):
+    """
+    Async version of stream_serialized
+    
+    Each chunk is fetched in the thread the async ORM uses, like QuerySet.aiterator, which
+    cannot be used itself: values_list() querysets run their query on the first call.
+    
+    Parameters:
+        queryset (QuerySet): The rows to stream
+        serialize (callable): Converts a list of rows into a list of dictionaries
+        chunk_size (int): Number of rows fetched and serialized at a time
+        ndjson (bool): Stream one JSON document per line instead of a JSON array
+    """
+    renderer = NDJSONRenderer() if ndjson else JSONRenderer()
+    rows = queryset.iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    separator = b''
+    
+    if not ndjson:
+        yield b'['
+    while chunk := await next_chunk():
+        body = renderer.render(serialize(chunk))
+        if ndjson:
+            yield body
+        else:
+            yield separator + body[1:-1]
+            separator = b','
+    if not ndjson:
+        yield b']'
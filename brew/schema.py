@@ -1,8 +1,11 @@
 from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from drf_spectacular.generators import SchemaGenerator as SpectacularSchemaGenerator
+from .openapi import apply_view_schemas
 
 class JWTAuthenticationScheme(OpenApiAuthenticationExtension):
     target_class = 'rest_framework_simplejwt.authentication.JWTAuthentication'  # Target the JWTAuthentication class
     name = 'JWTAuth'  # The name used in the OpenAPI spec
+    match_subclasses = True  # Also covers brew.authentication.CachedJWTAuthentication
 
     def get_security_definition(self, auto_schema):
         return {
@@ -10,4 +13,17 @@ class JWTAuthenticationScheme(OpenApiAuthenticationExtension):
             'scheme': 'bearer',
             'bearerFormat': 'JWT',  # Optional: the format of the token
             'description': 'JWT Authorization header using the Bearer scheme. Example: "Authorization: Bearer {token}"'
-        }
\ No newline at end of file
+        }
+
+class SchemaGenerator(SpectacularSchemaGenerator):
+    """
+    drf-spectacular's generator, set as its DEFAULT_GENERATOR_CLASS.
+
+    It applies the metadata in brew/api_docs.py to the views before generating.
+    Loading it through the setting also registers JWTAuthenticationScheme, so this module
+    is only imported when a schema is generated rather than at startup.
+    """
+
+    def get_schema(self, request=None, public=False):
+        apply_view_schemas()
+        return super().get_schema(request=request, public=public)
@@ -1,11 +1,70 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 import re
-from django.db import transaction
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction, connection
+from django.db.models import Case, When, F
+from django.utils import timezone
 from .models import Product, Order, OrderItem
+from .analytics import add_sales, daily_sales
+from .cache import catalog_cache
+from .inventory import decrement_shards
+from .instrumentation import timed
 
 
-class ProductSerializer(serializers.ModelSerializer):
+# Products whose stock is decremented by one UPDATE
+STOCK_UPDATE_BATCH_SIZE = 500
+# The largest quantity a PositiveIntegerField holds on every database backend
+MAX_QUANTITY = 2**31 - 1
+# The largest id a BigAutoField holds
+MAX_ID = 2**63 - 1
+
+
+class OutOfStock(Exception):
+    """
+    Raised inside the order transaction when a product does not have enough stock left
+    """
+
+
+class BatchOutOfStock(serializers.ValidationError):
+    """
+    Raised by OrderSerializer.create_many when an all-or-nothing batch runs out of stock
+    
+    Attributes:
+        order_errors (list): For each order, the ValidationError naming the products it holds
+            that are short, or None if it holds none of them
+    """
+    def __init__(self, detail, order_errors):
+        super().__init__(detail)
+        self.order_errors = order_errors
+
+
+def to_amount(price):
+    """
+    Converts a product price, stored as a float, to a Decimal amount in cents
+    """
+    return Decimal(str(price)).quantize(Decimal('0.01'))
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin that takes optional `fields` and `exclude` arguments.
+    
+    Only the fields named in `fields`, minus the ones named in `exclude`, are serialized.
+    """
+    
+    def __init__(self, *args, fields=None, exclude=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in set(exclude or ()) & set(self.fields):
+            self.fields.pop(name)
+
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for the product model. 
     
@@ -18,7 +77,7 @@ class ProductSerializer(serializers.ModelSerializer):
         caffeine_amount (int): The amount of caffeine in milligrams.
         price (float): The price of the product in USD.
         description (str): A short description of the product.
-        quantity (int): Amount of product available
+        quantity (int): Amount of product available, summed over its stock shards
     """
     id = serializers.IntegerField(help_text='A unique integer value identifying this product.')
     product_name = serializers.CharField(help_text='The product name')
@@ -26,12 +85,71 @@ class ProductSerializer(serializers.ModelSerializer):
     caffeine_amount = serializers.IntegerField(help_text="Caffeine amount in milligrams", required=False)
     price = serializers.FloatField(help_text='The price of the product in USD')
     description = serializers.CharField(help_text='A description of the product')
-    quantity = serializers.IntegerField(help_text='Amount of product available')
+    quantity = serializers.IntegerField(source='total_quantity', help_text='Amount of product available')
     
     class Meta:
         model=Product
         fields = ['id', 'product_name', 'temperature', 'caffeine_amount', 'price', 'description', 'quantity']
 
+class ProductRowSerializer:
+    """
+    Fast read-only counterpart of ProductSerializer.
+    
+    Works on plain row tuples from values_list() instead of model instances, and produces
+    the same output as ProductSerializer without building a field tree per request.
+    
+    Attributes:
+        fields (list): The fields to serialize, in ProductSerializer order
+    
+    Methods:
+        select(queryset): Returns the row tuples this serializer expects for a queryset
+        to_representation(row): Converts one row tuple into a dictionary
+        serialize(rows): Converts an iterable of row tuples into a list of dictionaries
+    """
+    # The conversion each ProductSerializer field applies in to_representation
+    field_converters = {
+        serializers.IntegerField: int,
+        serializers.FloatField: float,
+        serializers.CharField: str,
+    }
+    _converters = None
+    
+    def __init__(self, fields=None):
+        self.fields = [name for name in ProductSerializer.Meta.fields if fields is None or name in fields]
+        converters = self.get_converters()
+        self._fields = [(name, converters[name]) for name in self.fields]
+        
+    @classmethod
+    def get_converters(cls):
+        """
+        Maps each ProductSerializer field to its conversion, built once from the declared fields
+        """
+        if cls._converters is None:
+            converters = {}
+            for name, field in ProductSerializer().fields.items():
+                if type(field) not in cls.field_converters:
+                    raise TypeError(f"ProductRowSerializer cannot serialize {type(field).__name__} field '{name}'")
+                converters[name] = cls.field_converters[type(field)]
+            cls._converters = converters
+        return cls._converters
+    
+    def select(self, queryset):
+        if 'quantity' not in self.fields:
+            return queryset.values_list(*self.fields)
+        # Sharded products keep their stock in StockShard rows
+        return queryset.with_total_quantity().values_list(*['stock_total' if name == 'quantity' else name for name in self.fields])
+    
+    @timed('serialize')
+    def to_representation(self, row):
+        # Like Serializer.to_representation, None is returned as is
+        return {name: None if value is None else convert(value) for (name, convert), value in zip(self._fields, row)}
+    
+    @timed('serialize')
+    def serialize(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
 class UserSignupSerializer(serializers.ModelSerializer):
     """Serializer for user signups. 
     
@@ -97,18 +215,22 @@ class OrderItemSerializer(serializers.ModelSerializer):
         product_id (int): The ID of the product in the database
         product_name (str): The name of the product in the database
         quantity (int): The amount of product requested
+        unit_price (float): The price of the product when the order was created
+        line_total (float): unit_price times quantity
     
     """
-    product_id = serializers.IntegerField(source='product.id') 
+    product_id = serializers.IntegerField(source='product.id', min_value=1, max_value=MAX_ID)
     product_name = serializers.CharField(source='product.product_name', read_only=True) 
-    quantity = serializers.IntegerField(source='product.product_quantity')
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_QUANTITY)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=False, read_only=True, help_text="The price of the product when the order was created")
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, coerce_to_string=False, read_only=True, help_text="The unit price times the quantity")
 
     class Meta:
         model = OrderItem
-        fields = ['product_id', 'quantity', 'product_name']
+        fields = ['product_id', 'quantity', 'product_name', 'unit_price', 'line_total']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """ 
     Serializer for the Order model
     
@@ -120,6 +242,9 @@ class OrderSerializer(serializers.ModelSerializer):
         order_date (datetime): The date the order is submitted. Set to readonly to return to the customer
         status (str): The status of the order. Set to readonly to return to the customer
         payment_method (str): The payment method used
+        total (float): The sum of the line totals. Set to readonly to return to the customer
+        item_count (int): The number of units ordered. Set to readonly to return to the customer
+        currency (str): The currency of the prices and total, e.g. 'USD'. Set to readonly to return to the customer
     """
     
     id = serializers.IntegerField(read_only=True, help_text="The unique order id")
@@ -127,45 +252,311 @@ class OrderSerializer(serializers.ModelSerializer):
     order_date = serializers.DateTimeField(read_only=True, help_text="Order date") 
     status = serializers.CharField(read_only=True, help_text="Order status") 
     payment_method = serializers.CharField(required=True, help_text="The payment method used")
+    total = serializers.DecimalField(max_digits=12, decimal_places=2, coerce_to_string=False, read_only=True, help_text="The sum of the line totals")
+    item_count = serializers.IntegerField(read_only=True, help_text="The number of units ordered")
+    currency = serializers.CharField(read_only=True, help_text="The currency of the prices and total")
     
 
     class Meta:
         model = Order
-        fields = ['id', 'payment_method', 'order_date', 'status', 'order_items']
+        fields = ['id', 'payment_method', 'order_date', 'status', 'total', 'item_count', 'currency', 'order_items']
         
+    @timed('serialize')
+    def to_representation(self, instance):
+        return super().to_representation(instance)
     
     
+    def validate_order_items(self, order_items):
+        """
+        Rejects empty orders and orders that reference products which do not exist.
+        
+        Runs before the transaction is opened so unknown products return a 400. When several
+        orders are validated together, the view passes the ids of the products that exist as
+        `known_product_ids` in the context so each order does not query them again.
+        """
+        if not order_items:
+            raise serializers.ValidationError("An order must contain at least one item.")
+        
+        product_ids = {order_item['product']['id'] for order_item in order_items}
+        found_ids = self.context.get('known_product_ids')
+        if found_ids is None:
+            found_ids = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+        missing_ids = sorted(product_ids - found_ids)
+        if missing_ids:
+            raise serializers.ValidationError(f"Product(s) {', '.join(map(str, missing_ids))} do not exist.")
+        return order_items
+    
     def create(self, order_data):
         '''
-        Creates an order in the Brew Ha Ha database    
+        Creates an order in the Brew Ha Ha database
+        
+        Stock is decremented with one conditional update that only matches products which
+        still have enough stock, so concurrent orders cannot oversell a product. The order
+        items are then inserted with one bulk insert.
+        
         Parameters:
             order_data (dict): A dictionary containing the data for the order        
         Returns:
             order: The newly created order with the order items
+        Raises:
+            serializers.ValidationError: If a product does not have enough stock left
+        '''
+        return self.create_many([order_data])[0]
+    
+    @classmethod
+    def create_many(cls, orders_data, all_or_nothing=True):
+        '''
+        Creates several validated orders in one transaction
+        
+        Orders and order items are each inserted with one bulk insert. With all_or_nothing,
+        stock for the whole batch is decremented with one conditional update and the batch
+        fails as a unit. Otherwise each order's stock is decremented in its own savepoint and
+        orders that are out of stock are skipped.
+        
+        Parameters:
+            orders_data (list): The validated data for each order
+            all_or_nothing (bool): Reject the whole batch if any order is out of stock
+        Returns:
+            list: The created Order, or the ValidationError that rejected it, for each order
+        Raises:
+            BatchOutOfStock: If all_or_nothing is set and a product does not have enough stock left
+        '''
+        results = [None] * len(orders_data)
+        requested = cls.requested_quantities(order_item for order_data in orders_data for order_item in order_data['order_items'])
+        
+        try:
+            # Ensure transaction is successful before committing to the DB
+            with transaction.atomic():
+                if all_or_nothing:
+                    cls.decrement_stock(requested)
+                    accepted = list(range(len(orders_data)))
+                else:
+                    accepted = []
+                    for index, order_data in enumerate(orders_data):
+                        order_requested = cls.requested_quantities(order_data['order_items'])
+                        try:
+                            with transaction.atomic():
+                                cls.decrement_stock(order_requested)
+                            accepted.append(index)
+                        except OutOfStock:
+                            results[index] = cls.out_of_stock_error(order_requested)
+                
+                if accepted:
+                    orders = cls.insert_orders([orders_data[index] for index in accepted])
+                    for index, order in zip(accepted, orders):
+                        results[index] = order
+        except OutOfStock:
+            # The transaction has been rolled back, so report what is short right now
+            short = cls.short_products(requested)
+            if short is None:
+                error = cls.stock_error([])
+                raise BatchOutOfStock(error.detail, [error] * len(orders_data))
+            order_errors = []
+            for order_data in orders_data:
+                product_ids = {order_item_data['product']['id'] for order_item_data in order_data['order_items']}
+                names = [name for product_id, name in short.items() if product_id in product_ids]
+                order_errors.append(cls.stock_error(names) if names else None)
+            raise BatchOutOfStock(cls.stock_error(list(short.values())).detail, order_errors)
+        
+        if accepted:
+            # Stock changed, so the cached catalog is stale
+            catalog_cache.bump_version()
+        
+        return results
+    
+    @staticmethod
+    def insert_orders(orders_data):
+        '''
+        Inserts orders and their items with one bulk insert each
+        
+        The prices are read inside the order transaction, and each item's unit price and line
+        total and each order's total and item count are computed while the rows are built.
+        The items are then added to the daily sales rollup in the same transaction.
         '''
-        order_items_data = order_data.pop('order_items') 
+        product_ids = {order_item_data['product']['id'] for order_data in orders_data for order_item_data in order_data['order_items']}
+        prices = {product_id: to_amount(price) for product_id, price in Product.objects.filter(id__in=product_ids).values_list('id', 'price')}
+        
+        orders, order_items = [], []
+        for order_data in orders_data:
+            order = Order(**{key: value for key, value in order_data.items() if key != 'order_items'}, total=Decimal(0), item_count=0)
+            for order_item_data in order_data['order_items']:
+                product_id, quantity = order_item_data['product']['id'], order_item_data['quantity']
+                order_item = OrderItem(order=order, product_id=product_id, quantity=quantity, unit_price=prices[product_id], line_total=prices[product_id] * quantity)
+                order.total += order_item.line_total
+                order.item_count += quantity
+                order_items.append(order_item)
+            orders.append(order)
+        
+        if connection.features.can_return_rows_from_bulk_insert:
+            Order.objects.bulk_create(orders)
+        else:
+            # The primary keys are needed for the items
+            for order in orders:
+                order.save()
+        
+        OrderItem.objects.bulk_create(order_items)
+        add_sales(daily_sales(order_items))
+        return orders
+    
+    @staticmethod
+    def requested_quantities(order_items_data):
+        '''
+        Returns the total quantity requested per product, in case a product appears on several lines
+        '''
+        requested = Counter()
+        for order_item_data in order_items_data:
+            requested[order_item_data['product']['id']] += order_item_data['quantity']
+        return requested
+    
+    @staticmethod
+    def decrement_stock(requested):
+        '''
+        Decrements stock for every product in a single conditional update
+        
+        The stock check happens inside the UPDATE statement, so it is atomic with the write.
+        The rows that did have enough stock are still updated, so roll back on OutOfStock.
+        Products with sharded stock are skipped by that update and decremented shard by
+        shard, which costs one more query only when the order contains one.
         
-        # Ensure transaction is successful before committing to the DB
-        with transaction.atomic():  
-            order = Order.objects.create(**order_data) 
-            
-            for order_item_data in order_items_data: 
-                # Gets the product id for the order item
-                product = Product.objects.get(id=order_item_data['product']['id']) 
+        The required quantity per product is a CASE rather than one OR term per product,
+        which SQLite nests one level deeper per term and rejects past 1000 levels. Orders
+        with more than STOCK_UPDATE_BATCH_SIZE products are updated in several statements
+        to stay under the query parameter limit.
+        
+        Parameters:
+            requested (Counter): The quantity requested per product id
+        Raises:
+            OutOfStock: If any product does not have enough stock left
+        '''
+        products = list(requested.items())
+        updated = 0
+        for start in range(0, len(products), STOCK_UPDATE_BATCH_SIZE):
+            batch = products[start:start + STOCK_UPDATE_BATCH_SIZE]
+            updated += Product.objects.filter(
+                id__in=[product_id for product_id, _ in batch],
+                stock_shards=0,
+                quantity__gte=Case(*[When(id=product_id, then=quantity) for product_id, quantity in batch]),
+            ).update(
+                quantity=Case(
+                    *[When(id=product_id, then=F('quantity') - quantity) for product_id, quantity in batch],
+                    default=F('quantity'),
+                )
+            )
+        if updated == len(requested):
+            return
+        
+        sharded = dict(Product.objects.filter(id__in=requested, stock_shards__gt=0).values_list('id', 'stock_shards'))
+        if updated != len(requested) - len(sharded):
+            raise OutOfStock()
+        for product_id, shards in sharded.items():
+            if not decrement_shards(product_id, shards, requested[product_id]):
+                raise OutOfStock()
+    
+    @staticmethod
+    def short_products(requested):
+        '''
+        Returns the names of the products that are short by id, once the decrement was rolled back
+        
+        Returns None when the shortage cannot be found again, because a product was deleted
+        or restocked since.
+        '''
+        products = Product.objects.filter(id__in=requested).with_total_quantity().only('product_name')
+        short = {product.id: product.product_name for product in products if product.stock_total < requested[product.id]}
+        if len(products) < len(requested) or not short:
+            return None
+        return short
+    
+    @staticmethod
+    def stock_error(names):
+        '''
+        Returns a ValidationError naming the products that are out of stock, or a generic one without names
+        '''
+        if not names:
+            return serializers.ValidationError("One or more products are out of stock.")
+        return serializers.ValidationError(f"{', '.join(names)} {'is' if len(names) == 1 else 'are'} out of stock.")
+    
+    @classmethod
+    def out_of_stock_error(cls, requested):
+        '''
+        Returns a ValidationError naming the products that are short, once the decrement was rolled back
+        '''
+        short = cls.short_products(requested)
+        return cls.stock_error(list(short.values()) if short else [])
+    
+
+class BulkOrderResultSerializer(serializers.Serializer):
+    """
+    Serializer for the result of each order in a bulk order request
+    
+    Fields:
+        id (int): The unique ID of the created order, if it was created
+        errors (dict): Why the order was rejected, if it was rejected
+    """
+    id = serializers.IntegerField(required=False, help_text="The unique order id, if the order was created")
+    errors = serializers.JSONField(required=False, help_text="Why the order was rejected, if it was rejected")
+
+class SalesQuerySerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the sales report
+    
+    Fields:
+        start (date): The first day of the report, 29 days before end by default
+        end (date): The last day of the report, today by default
+        product_id (int): Only report the sales of this product
+        group_by (str): 'day' for the sales per day, 'product' for the sales per product
+        top (int): Only return this many products, the best sellers by revenue first
+    """
+    start = serializers.DateField(required=False, help_text="The first day of the report, 29 days before `end` by default")
+    end = serializers.DateField(required=False, help_text="The last day of the report, today by default")
+    product_id = serializers.IntegerField(required=False, min_value=1, max_value=MAX_ID, help_text="Only report the sales of this product")
+    group_by = serializers.ChoiceField(choices=['day', 'product'], default='day', help_text="Sales per `day` or per `product`")
+    top = serializers.IntegerField(required=False, min_value=1, max_value=100, help_text="Only return the best selling products by revenue. Requires `group_by=product`.")
+    
+    default_days = 30
+    
+    def validate(self, data):
+        data.setdefault('end', timezone.localdate())
+        data.setdefault('start', data['end'] - timedelta(days=self.default_days - 1))
+        if data['start'] > data['end']:
+            raise serializers.ValidationError({"start": "The start date must not be after the end date."})
+        if 'top' in data and data['group_by'] != 'product':
+            raise serializers.ValidationError({"top": "top can only be used with group_by=product."})
+        return data
 
-                # Verify that the item is still in stock
-                if order_item_data['quantity'] > product.quantity:
-                    raise serializers.ValidationError(f"{product.product_name} is out of stock.")
 
-                # Create the OrderItem
-                OrderItem.objects.create(order=order, product=product, quantity=order_item_data['quantity'])
+class SalesRowSerializer(serializers.Serializer):
+    """
+    Serializer for one row of the sales report, a day or a product depending on group_by
+    """
+    day = serializers.DateField(read_only=True, help_text="The day, when grouped by day")
+    product_id = serializers.IntegerField(read_only=True, help_text="The product id, when grouped by product")
+    product_name = serializers.CharField(read_only=True, help_text="The product name, when grouped by product")
+    units = serializers.IntegerField(read_only=True, help_text="The number of units sold")
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, coerce_to_string=False, read_only=True, help_text="The revenue of the units sold")
 
-                # Update the product quantity 
-                product.quantity -= order_item_data['quantity']
-                product.save()
-        
-        return order
+
+class SalesReportSerializer(serializers.Serializer):
+    """
+    Serializer for the sales report
     
+    Fields:
+        start (date): The first day of the report
+        end (date): The last day of the report
+        group_by (str): Whether the rows are days or products
+        currency (str): The currency of the revenue
+        units (int): The number of units sold in the report's days
+        revenue (float): The revenue in the report's days
+        results (SalesRowSerializer): The sales per day or per product. Days without sales are left out.
+    """
+    start = serializers.DateField(read_only=True)
+    end = serializers.DateField(read_only=True)
+    group_by = serializers.CharField(read_only=True)
+    currency = serializers.CharField(read_only=True)
+    units = serializers.IntegerField(read_only=True, help_text="The number of units sold in the report's days")
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, coerce_to_string=False, read_only=True, help_text="The revenue in the report's days")
+    results = SalesRowSerializer(many=True, read_only=True)
+
+
 class BadRequestSerializer(serializers.Serializer):
     """
     Serializer for the 401 Unauthorized response
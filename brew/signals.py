@@ -0,0 +1,32 @@
+from functools import partial
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import CachedJWTAuthentication
+from .cache import catalog_cache
+from .models import Product
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog(sender, **kwargs):
+    """
+    Invalidates the cached catalog when a product is saved or deleted, e.g. through the admin
+    
+    The version is bumped once the transaction commits, so that another request cannot cache
+    the old product again under the new version before the change is visible.
+    """
+    transaction.on_commit(catalog_cache.bump_version)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user(sender, instance, **kwargs):
+    """
+    Removes a user from the authentication cache when it is changed, deactivated or deleted
+    
+    Like invalidate_catalog, this waits for the transaction to commit.
+    """
+    transaction.on_commit(partial(CachedJWTAuthentication.invalidate, getattr(instance, api_settings.USER_ID_FIELD)))
@@ -1,5 +1,39 @@
-from django.test import TestCase
-from .models import Product
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest.mock import patch
+from django.test import TestCase, TransactionTestCase, Client, AsyncClient, override_settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from .models import Product, Order, OrderItem, StockShard, DailySales, IdempotencyRecord
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .serializers import OrderSerializer, ProductSerializer, ProductRowSerializer
+from .cache import catalog_cache
+from .views import ProductViewSet
+from .pagination import KeysetPagination
+from .idempotency import IdempotencyStore, DatabaseIdempotencyStore, idempotency_store
+from .inventory import shard_stock
+from .processing import OrderQueue, OrderWorker
+from .hashers import hashing_pool
+from .instrumentation import request_metrics
+from .openapi import apply_view_schemas
 
 # Create your tests here.
 class SignupTestCalls(TestCase):
@@ -139,4 +173,1462 @@ class GetResourceById(TestCase):
         
         print(f"Response content: {response.content}")
         
-        self.assertEqual(response.status_code, 200)
\ No newline at end of file
+        self.assertEqual(response.status_code, 200)
+        
+class AuthenticatedTestCase(TestCase):
+    
+    def setUp(self):
+        '''
+        Signs up a user and stores a JWT for authenticated requests
+        '''
+        user_data = {
+            'username': 'johndoe',
+            'password': 'password123'
+        }
+        self.client.post('/api/signup/', user_data, format='json')
+        response = self.client.post('/api/tokens/', user_data, follow=True)
+        self.token = response.json().get('access')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {self.token}'}
+        # Authenticate once so later requests resolve the user from the cache
+        self.client.get('/api/ping/', **self.auth)
+        
+        
+class CreateOrderCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.latte = Product.objects.create(product_name='latte', temperature='hot', caffeine_amount=95, price=2.5, description='Rich and smooth brew', quantity=8)
+        self.muffin = Product.objects.create(product_name='muffin', price=2.0, description='A fluffy, warm blueberry muffin', quantity=3)
+        
+    def post_order(self, order_items):
+        return self.client.post('/api/orders/', data={
+            'payment_method': 'Credit',
+            'order_items': order_items
+        }, content_type='application/json', **self.auth)
+        
+    def test_create_order(self):
+        '''Tests that an order is created and stock is decremented'''
+        response = self.post_order([
+            {'product_id': self.latte.id, 'quantity': 2},
+            {'product_id': self.muffin.id, 'quantity': 1},
+            {'product_id': self.latte.id, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['order_items']), 3)
+        
+        self.latte.refresh_from_db()
+        self.muffin.refresh_from_db()
+        self.assertEqual(self.latte.quantity, 5)
+        self.assertEqual(self.muffin.quantity, 2)
+        
+    def test_create_order_totals(self):
+        '''Tests that the items are priced and the order totals are stored when the order is created'''
+        response = self.post_order([
+            {'product_id': self.latte.id, 'quantity': 2},
+            {'product_id': self.muffin.id, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 201)
+        order = response.json()
+        self.assertEqual((order['total'], order['item_count'], order['currency']), (7.0, 3, 'USD'))
+        self.assertEqual([(item['unit_price'], item['line_total']) for item in order['order_items']], [(2.5, 5.0), (2.0, 2.0)])
+        
+        # A later price change does not rewrite the order
+        Product.objects.filter(id=self.latte.id).update(price=3.0)
+        response = self.client.get(f"/api/orders/{order['id']}/", **self.auth)
+        self.assertEqual(response.json()['total'], 7.0)
+        self.assertEqual(response.json()['order_items'][0]['unit_price'], 2.5)
+        
+    def test_backfill_order_totals(self):
+        '''Tests that the migration backfill prices existing orders, chunk by chunk'''
+        backfill = import_module('brew.migrations.0011_backfill_order_totals')
+        orders = [Order.objects.create(payment_method='Credit') for _ in range(3)]
+        OrderItem.objects.create(order=orders[0], product=self.latte, quantity=2)
+        OrderItem.objects.create(order=orders[0], product=self.muffin, quantity=1)
+        OrderItem.objects.create(order=orders[2], product=self.muffin, quantity=3)
+        
+        with patch.object(backfill, 'CHUNK_SIZE', 2):
+            backfill.backfill_order_totals(apps, connection.schema_editor())
+        
+        totals = [(order.total, order.item_count) for order in Order.objects.order_by('id')]
+        self.assertEqual(totals, [(Decimal('7.00'), 3), (Decimal('0.00'), 0), (Decimal('6.00'), 3)])
+        self.assertEqual(OrderItem.objects.get(order=orders[0], product=self.latte).line_total, Decimal('5.00'))
+        
+    def test_create_order_unknown_product(self):
+        '''Tests that an unknown product id is rejected with a 400'''
+        response = self.post_order([{'product_id': 9999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 0)
+        
+    def test_create_order_product_id_too_large(self):
+        '''Tests that a product id no id column can hold is rejected with a 400, not a 500'''
+        for product_id in (99999999999999999999, 0):
+            response = self.post_order([{'product_id': product_id, 'quantity': 1}])
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('product_id', response.json()['order_items'][0])
+        self.assertEqual(Order.objects.count(), 0)
+        
+    def test_create_order_out_of_stock(self):
+        '''Tests that an order is rejected and stock is untouched when a product runs out'''
+        response = self.post_order([
+            {'product_id': self.latte.id, 'quantity': 1},
+            {'product_id': self.muffin.id, 'quantity': 4},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('muffin is out of stock.', response.json())
+        self.assertEqual(Order.objects.count(), 0)
+        
+        self.latte.refresh_from_db()
+        self.assertEqual(self.latte.quantity, 8)
+        
+    def test_create_order_quantity_too_large(self):
+        '''Tests that a quantity no integer column can hold is rejected with a 400, not a 500'''
+        response = self.post_order([{'product_id': self.latte.id, 'quantity': 10**20}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json()['order_items'][0])
+        
+        response = self.client.post('/api/orders/bulk/?mode=partial', data=[
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.latte.id, 'quantity': 1}]},
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.latte.id, 'quantity': 10**20}]},
+        ], content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('quantity', response.json()[1]['errors']['order_items'][0])
+        self.assertEqual(Order.objects.count(), 1)
+        
+    def test_create_order_with_many_products(self):
+        '''Tests that an order for more than 1000 products is decremented, in several updates'''
+        Product.objects.bulk_create([Product(product_name=f'cookie{i}', price=1.0, description='A cookie', quantity=1) for i in range(1200)])
+        cookies = list(Product.objects.filter(product_name__startswith='cookie').order_by('id'))
+        Product.objects.filter(id=cookies[-1].id).update(quantity=0)
+        
+        # The last product is in the third update and out of stock, so the first two are rolled back
+        response = self.post_order([{'product_id': cookie.id, 'quantity': 1} for cookie in cookies])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.filter(product_name__startswith='cookie', quantity=1).count(), 1199)
+        
+        response = self.post_order([{'product_id': cookie.id, 'quantity': 1} for cookie in cookies[:-1]])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['item_count'], 1199)
+        self.assertFalse(Product.objects.filter(product_name__startswith='cookie', quantity__gt=0).exists())
+        
+    def test_create_order_query_count_is_constant(self):
+        '''Tests that the number of queries does not grow with the number of items'''
+        products = [Product.objects.create(product_name=f'cookie{i}', price=1.0, description='A cookie', quantity=10) for i in range(20)]
+        
+        with CaptureQueriesContext(connection) as small_order:
+            serializer = OrderSerializer(data={'payment_method': 'Debit', 'order_items': [{'product_id': products[0].id, 'quantity': 1}]})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            
+        with CaptureQueriesContext(connection) as large_order:
+            serializer = OrderSerializer(data={'payment_method': 'Debit', 'order_items': [{'product_id': product.id, 'quantity': 1} for product in products]})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            
+        self.assertEqual(len(small_order), len(large_order))
+
+
+class GetOrderCalls(AuthenticatedTestCase):
+    
+    def create_order(self, item_count):
+        order = Order.objects.create(payment_method='Credit')
+        for i in range(item_count):
+            product = Product.objects.create(product_name=f'scone{i}', price=2.0, description='A scone', quantity=10)
+            OrderItem.objects.create(order=order, product=product, quantity=i + 1)
+        return order
+    
+    def test_get_order(self):
+        '''Tests that an order is returned with the quantity of each item'''
+        order = self.create_order(2)
+        response = self.client.get(f'/api/orders/{order.id}/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item['product_name'], item['quantity']) for item in response.json()['order_items']],
+            [('scone0', 1), ('scone1', 2)]
+        )
+        
+    def test_get_order_query_budget(self):
+        '''Tests that an order is read in a fixed number of queries whatever the item count'''
+        for item_count in (1, 20):
+            order = self.create_order(item_count)
+            # Order, items joined with their products
+            with self.assertNumQueries(2):
+                response = self.client.get(f'/api/orders/{order.id}/', **self.auth)
+            self.assertEqual(len(response.json()['order_items']), item_count)
+            
+    def test_create_order_query_budget(self):
+        '''Tests that the create response does not lazy load each product'''
+        products = [Product.objects.create(product_name=f'bagel{i}', price=1.5, description='A bagel', quantity=5) for i in range(20)]
+        # Product validation, savepoint, stock update, prices, order insert, item insert, sales
+        # rollup insert and update, release savepoint, then order and items joined with their products
+        with self.assertNumQueries(11):
+            response = self.client.post('/api/orders/', data={
+                'payment_method': 'Debit',
+                'order_items': [{'product_id': product.id, 'quantity': 1} for product in products]
+            }, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 201)
+
+
+class ProductCacheCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        catalog_cache.cache.clear()
+        catalog_cache.reset_stats()
+        self.mocha = Product.objects.create(product_name='mocha', temperature='hot', caffeine_amount=105, price=3.75, description='Espresso and chocolate', quantity=8)
+        
+    def test_list_served_from_cache(self):
+        '''Tests that a repeated list request does not query the products table'''
+        self.client.get('/api/products/', **self.auth)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', **self.auth)
+        self.assertEqual(response.json()[0]['product_name'], 'mocha')
+        self.assertEqual(catalog_cache.stats()['hits'], 1)
+        self.assertEqual(catalog_cache.stats()['misses'], 1)
+        
+    def test_product_save_invalidates_cache(self):
+        '''Tests that saving a product, e.g. through the admin, invalidates the cache'''
+        self.client.get(f'/api/products/{self.mocha.id}/', **self.auth)
+        self.mocha.price = 4.0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mocha.save()
+        response = self.client.get(f'/api/products/{self.mocha.id}/', **self.auth)
+        self.assertEqual(response.json()['price'], 4.0)
+        
+    def test_product_save_invalidates_cache_on_commit(self):
+        '''Tests that the catalog version is only bumped once the product change commits'''
+        version = catalog_cache.get_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.mocha.save()
+            self.assertEqual(catalog_cache.get_version(), version)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(catalog_cache.get_version(), version)
+        
+    def test_order_invalidates_cache(self):
+        '''Tests that creating an order invalidates the cached stock'''
+        self.client.get('/api/products/', **self.auth)
+        self.client.post('/api/orders/', data={
+            'payment_method': 'Credit',
+            'order_items': [{'product_id': self.mocha.id, 'quantity': 3}]
+        }, content_type='application/json', **self.auth)
+        response = self.client.get('/api/products/', **self.auth)
+        self.assertEqual(response.json()[0]['quantity'], 5)
+        
+    def test_missing_product_not_cached(self):
+        '''Tests that a 404 is not cached'''
+        response = self.client.get('/api/products/9999/', **self.auth)
+        self.assertEqual(response.status_code, 404)
+        Product.objects.create(id=9999, product_name='cortado', price=4.0, description='Espresso and milk', quantity=5)
+        response = self.client.get('/api/products/9999/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+
+
+class StreamProductsCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        Product.objects.bulk_create([
+            Product(product_name=f'tea{i}', temperature='hot', price=2.0, description='A cup of tea', quantity=i)
+            for i in range(5)
+        ])
+        
+    def test_stream_matches_list(self):
+        '''Tests that ?stream=1 returns the same JSON as the regular list'''
+        expected = self.client.get('/api/products/', **self.auth).content
+        with patch.object(ProductViewSet, 'stream_chunk_size', 2):
+            response = self.client.get('/api/products/?stream=1', **self.auth)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), expected)
+        
+    def test_stream_ndjson(self):
+        '''Tests that an NDJSON Accept header returns one product per line'''
+        response = self.client.get('/api/products/', HTTP_ACCEPT='application/x-ndjson', **self.auth)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['product_name'] for line in lines], [f'tea{i}' for i in range(5)])
+        
+    def test_stream_empty_catalog(self):
+        '''Tests that an empty catalog streams an empty array'''
+        Product.objects.all().delete()
+        response = self.client.get('/api/products/?stream=1', **self.auth)
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+        
+    def test_stream_requires_authentication(self):
+        '''Tests that streaming still requires a JWT'''
+        response = self.client.get('/api/products/?stream=1')
+        self.assertEqual(response.status_code, 401)
+
+
+class SparseFieldsetCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        catalog_cache.cache.clear()
+        self.mocha = Product.objects.create(product_name='mocha', temperature='hot', caffeine_amount=105, price=3.75, description='Espresso and chocolate', quantity=8)
+        self.order = Order.objects.create(payment_method='Credit', total=7.5, item_count=2)
+        OrderItem.objects.create(order=self.order, product=self.mocha, quantity=2, unit_price=3.75, line_total=7.5)
+        
+    def test_product_fields(self):
+        '''Tests that ?fields= trims the products and the SELECT'''
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/?fields=id,product_name,quantity', **self.auth)
+        self.assertEqual(response.json(), [{'id': self.mocha.id, 'product_name': 'mocha', 'quantity': 8}])
+        self.assertNotIn('description', queries[-1]['sql'])
+        
+    def test_product_exclude(self):
+        '''Tests that ?exclude= removes fields from a single product'''
+        response = self.client.get(f'/api/products/{self.mocha.id}/?exclude=description,temperature', **self.auth)
+        self.assertEqual(set(response.json()), {'id', 'product_name', 'caffeine_amount', 'price', 'quantity'})
+        
+    def test_product_fields_do_not_share_cache(self):
+        '''Tests that a sparse response is not served for a full request'''
+        self.client.get('/api/products/?fields=id', **self.auth)
+        response = self.client.get('/api/products/', **self.auth)
+        self.assertIn('description', response.json()[0])
+        
+    def test_unknown_field(self):
+        '''Tests that an unknown field is rejected with a 400'''
+        response = self.client.get('/api/products/?fields=id,secret', **self.auth)
+        self.assertEqual(response.status_code, 400)
+        
+    def test_order_without_items(self):
+        '''Tests that excluding order_items skips loading the items'''
+        # Order only
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/orders/{self.order.id}/?exclude=order_items', **self.auth)
+        self.assertEqual(set(response.json()), {'id', 'payment_method', 'order_date', 'status', 'total', 'item_count', 'currency'})
+        
+    def test_order_items_only(self):
+        '''Tests that an order can return only its items'''
+        response = self.client.get(f'/api/orders/{self.order.id}/?fields=order_items', **self.auth)
+        self.assertEqual(response.json(), {'order_items': [{'product_id': self.mocha.id, 'quantity': 2, 'product_name': 'mocha', 'unit_price': 3.75, 'line_total': 7.5}]})
+
+
+class ProductRowSerializerTests(TestCase):
+    
+    def setUp(self):
+        Product.objects.create(product_name='café au lait', temperature='hot', caffeine_amount=80, price=3.25, description='Coffee with steamed milk', quantity=4)
+        Product.objects.create(product_name='croissant', price=2, description='Buttery and flaky', quantity=0)
+        
+    def test_matches_product_serializer(self):
+        '''Tests that the row serializer renders the same bytes as ProductSerializer'''
+        expected = JSONRenderer().render(ProductSerializer(Product.objects.all(), many=True).data)
+        serializer = ProductRowSerializer()
+        rendered = JSONRenderer().render(serializer.serialize(serializer.select(Product.objects.all())))
+        self.assertEqual(rendered, expected)
+        
+    def test_matches_sparse_product_serializer(self):
+        '''Tests that the row serializer respects a sparse fieldset'''
+        fields = ['quantity', 'id', 'price']
+        expected = JSONRenderer().render(ProductSerializer(Product.objects.all(), many=True, fields=fields).data)
+        serializer = ProductRowSerializer(fields=fields)
+        rendered = JSONRenderer().render(serializer.serialize(serializer.select(Product.objects.all())))
+        self.assertEqual(rendered, expected)
+
+
+class BulkOrderCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.latte = Product.objects.create(product_name='latte', price=2.5, description='Rich and smooth brew', quantity=5)
+        self.muffin = Product.objects.create(product_name='muffin', price=2.0, description='A fluffy, warm blueberry muffin', quantity=1)
+        
+    def post_bulk(self, orders, mode=None):
+        url = '/api/orders/bulk/' + (f'?mode={mode}' if mode else '')
+        return self.client.post(url, data=orders, content_type='application/json', **self.auth)
+    
+    def test_bulk_create(self):
+        '''Tests that every order in a batch is created'''
+        response = self.post_bulk([
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.latte.id, 'quantity': 2}]},
+            {'payment_method': 'Debit', 'order_items': [{'product_id': self.latte.id, 'quantity': 1}, {'product_id': self.muffin.id, 'quantity': 1}]},
+        ])
+        self.assertEqual(response.status_code, 201)
+        ids = [result['id'] for result in response.json()]
+        self.assertEqual(list(Order.objects.order_by('id').values_list('id', flat=True)), ids)
+        self.assertEqual(OrderItem.objects.filter(order_id=ids[1]).count(), 2)
+        self.latte.refresh_from_db()
+        self.assertEqual(self.latte.quantity, 2)
+        
+    def test_bulk_all_or_nothing(self):
+        '''Tests that one invalid or out of stock order rejects the whole batch'''
+        response = self.post_bulk([
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.latte.id, 'quantity': 1}]},
+            {'payment_method': 'Credit', 'order_items': [{'product_id': 9999, 'quantity': 1}]},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn('order_items', response.json()[1]['errors'])
+        
+        response = self.post_bulk([
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.muffin.id, 'quantity': 1}]},
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.latte.id, 'quantity': 1}]},
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.latte.id, 'quantity': 1}, {'product_id': self.muffin.id, 'quantity': 1}]},
+        ])
+        self.assertEqual(response.status_code, 400)
+        # Only the orders holding the muffin, which is short for the batch, report it
+        error = {'errors': {'non_field_errors': ['muffin is out of stock.']}}
+        self.assertEqual(response.json(), [error, {}, error])
+        self.assertEqual(Order.objects.count(), 0)
+        self.muffin.refresh_from_db()
+        self.assertEqual(self.muffin.quantity, 1)
+        
+    def test_bulk_partial(self):
+        '''Tests that partial mode creates the valid orders and reports the others'''
+        response = self.post_bulk([
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.muffin.id, 'quantity': 1}]},
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.muffin.id, 'quantity': 1}]},
+            {'payment_method': 'Credit', 'order_items': [{'product_id': 9999, 'quantity': 1}]},
+            {'payment_method': 'Debit', 'order_items': [{'product_id': self.latte.id, 'quantity': 5}]},
+        ], mode='partial')
+        self.assertEqual(response.status_code, 201)
+        results = response.json()
+        self.assertIn('id', results[0])
+        self.assertEqual(results[1]['errors'], {'non_field_errors': ['muffin is out of stock.']})
+        self.assertIn('errors', results[2])
+        self.assertIn('id', results[3])
+        self.assertEqual(Order.objects.count(), 2)
+        
+    def test_bulk_product_ids_parsed_like_create(self):
+        '''Tests that the bulk endpoint accepts the same product ids as POST /api/orders/'''
+        response = self.post_bulk([
+            {'payment_method': 'Credit', 'order_items': [{'product_id': f'{self.latte.id}.0', 'quantity': 1}]},
+            {'payment_method': 'Credit', 'order_items': [{'product_id': str(self.muffin.id), 'quantity': 1}]},
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+        
+        response = self.post_bulk([
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.latte.id, 'quantity': 1}]},
+            {'payment_method': 'Credit', 'order_items': [{'product_id': 99999999999999999999, 'quantity': 1}]},
+        ], mode='partial')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('product_id', response.json()[1]['errors']['order_items'][0])
+        
+    def test_bulk_query_count_is_constant(self):
+        '''Tests that an all-or-nothing batch does not add queries per order'''
+        orders = [{'payment_method': 'Credit', 'order_items': [{'product_id': self.latte.id, 'quantity': 1}]}]
+        with CaptureQueriesContext(connection) as one_order:
+            self.post_bulk(orders)
+        with CaptureQueriesContext(connection) as four_orders:
+            self.post_bulk(orders * 4)
+        self.assertEqual(len(one_order), len(four_orders))
+        
+    def test_bulk_rejects_bad_body(self):
+        '''Tests that a body that is not an array of orders is rejected'''
+        self.assertEqual(self.post_bulk({'payment_method': 'Credit'}).status_code, 400)
+        self.assertEqual(self.post_bulk([], mode='sometimes').status_code, 400)
+
+
+
+class CachedJWTAuthenticationCalls(AuthenticatedTestCase):
+    
+    def test_user_resolved_from_cache(self):
+        '''Tests that an authenticated request does not query the user'''
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ping/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        
+    def test_deactivated_user_rejected(self):
+        '''Tests that deactivating a user invalidates the cached user'''
+        user = User.objects.get(username='johndoe')
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        response = self.client.get('/api/ping/', **self.auth)
+        self.assertEqual(response.status_code, 401)
+        
+    def test_deleted_user_rejected(self):
+        '''Tests that deleting a user invalidates the cached user'''
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(username='johndoe').delete()
+        response = self.client.get('/api/ping/', **self.auth)
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(ROOT_URLCONF='app.asgi_urls')
+class AsyncViewCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        catalog_cache.cache.clear()
+        self.mocha = Product.objects.create(product_name='mocha', temperature='hot', caffeine_amount=105, price=3.75, description='Espresso and chocolate', quantity=8)
+        self.async_client = AsyncClient()
+        self.async_auth = {'headers': {'Authorization': f'Bearer {self.token}'}}
+        
+    async def test_async_product_list_matches_sync(self):
+        '''Tests that the async product list renders the same bytes as the sync view'''
+        response = await self.async_client.get('/api/products/', **self.async_auth)
+        self.assertEqual(response.status_code, 200, response.content)
+        with override_settings(ROOT_URLCONF='app.urls'):
+            catalog_cache.cache.clear()
+            expected = await self.async_client.get('/api/products/', **self.async_auth)
+        self.assertEqual(response.content, expected.content)
+        
+    async def test_async_product_detail(self):
+        '''Tests that the async view returns a single product or a 404'''
+        response = await self.async_client.get(f'/api/products/{self.mocha.id}/', **self.async_auth)
+        self.assertEqual(response.json()['product_name'], 'mocha')
+        response = await self.async_client.get('/api/products/9999/', **self.async_auth)
+        self.assertEqual(response.status_code, 404)
+        
+    async def test_async_requires_authentication(self):
+        '''Tests that the async views reject requests without a valid JWT'''
+        response = await AsyncClient().get('/api/products/')
+        self.assertEqual(response.status_code, 401)
+        response = await AsyncClient().get('/api/products/', headers={'Authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, 401)
+        
+    async def test_async_create_and_retrieve_order(self):
+        '''Tests that an order created through the async view can be read back'''
+        response = await self.async_client.post('/api/orders/', data={
+            'payment_method': 'Credit',
+            'order_items': [{'product_id': self.mocha.id, 'quantity': 2}]
+        }, content_type='application/json', **self.async_auth)
+        self.assertEqual(response.status_code, 201)
+        
+        response = await self.async_client.get(f"/api/orders/{response.json()['id']}/", **self.async_auth)
+        self.assertEqual(response.json()['order_items'], [{'product_id': self.mocha.id, 'quantity': 2, 'product_name': 'mocha', 'unit_price': 3.75, 'line_total': 7.5}])
+        
+        response = await self.async_client.post('/api/orders/', data={
+            'payment_method': 'Credit',
+            'order_items': [{'product_id': self.mocha.id, 'quantity': 20}]
+        }, content_type='application/json', **self.async_auth)
+        self.assertEqual(response.status_code, 400)
+        
+    async def test_async_falls_back_to_sync_view(self):
+        '''Tests that features only the DRF views support are still served'''
+        response = await self.async_client.get('/api/products/?fields=id', **self.async_auth)
+        self.assertEqual(response.json(), [{'id': self.mocha.id}])
+
+    async def test_async_stream_matches_list(self):
+        '''Tests that ?stream=1 is streamed from an async iterator with the same JSON as the list'''
+        await Product.objects.abulk_create([
+            Product(product_name=f'tea{i}', temperature='hot', price=2.0, description='A cup of tea', quantity=i)
+            for i in range(4)
+        ])
+        expected = (await self.async_client.get('/api/products/', **self.async_auth)).content
+        with patch.object(ProductViewSet, 'stream_chunk_size', 2):
+            response = await self.async_client.get('/api/products/?stream=1', **self.async_auth)
+            self.assertTrue(response.is_async)
+            self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), expected)
+
+        response = await self.async_client.get('/api/products/?stream=1&fields=id', **self.async_auth)
+        products = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual(products, [{'id': pk} async for pk in Product.objects.order_by('pk').values_list('pk', flat=True)])
+        response = await self.async_client.get('/api/products/?stream=1&fields=nope', **self.async_auth)
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_stream_ndjson(self):
+        '''Tests that an NDJSON Accept header is streamed one product per line'''
+        response = await self.async_client.get('/api/products/', headers={'Accept': 'application/x-ndjson', **self.async_auth['headers']})
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual([json.loads(line)['product_name'] for line in lines], ['mocha'])
+
+        response = await AsyncClient().get('/api/products/?stream=1')
+        self.assertEqual(response.status_code, 401)
+
+
+class ExplainQueriesCommandTests(TestCase):
+    
+    def test_indexes_used(self):
+        '''Tests that the order queries use the order indexes'''
+        output = StringIO()
+        call_command('explain_queries', stdout=output)
+        self.assertIn('USING INDEX order_status_date_idx', output.getvalue())
+        self.assertIn('USING INDEX order_date_idx', output.getvalue())
+        self.assertIn('USING INDEX orderitem_product_order_idx', output.getvalue())
+        
+    def test_cursor_seeks_into_index(self):
+        '''Tests that a page after the first seeks into order_date_idx rather than scanning it'''
+        pagination = KeysetPagination()
+        queryset = Order.objects.filter(pagination.after(datetime(2025, 1, 1, tzinfo=dt_timezone.utc), 10)).order_by('-order_date', '-id')
+        self.assertRegex(queryset.explain(), r'SEARCH brew_order USING (COVERING )?INDEX order_date_idx \(order_date<\?\)')
+
+    def test_product_indexes(self):
+        '''Tests that rows of a product are found through the composite index starting with product alone'''
+        for model, columns, name in ((OrderItem, ['product_id', 'order_id'], 'orderitem_product_order_idx'), (DailySales, ['product_id', 'day'], 'dailysales_product_day_idx')):
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            indexes = [constraint['columns'] for constraint in constraints.values() if constraint['index'] and 'product_id' in constraint['columns']]
+            self.assertIn(columns, indexes)
+            self.assertNotIn(['product_id'], indexes)
+            self.assertIn(f'USING COVERING INDEX {name}', model.objects.filter(product_id=1).values('id').explain())
+
+
+class ListOrderCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.latte = Product.objects.create(product_name='latte', price=2.5, description='Rich and smooth brew', quantity=5)
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self.orders = []
+        for i in range(25):
+            # Pairs of orders share a date to exercise the id tie-break
+            order = Order.objects.create(
+                payment_method='Credit' if i % 2 else 'Debit',
+                status='completed' if i % 5 == 0 else 'in progress',
+                order_date=start + timedelta(days=i // 2)
+            )
+            OrderItem.objects.create(order=order, product=self.latte, quantity=1)
+            self.orders.append(order)
+        # Newest first
+        self.expected = sorted(self.orders, key=lambda order: (order.order_date, order.id), reverse=True)
+        
+    def test_list_pages(self):
+        '''Tests that following next links returns every order once, newest first'''
+        ids = []
+        url = '/api/orders/?page_size=7'
+        while url:
+            response = self.client.get(url, **self.auth)
+            self.assertEqual(response.status_code, 200)
+            ids += [order['id'] for order in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(ids, [order.id for order in self.expected])
+        
+    def test_list_filters(self):
+        '''Tests the status, payment method and date filters'''
+        response = self.client.get('/api/orders/?status=completed&payment_method=Debit', **self.auth)
+        self.assertEqual(
+            [order['id'] for order in response.json()['results']],
+            [order.id for order in self.expected if order.status == 'completed' and order.payment_method == 'Debit']
+        )
+        response = self.client.get('/api/orders/?order_date_after=2025-01-03&order_date_before=2025-01-05T00:00:00Z', **self.auth)
+        self.assertEqual(
+            [order['id'] for order in response.json()['results']],
+            [order.id for order in self.expected if date(2025, 1, 3) <= order.order_date.date() < date(2025, 1, 5)]
+        )
+        
+    def test_list_bad_parameters(self):
+        '''Tests that an invalid date or cursor is rejected'''
+        self.assertEqual(self.client.get('/api/orders/?order_date_after=yesterday', **self.auth).status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/?cursor=nonsense', **self.auth).status_code, 404)
+        
+    def test_list_page_size_is_bounded(self):
+        '''Tests that the page size cannot exceed the maximum'''
+        with patch.object(KeysetPagination, 'max_page_size', 10):
+            response = self.client.get('/api/orders/?page_size=1000', **self.auth)
+        self.assertEqual(len(response.json()['results']), 10)
+        
+    def test_list_query_budget(self):
+        '''Tests that a page takes a fixed number of queries whatever its size'''
+        for page_size in (2, 20):
+            # Orders, items joined with their products
+            with self.assertNumQueries(2):
+                response = self.client.get(f'/api/orders/?page_size={page_size}', **self.auth)
+            self.assertEqual(len(response.json()['results']), page_size)
+
+
+class IdempotentOrderCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        idempotency_store.cache.clear()
+        self.latte = Product.objects.create(product_name='latte', price=2.5, description='Rich and smooth brew', quantity=8)
+        
+    def post_order(self, key, quantity=1):
+        return self.client.post('/api/orders/', data={
+            'payment_method': 'Credit',
+            'order_items': [{'product_id': self.latte.id, 'quantity': quantity}]
+        }, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key, **self.auth)
+        
+    def test_retry_replays_first_response(self):
+        '''Tests that a retry returns the first order without creating another or touching the database'''
+        first = self.post_order('retry-1')
+        self.assertEqual(first.status_code, 201)
+        
+        with self.assertNumQueries(0):
+            retry = self.post_order('retry-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        
+        self.assertEqual(Order.objects.count(), 1)
+        self.latte.refresh_from_db()
+        self.assertEqual(self.latte.quantity, 7)
+        
+    def test_different_keys_create_different_orders(self):
+        '''Tests that each key submits its own order'''
+        self.post_order('first')
+        self.post_order('second')
+        self.assertEqual(Order.objects.count(), 2)
+        
+    def test_key_reused_with_different_body(self):
+        '''Tests that a key cannot be reused for another request'''
+        self.post_order('reused')
+        response = self.post_order('reused', quantity=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+        
+    def test_validation_error_is_replayed(self):
+        '''Tests that a rejected order is replayed as the same rejection'''
+        first = self.post_order('too-many', quantity=100)
+        self.assertEqual(first.status_code, 400)
+        with self.assertNumQueries(0):
+            retry = self.post_order('too-many', quantity=100)
+        self.assertEqual(retry.status_code, 400)
+        self.assertEqual(retry.json(), first.json())
+        
+    def test_exception_releases_key(self):
+        '''Tests that a request that fails with an exception can be retried'''
+        with patch.object(OrderSerializer, 'create_many', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post_order('crash')
+        response = self.post_order('crash')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        
+    def test_parallel_retries_run_once(self):
+        '''Tests that duplicates arriving while the first request runs wait for its response'''
+        store = IdempotencyStore(wait_interval=0.01)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        
+        def handler():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return Response({'id': 1}, status=201)
+        
+        responses = []
+        first = threading.Thread(target=lambda: responses.append(store.run('idempotency:parallel', 'body', handler)))
+        first.start()
+        started.wait(5)
+        retries = [threading.Thread(target=lambda: responses.append(store.run('idempotency:parallel', 'body', handler))) for _ in range(4)]
+        for thread in retries:
+            thread.start()
+        release.set()
+        for thread in [first, *retries]:
+            thread.join(5)
+            
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(responses), 5)
+        self.assertTrue(all(response.status_code == 201 and response.data == {'id': 1} for response in responses))
+        self.assertEqual(sum('Idempotent-Replayed' in response for response in responses), 4)
+        
+    def test_wait_times_out(self):
+        '''Tests that a duplicate gives up with a 409 when the first request does not finish in time'''
+        store = IdempotencyStore(wait_timeout=0)
+        store.cache.add('idempotency:stuck', {'fingerprint': 'body', 'response': None})
+        response = store.run('idempotency:stuck', 'body', lambda: Response(status=201))
+        self.assertEqual(response.status_code, 409)
+
+
+class ParallelIdempotentOrderCalls(TransactionTestCase):
+    
+    def setUp(self):
+        idempotency_store.cache.clear()
+        self.latte = Product.objects.create(product_name='latte', price=2.5, description='Rich and smooth brew', quantity=8)
+        user_data = {'username': 'johndoe', 'password': 'password123'}
+        self.client.post('/api/signup/', user_data)
+        token = self.client.post('/api/tokens/', user_data).json()['access']
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        self.client.get('/api/ping/', **self.auth)
+        
+    def test_parallel_requests_create_one_order(self):
+        '''Tests that parallel retries through the API create one order and decrement stock once'''
+        data = {'payment_method': 'Credit', 'order_items': [{'product_id': self.latte.id, 'quantity': 1}]}
+        responses = []
+        
+        def post():
+            responses.append(Client().post('/api/orders/', data=data, content_type='application/json', HTTP_IDEMPOTENCY_KEY='parallel', **self.auth))
+            connections.close_all()
+        
+        threads = [threading.Thread(target=post) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        
+        self.assertEqual([response.status_code for response in responses], [201] * 6)
+        self.assertEqual(len({response.json()['id'] for response in responses}), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.latte.refresh_from_db()
+        self.assertEqual(self.latte.quantity, 7)
+
+
+class DatabaseIdempotencyCalls(TestCase):
+    
+    def setUp(self):
+        self.store = DatabaseIdempotencyStore(wait_interval=0.01)
+        
+    def test_claim_is_shared_between_workers(self):
+        '''Tests that a key claimed by one worker makes another wait for, then replay, its response'''
+        first, other = DatabaseIdempotencyStore(), DatabaseIdempotencyStore(wait_timeout=0)
+        self.assertTrue(first.claim('idempotency:shared', 'body'))
+        self.assertFalse(other.claim('idempotency:shared', 'body'))
+        
+        def handler():
+            raise AssertionError("A duplicate ran the request")
+        
+        self.assertEqual(other.run('idempotency:shared', 'body', handler).status_code, 409)
+        first.save('idempotency:shared', 'body', Response({'id': 1, 'total': Decimal('7.50')}, status=201))
+        response = other.run('idempotency:shared', 'body', handler)
+        self.assertEqual((response.status_code, response.data), (201, {'id': 1, 'total': 7.5}))
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(other.run('idempotency:shared', 'other body', handler).status_code, 422)
+        
+    def test_api_retry_is_replayed(self):
+        '''Tests that an order retried through the API is replayed from the database'''
+        latte = Product.objects.create(product_name='latte', price=2.5, description='Rich and smooth brew', quantity=8)
+        user_data = {'username': 'johndoe', 'password': 'password123'}
+        self.client.post('/api/signup/', user_data)
+        auth = {'HTTP_AUTHORIZATION': f"Bearer {self.client.post('/api/tokens/', user_data).json()['access']}"}
+        data = {'payment_method': 'Credit', 'order_items': [{'product_id': latte.id, 'quantity': 1}]}
+        
+        with patch('brew.idempotency.idempotency_store', self.store):
+            first = self.client.post('/api/orders/', data=data, content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry', **auth)
+            retry = self.client.post('/api/orders/', data=data, content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry', **auth)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        
+    def test_expired_claim_is_claimed_again(self):
+        '''Tests that the claim of a crashed worker stops blocking the key once it expires'''
+        IdempotencyRecord.objects.create(key='idempotency:crashed', fingerprint='body', expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.store.run('idempotency:crashed', 'body', lambda: Response({'id': 1}, status=201))
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(IdempotencyRecord.objects.get(key='idempotency:crashed').response, {'id': 1})
+        
+    def test_server_error_releases_key(self):
+        '''Tests that a key whose request failed with a server error can be used again'''
+        self.store.run('idempotency:failed', 'body', lambda: Response(status=503))
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+
+class ShardedStockCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        catalog_cache.cache.clear()
+        self.espresso = Product.objects.create(product_name='espresso', price=3.0, description='A single shot', quantity=10)
+        shard_stock(self.espresso.id, 4)
+        
+    def post_order(self, quantity):
+        return self.client.post('/api/orders/', data={
+            'payment_method': 'Credit',
+            'order_items': [{'product_id': self.espresso.id, 'quantity': quantity}]
+        }, content_type='application/json', **self.auth)
+        
+    def shard_quantities(self):
+        return list(StockShard.objects.filter(product=self.espresso).order_by('shard').values_list('quantity', flat=True))
+        
+    def test_shard_stock_splits_evenly(self):
+        '''Tests that the stock is moved into evenly split shards'''
+        self.assertEqual(self.shard_quantities(), [3, 3, 2, 2])
+        self.espresso.refresh_from_db()
+        self.assertEqual((self.espresso.quantity, self.espresso.stock_shards), (0, 4))
+        
+    def test_products_report_summed_quantity(self):
+        '''Tests that the product endpoints and ProductSerializer report the stock of every shard'''
+        self.assertEqual(self.client.get(f'/api/products/{self.espresso.id}/', **self.auth).json()['quantity'], 10)
+        self.assertEqual(self.client.get('/api/products/', **self.auth).json()[0]['quantity'], 10)
+        self.assertEqual(ProductSerializer(Product.objects.get(pk=self.espresso.id)).data['quantity'], 10)
+        
+    def test_order_decrements_one_shard(self):
+        '''Tests that a small order is taken from a single shard'''
+        response = self.post_order(2)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sum(self.shard_quantities()), 8)
+        self.assertEqual(sum(1 for before, after in zip([3, 3, 2, 2], self.shard_quantities()) if before != after), 1)
+        
+    def test_order_falls_back_across_shards(self):
+        '''Tests that an order larger than any shard is taken from several shards'''
+        response = self.post_order(9)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sum(self.shard_quantities()), 1)
+        self.assertTrue(all(quantity >= 0 for quantity in self.shard_quantities()))
+        
+    def test_order_out_of_stock(self):
+        '''Tests that an order for more than every shard holds is rejected and nothing is decremented'''
+        response = self.post_order(11)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('espresso is out of stock.', response.json())
+        self.assertEqual(self.shard_quantities(), [3, 3, 2, 2])
+        
+    def test_drain_every_shard(self):
+        '''Tests that single orders can sell the whole stock and no more'''
+        codes = [self.post_order(1).status_code for _ in range(11)]
+        self.assertEqual(codes, [201] * 10 + [400])
+        self.assertEqual(self.shard_quantities(), [0, 0, 0, 0])
+        
+    def test_unshard_stock(self):
+        '''Tests that one shard moves the stock back into the product row'''
+        self.post_order(3)
+        shard_stock(self.espresso.id, 1)
+        self.espresso.refresh_from_db()
+        self.assertEqual((self.espresso.quantity, self.espresso.stock_shards), (7, 0))
+        self.assertFalse(StockShard.objects.exists())
+        
+    def test_shard_stock_command(self):
+        '''Tests that the shard_stock command reshards a product'''
+        out = StringIO()
+        call_command('shard_stock', self.espresso.id, shards=16, stdout=out)
+        self.assertIn('espresso: 10 in stock across 16 row(s).', out.getvalue())
+        self.assertEqual(StockShard.objects.filter(product=self.espresso).count(), 16)
+
+
+class OrderQueueTests(TestCase):
+    
+    def setUp(self):
+        self.latte = Product.objects.create(product_name='latte', price=2.5, description='Rich and smooth brew', quantity=10)
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self.orders = []
+        for i in range(5):
+            order = Order.objects.create(payment_method='Credit', order_date=start + timedelta(minutes=i))
+            OrderItem.objects.create(order=order, product=self.latte, quantity=2)
+            self.orders.append(order)
+        self.queue = OrderQueue()
+        
+    def test_claim_skips_leased_orders(self):
+        '''Tests that two claims lease different orders, oldest first'''
+        first_token, first = self.queue.claim(3, lease_seconds=60)
+        second_token, second = self.queue.claim(3, lease_seconds=60)
+        self.assertEqual([order.id for order in first], [order.id for order in self.orders[:3]])
+        self.assertEqual([order.id for order in second], [order.id for order in self.orders[3:]])
+        self.assertEqual(self.queue.claim(3, lease_seconds=60)[1], [])
+        
+    def test_expired_lease_is_claimed_again(self):
+        '''Tests that orders are claimed again once their lease expires'''
+        self.queue.claim(5, lease_seconds=60)
+        Order.objects.update(leased_until=datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(len(self.queue.claim(5, lease_seconds=60)[1]), 5)
+        
+    def test_finish_updates_statuses_and_restocks_canceled(self):
+        '''Tests that statuses are saved in bulk and canceled orders return their stock'''
+        token, orders = self.queue.claim(5, lease_seconds=60)
+        statuses = {order.id: Order.COMPLETED for order in orders[:3]}
+        statuses.update({order.id: Order.CANCELED for order in orders[3:]})
+        with self.assertNumQueries(10):
+            # Canceled ids, their items, sharded products, restock, sales rollup insert and update,
+            # two status updates, inside a transaction
+            self.assertEqual(self.queue.finish(token, statuses), 5)
+            
+        self.assertEqual(Order.objects.filter(status=Order.COMPLETED).count(), 3)
+        self.assertEqual(Order.objects.filter(status=Order.CANCELED).count(), 2)
+        self.assertFalse(Order.objects.exclude(lease_token=None).exists())
+        self.latte.refresh_from_db()
+        self.assertEqual(self.latte.quantity, 14)
+        
+    def test_finish_ignores_lost_lease(self):
+        '''Tests that a worker whose lease was taken over does not change the orders'''
+        token, orders = self.queue.claim(5, lease_seconds=60)
+        Order.objects.update(lease_token='another-worker')
+        self.assertEqual(self.queue.finish(token, {order.id: Order.CANCELED for order in orders}), 0)
+        self.assertEqual(self.queue.depth(), 5)
+        self.latte.refresh_from_db()
+        self.assertEqual(self.latte.quantity, 10)
+        
+    def test_worker_drains_queue(self):
+        '''Tests that a worker processes every order and records its metrics'''
+        worker = OrderWorker(batch_size=2)
+        worker.run(threading.Event(), drain=True)
+        self.assertEqual(self.queue.depth(), 0)
+        snapshot = worker.metrics.snapshot()
+        self.assertEqual((snapshot['processed'], snapshot['completed'], snapshot['batches']), (5, 5, 3))
+        self.assertGreater(snapshot['lag_p50_s'], 0)
+        
+    def test_failed_batch_is_released(self):
+        '''Tests that a batch that fails to process can be claimed again right away'''
+        worker = OrderWorker(batch_size=5)
+        with patch.object(OrderWorker, 'process_batch', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                worker.run_once()
+        self.assertEqual(worker.metrics.snapshot()['failures'], 1)
+        self.assertEqual(len(self.queue.claim(5, lease_seconds=60)[1]), 5)
+
+
+class ProcessOrdersCommandTests(TransactionTestCase):
+    
+    def test_concurrent_workers_process_each_order_once(self):
+        '''Tests that several worker threads settle every order exactly once'''
+        latte = Product.objects.create(product_name='latte', price=2.5, description='Rich and smooth brew', quantity=10)
+        orders = Order.objects.bulk_create([Order(payment_method='Debit') for _ in range(60)])
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=latte, quantity=1) for order in orders])
+        
+        processed = Counter()
+        lock = threading.Lock()
+        
+        def process_batch(worker, batch):
+            with lock:
+                processed.update(order.id for order in batch)
+            return {order.id: Order.COMPLETED for order in batch}
+        
+        out = StringIO()
+        with patch.object(OrderWorker, 'process_batch', process_batch):
+            call_command('process_orders', concurrency=4, batch_size=7, poll_interval=0.01, drain=True, stdout=out)
+        
+        self.assertEqual(set(processed), {order.id for order in orders})
+        self.assertEqual(max(processed.values()), 1)
+        self.assertEqual(Order.objects.filter(status=Order.COMPLETED).count(), 60)
+        self.assertIn('processed=60', out.getvalue())
+        self.assertIn('queue_depth=0', out.getvalue())
+
+
+class SalesRollupTests(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.latte = Product.objects.create(product_name='latte', price=2.5, description='Rich and smooth brew', quantity=50)
+        self.muffin = Product.objects.create(product_name='muffin', price=2.0, description='A fluffy, warm blueberry muffin', quantity=50)
+        
+    def post_order(self, order_items):
+        response = self.client.post('/api/orders/', data={'payment_method': 'Credit', 'order_items': order_items}, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+    
+    def rollup(self):
+        return {(row.day, row.product_id): (row.units, row.revenue) for row in DailySales.objects.all()}
+        
+    def test_orders_add_to_rollup(self):
+        '''Tests that creating orders, one at a time or in bulk, adds them to the rollup of the day'''
+        self.post_order([{'product_id': self.latte.id, 'quantity': 2}, {'product_id': self.muffin.id, 'quantity': 1}])
+        self.post_order([{'product_id': self.latte.id, 'quantity': 1}])
+        response = self.client.post('/api/orders/bulk/', data=[
+            {'payment_method': 'Credit', 'order_items': [{'product_id': self.muffin.id, 'quantity': 2}]},
+            {'payment_method': 'Debit', 'order_items': [{'product_id': self.latte.id, 'quantity': 1}]},
+        ], content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 201)
+        
+        today = timezone.localdate()
+        self.assertEqual(self.rollup(), {
+            (today, self.latte.id): (4, Decimal('10.00')),
+            (today, self.muffin.id): (3, Decimal('6.00')),
+        })
+        
+    def test_canceled_orders_leave_rollup(self):
+        '''Tests that canceling an order in the order queue takes it out of the rollup'''
+        self.post_order([{'product_id': self.latte.id, 'quantity': 2}])
+        self.post_order([{'product_id': self.latte.id, 'quantity': 1}])
+        queue = OrderQueue()
+        token, orders = queue.claim(1, lease_seconds=60)
+        queue.finish(token, {orders[0].id: Order.CANCELED})
+        self.assertEqual(self.rollup(), {(timezone.localdate(), self.latte.id): (1, Decimal('2.50'))})
+        
+    def test_rebuild_sales(self):
+        '''Tests that the rebuild command regenerates the same rollup from the orders, chunk by chunk'''
+        for quantity in (1, 2, 3):
+            self.post_order([{'product_id': self.latte.id, 'quantity': quantity}, {'product_id': self.muffin.id, 'quantity': 1}])
+        queue = OrderQueue()
+        token, orders = queue.claim(1, lease_seconds=60)
+        queue.finish(token, {orders[0].id: Order.CANCELED})
+        expected = self.rollup()
+        
+        DailySales.objects.update(units=0, revenue=0)
+        DailySales.objects.create(day=date(2025, 1, 1), product=self.latte, units=5, revenue=12.5)
+        out = StringIO()
+        call_command('rebuild_sales', chunk_size=1, stdout=out)
+        self.assertEqual(self.rollup(), expected)
+        self.assertIn('Summed 3 orders into 2 daily sales rows', out.getvalue())
+        
+        with self.assertRaises(CommandError):
+            call_command('rebuild_sales', chunk_size=0, stdout=StringIO())
+
+
+class SalesAnalyticsCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.latte = Product.objects.create(product_name='latte', price=2.5, description='Rich and smooth brew', quantity=10)
+        self.muffin = Product.objects.create(product_name='muffin', price=2.0, description='A fluffy, warm blueberry muffin', quantity=10)
+        DailySales.objects.bulk_create([
+            DailySales(day=date(2025, 1, 1), product=self.latte, units=3, revenue=7.5),
+            DailySales(day=date(2025, 1, 1), product=self.muffin, units=1, revenue=2.0),
+            DailySales(day=date(2025, 1, 2), product=self.latte, units=1, revenue=2.5),
+            DailySales(day=date(2025, 2, 1), product=self.muffin, units=5, revenue=10.0),
+        ])
+        
+    def get_sales(self, query):
+        return self.client.get(f'/api/analytics/sales/?{query}', **self.auth)
+        
+    def test_sales_per_day(self):
+        '''Tests the sales per day in a date range, read from the rollup only'''
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_sales('start=2025-01-01&end=2025-01-31')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'start': '2025-01-01', 'end': '2025-01-31', 'group_by': 'day', 'currency': 'USD', 'units': 5, 'revenue': 12.0,
+            'results': [{'day': '2025-01-01', 'units': 4, 'revenue': 9.5}, {'day': '2025-01-02', 'units': 1, 'revenue': 2.5}],
+        })
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('brew_order', queries[0]['sql'])
+        
+    def test_top_products(self):
+        '''Tests that top returns the best sellers by revenue, and the totals still count every product'''
+        response = self.get_sales('start=2025-01-01&end=2025-02-28&group_by=product&top=1')
+        self.assertEqual(response.json()['results'], [{'product_id': self.muffin.id, 'product_name': 'muffin', 'units': 6, 'revenue': 12.0}])
+        self.assertEqual((response.json()['units'], response.json()['revenue']), (10, 22.0))
+        
+    def test_sales_of_one_product(self):
+        '''Tests that product_id only reports the sales of that product'''
+        response = self.get_sales(f'start=2025-01-01&end=2025-02-28&product_id={self.latte.id}')
+        self.assertEqual([row['day'] for row in response.json()['results']], ['2025-01-01', '2025-01-02'])
+        self.assertEqual(response.json()['revenue'], 10.0)
+        
+    def test_default_range(self):
+        '''Tests that the report covers the last 30 days by default'''
+        DailySales.objects.create(day=timezone.localdate(), product=self.latte, units=2, revenue=5.0)
+        response = self.get_sales('')
+        self.assertEqual(response.json()['start'], str(timezone.localdate() - timedelta(days=29)))
+        self.assertEqual([row['units'] for row in response.json()['results']], [2])
+        
+    def test_invalid_query(self):
+        '''Tests that invalid parameters are rejected with a 400'''
+        for query in ('start=2025-02-01&end=2025-01-01', 'start=yesterday', 'group_by=week', 'top=5', 'group_by=product&top=0', 'product_id=0', 'product_id=99999999999999999999'):
+            self.assertEqual(self.get_sales(query).status_code, 400, query)
+        
+    def test_sales_requires_authentication(self):
+        '''Tests that the report requires a token'''
+        self.assertEqual(self.client.get('/api/analytics/sales/').status_code, 401)
+
+
+class PasswordHashingCalls(TestCase):
+    
+    user_data = {'username': 'johndoe', 'password': 'password123'}
+    
+    def tearDown(self):
+        hashing_pool.configure(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE)
+        
+    def test_hashing_runs_on_pool(self):
+        '''Tests that signup and login hash passwords on the pool threads'''
+        threads = []
+        encode = PBKDF2PasswordHasher.encode
+        
+        def record_thread(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return encode(*args, **kwargs)
+        
+        with patch.object(PBKDF2PasswordHasher, 'encode', record_thread):
+            self.client.post('/api/signup/', self.user_data)
+            response = self.client.post('/api/tokens/', self.user_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(name.startswith('password-hasher') for name in threads))
+        
+    def test_saturated_pool_returns_503(self):
+        '''Tests that signups and logins are rejected while every worker is busy and the queue is full'''
+        self.client.post('/api/signup/', self.user_data)
+        hashing_pool.configure(1, 0)
+        started = threading.Event()
+        release = threading.Event()
+        
+        def busy():
+            started.set()
+            release.wait(5)
+        
+        blocker = threading.Thread(target=hashing_pool.run, args=(busy,))
+        blocker.start()
+        started.wait(5)
+        try:
+            for url, data in [('/api/tokens/', self.user_data), ('/api/signup/', {'username': 'janedoe', 'password': 'password123'})]:
+                response = self.client.post(url, data)
+                self.assertEqual(response.status_code, 503)
+                self.assertEqual(response['Retry-After'], '1')
+        finally:
+            release.set()
+            blocker.join(5)
+        self.assertFalse(User.objects.filter(username='janedoe').exists())
+        self.assertEqual(self.client.post('/api/tokens/', self.user_data).status_code, 200)
+        
+    def test_rehash_on_login_when_cost_changes(self):
+        '''Tests that a password is rehashed with the configured cost when the user logs in'''
+        with self.settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.client.post('/api/signup/', self.user_data)
+        self.assertTrue(User.objects.get(username='johndoe').password.startswith('pbkdf2_sha256$1000$'))
+        
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            response = self.client.post('/api/tokens/', self.user_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(username='johndoe').password.startswith('pbkdf2_sha256$2000$'))
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class ProvisionUsersCommandTests(TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        User.objects.create_user(username='taken', password='password123')
+        
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+    
+    def read_rejects(self, path):
+        with open(f'{path}.rejects.jsonl') as file:
+            return [json.loads(line) for line in file]
+        
+    def test_provision_csv(self):
+        '''Tests that valid users are created and invalid ones are written to the rejects file'''
+        path = self.write('users.csv', 'username,password\nalice,password123\nbad user,password123\nbob,\ntaken,password123\nalice,password456\ncarol,secret42\n')
+        out = StringIO()
+        call_command('provision_users', path, processes=0, stdout=out)
+        
+        self.assertIn('6 records: 2 created, 4 rejected', out.getvalue())
+        self.assertTrue(User.objects.get(username='alice').check_password('password123'))
+        self.assertTrue(User.objects.get(username='carol').check_password('secret42'))
+        rejects = self.read_rejects(path)
+        self.assertEqual([reject['record'] for reject in rejects], [2, 3, 4, 5])
+        self.assertIn('username', rejects[0]['errors'])
+        self.assertIn('password', rejects[1]['errors'])
+        self.assertFalse(any('password123' in json.dumps(reject) for reject in rejects))
+        
+    def test_provision_jsonl_with_processes(self):
+        '''Tests that passwords hashed in worker processes can be used to log in'''
+        path = self.write('users.jsonl', '\n'.join(json.dumps({'username': f'user{i}', 'password': f'password{i}'}) for i in range(6)) + '\nnot json\n')
+        call_command('provision_users', path, processes=2, chunk_size=4, stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='user').count(), 6)
+        self.assertTrue(User.objects.get(username='user5').check_password('password5'))
+        self.assertEqual(self.read_rejects(path)[0]['record'], 7)
+        
+    def test_resume_after_failure(self):
+        '''Tests that a run that stops part way can be resumed without redoing finished chunks'''
+        path = self.write('users.csv', 'username,password\n' + ''.join(f'user{i},password{i}\n' for i in range(5)))
+        bulk_create = User.objects.bulk_create
+        calls = []
+        
+        def fail_second_chunk(users, *args, **kwargs):
+            calls.append(len(users))
+            if len(calls) == 2:
+                raise RuntimeError
+            return bulk_create(users, *args, **kwargs)
+        
+        with patch.object(User.objects, 'bulk_create', fail_second_chunk):
+            with self.assertRaises(RuntimeError):
+                call_command('provision_users', path, processes=0, chunk_size=2, stdout=StringIO())
+        with open(f'{path}.progress.json') as file:
+            self.assertEqual(json.load(file)['records'], 2)
+            
+        out = StringIO()
+        call_command('provision_users', path, processes=0, chunk_size=2, resume=True, stdout=out)
+        self.assertIn('5 records: 5 created, 0 rejected', out.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='user').count(), 5)
+
+
+class ProductImportExportCommandTests(TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.latte = Product.objects.create(product_name='latte', temperature='hot', caffeine_amount=95, price=2.5, description='Rich and smooth brew', quantity=8)
+        
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+        
+    def test_import_upserts_by_name(self):
+        '''Tests that existing names are updated, new names created and invalid records rejected'''
+        path = self.path('products.csv')
+        with open(path, 'w') as file:
+            file.write(
+                'product_name,temperature,caffeine_amount,price,description,quantity\n'
+                'latte,iced,100,3.0,Now iced,20\n'
+                'muffin,,,2.0,A fluffy muffin,5\n'
+                'scone,,,cheap,A scone,5\n'
+                'cookie,,,1.0,A cookie,\n'
+            )
+        catalog_cache.cache.clear()
+        version = catalog_cache.get_version()
+        out = StringIO()
+        call_command('import_products', path, chunk_size=2, stdout=out)
+        
+        self.assertIn('4 records: 1 created, 1 updated, 2 rejected', out.getvalue())
+        self.latte.refresh_from_db()
+        self.assertEqual((self.latte.temperature, self.latte.price, self.latte.quantity), ('iced', 3.0, 20))
+        muffin = Product.objects.get(product_name='muffin')
+        self.assertEqual((muffin.temperature, muffin.caffeine_amount), (None, None))
+        with open(f'{path}.rejects.jsonl') as file:
+            rejects = [json.loads(line) for line in file]
+        self.assertEqual([(reject['record'], list(reject['errors'])) for reject in rejects], [(3, ['price']), (4, ['quantity'])])
+        self.assertNotEqual(catalog_cache.get_version(), version)
+        
+    def test_import_resets_sharded_stock(self):
+        '''Tests that an imported quantity replaces the stock of a sharded product'''
+        shard_stock(self.latte.id, 4)
+        path = self.path('products.jsonl')
+        with open(path, 'w') as file:
+            file.write(json.dumps({'product_name': 'latte', 'price': 2.5, 'quantity': 40}) + '\n')
+        call_command('import_products', path, stdout=StringIO())
+        self.latte.refresh_from_db()
+        self.assertEqual((self.latte.total_quantity, self.latte.stock_shards), (40, 4))
+        
+    def test_export_round_trip(self):
+        '''Tests that an export can be imported again without changes'''
+        Product.objects.create(product_name='muffin', price=2.0, description='A fluffy muffin', quantity=5)
+        shard_stock(self.latte.id, 2)
+        for name in ('products.csv', 'products.jsonl'):
+            path = self.path(name)
+            call_command('export_products', path, chunk_size=1, stdout=StringIO())
+            out = StringIO()
+            call_command('import_products', path, stdout=out)
+            self.assertIn('2 records: 0 created, 2 updated, 0 rejected', out.getvalue())
+        
+        out = StringIO()
+        call_command('export_products', format='jsonl', stdout=out, stderr=StringIO())
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows[0], {'product_name': 'latte', 'temperature': 'hot', 'caffeine_amount': 95, 'price': 2.5, 'description': 'Rich and smooth brew', 'quantity': 8})
+        self.assertEqual(rows[1]['quantity'], 5)
+
+
+class InstrumentationCalls(AuthenticatedTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        catalog_cache.cache.clear()
+        request_metrics.reset()
+        self.mocha = Product.objects.create(product_name='mocha', temperature='hot', caffeine_amount=105, price=3.75, description='Espresso and chocolate', quantity=8)
+        
+    def server_timing(self, response):
+        metrics = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+        
+    def test_server_timing_header(self):
+        '''Tests that responses report their query count and the time spent in each phase'''
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', **self.auth)
+        timing = self.server_timing(response)
+        self.assertEqual(list(timing), ['db', 'view', 'serialize', 'render', 'total'])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(timing['db']['desc'], '"1 query"')
+        self.assertGreater(float(timing['serialize']['dur']), 0)
+        self.assertGreater(float(timing['render']['dur']), 0)
+        self.assertLessEqual(float(timing['view']['dur']), float(timing['total']['dur']))
+        
+    async def test_async_server_timing_header(self):
+        '''Tests that the async views are timed too'''
+        response = await AsyncClient().get('/api/products/', headers={'Authorization': f'Bearer {self.token}'})
+        timing = self.server_timing(response)
+        self.assertEqual(timing['db']['desc'], '"1 query"')
+        self.assertGreater(float(timing['render']['dur']), 0)
+        
+    def test_metrics_endpoint(self):
+        '''Tests that /api/metrics/ reports a histogram and counters per view in the Prometheus format'''
+        self.client.get('/api/products/', **self.auth)
+        self.client.get('/api/products/9999/', **self.auth)
+        self.client.get('/api/products/', **self.auth)
+        
+        response = self.client.get('/api/metrics/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('brew_http_request_duration_seconds_count{view="product-list",method="GET"} 2', lines)
+        self.assertIn('brew_http_request_duration_seconds_bucket{view="product-list",method="GET",le="+Inf"} 2', lines)
+        self.assertIn('brew_http_responses_total{view="product-detail",method="GET",status="404"} 1', lines)
+        self.assertIn('brew_catalog_cache_hits_total 1', lines)
+        self.assertIn('brew_order_queue_depth 0', lines)
+        
+    def test_metrics_requires_authentication(self):
+        '''Tests that the metrics are not public'''
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 401)
+        
+    @override_settings(REQUEST_METRICS=False)
+    def test_disabled(self):
+        '''Tests that requests are not timed when REQUEST_METRICS is off'''
+        response = Client().get('/api/products/', **self.auth)
+        self.assertNotIn('Server-Timing', response)
+        
+    def test_disabled_leaves_connections_alone(self):
+        '''Tests that with REQUEST_METRICS off, new connections do not get the query timer'''
+        script = (
+            'from django.core.wsgi import get_wsgi_application\n'
+            'get_wsgi_application()\n'
+            'from django.db import connection\n'
+            'from brew.instrumentation import time_query\n'
+            'connection.ensure_connection()\n'
+            'print(time_query in connection.execute_wrappers)\n'
+        )
+        for enabled, installed in (('0', 'False'), ('1', 'True')):
+            env = {**os.environ, 'REQUEST_METRICS': enabled, 'DATABASE_NAME': ':memory:', 'DJANGO_SETTINGS_MODULE': 'app.settings'}
+            result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(result.stdout.strip(), installed)
+
+
+class SchemaCalls(TestCase):
+    
+    def test_yaml_and_json(self):
+        '''Tests that the schema is served as YAML by default and as JSON on request'''
+        response = self.client.get('/api/schema/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi')
+        self.assertTrue(response.content.startswith(b'openapi: 3.0.3'))
+        
+        for response in (self.client.get('/api/schema/?format=json'), self.client.get('/api/schema/', headers={'Accept': 'application/json'})):
+            self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi+json')
+            self.assertIn('/api/products/', json.loads(response.content)['paths'])
+        
+        response = self.client.get('/api/schema/?format=xml')
+        self.assertEqual(response.status_code, 400)
+        
+    def test_gzip(self):
+        '''Tests that clients that accept gzip get the precompressed schema'''
+        plain = self.client.get('/api/schema/')
+        response = self.client.get('/api/schema/', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        self.assertEqual(response['Vary'], 'Accept, Accept-Encoding')
+        
+    def test_etag_and_cache_headers(self):
+        '''Tests that a matching ETag gets a 304 and that versioned URLs are cached for a year'''
+        response = self.client.get('/api/schema/')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300')
+        
+        response = self.client.get('/api/schema/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        
+        response = self.client.get(response['Content-Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        
+    def test_lazy_schema(self):
+        '''Tests that with LAZY_SCHEMA a process serves requests without loading the OpenAPI metadata'''
+        script = (
+            'import io, sys\n'
+            'from django.core.wsgi import get_wsgi_application\n'
+            'application = get_wsgi_application()\n'
+            "environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/ping/', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http'}\n"
+            'b"".join(application(environ, lambda *args: None))\n'
+            "print([name for name in ('brew.api_docs', 'drf_spectacular.utils', 'drf_spectacular.openapi') if name in sys.modules])\n"
+        )
+        env = {**os.environ, 'STARTUP_MODE': 'production', 'DJANGO_SETTINGS_MODULE': 'app.settings'}
+        result = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '[]')
+        
+        apply_view_schemas()
+        self.assertIn('schema', ProductViewSet.retrieve.kwargs)
+        
+    def test_check_schema(self):
+        '''Tests that the committed schema.yml is up to date and that a stale file is reported'''
+        call_command('check_schema', stdout=StringIO())
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'schema.yml')
+            with open(path, 'w') as file:
+                file.write('openapi: 3.0.3\n')
+            with self.assertRaises(CommandError):
+                call_command('check_schema', file=path, stdout=StringIO())
+            call_command('check_schema', file=path, write=True, stdout=StringIO())
+            call_command('check_schema', file=path, stdout=StringIO())
+
+
+class ProfileStartupCommandTests(TestCase):
+    
+    def test_profile_startup(self):
+        '''Tests that the command times a fresh process serving its first request and lists its imports'''
+        out = StringIO()
+        call_command('profile_startup', runs=1, top=3, stdout=out)
+        output = out.getvalue()
+        self.assertIn('first response: 401 Unauthorized', output)
+        self.assertIn('Slowest imports', output)
+        self.assertIn('django.core.wsgi', output)
@@ -2,6 +2,9 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import UserSignupView
 from .views import PingView
+from .views import MetricsView
+from .views import SchemaView
+from .views import SalesView
 from .views import ProductViewSet
 from .views import OrderViewSet
 
@@ -13,5 +16,8 @@ router.register(r'orders', OrderViewSet, basename='order')
 urlpatterns = [
     path('api/signup/', UserSignupView.as_view(), name='signup'),
     path('api/ping/', PingView.as_view(), name='ping'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/schema/', SchemaView.as_view(), name='schema'),
+    path('api/analytics/sales/', SalesView.as_view(), name='sales'),
     path('api/', include(router.urls)) 
 ]
\ No newline at end of file
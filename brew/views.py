@@ -1,165 +1,143 @@
+import re
 from django.shortcuts import get_object_or_404
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db.models import Prefetch, Sum
+from django.utils import timezone
+from django.utils.http import parse_etags
+from django.views import View
+from django.utils.dateparse import parse_date, parse_datetime
+from functools import partial
+from datetime import datetime, time
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework import viewsets
 from rest_framework.viewsets import ReadOnlyModelViewSet, GenericViewSet
-from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin
-from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiRequest
-from drf_spectacular.types import OpenApiTypes
+from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, ListModelMixin
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from .models import Product, Order
-from .serializers import ProductSerializer, UserSignupSerializer, OrderSerializer, BadRequestSerializer, UnauthorizedSerializer, NotFoundSerializer
+from rest_framework.settings import api_settings
+from .models import Product, Order, OrderItem, DailySales
+from .authentication import CachedJWTAuthentication
+from .cache import catalog_cache
+from .renderers import NDJSONRenderer, stream_serialized
+from .pagination import KeysetPagination
+from .idempotency import idempotent
+from .instrumentation import request_metrics
+from .hashers import hashing_pool
+from .openapi import schema_store
+from .serializers import BatchOutOfStock, ProductSerializer, ProductRowSerializer, UserSignupSerializer, OrderSerializer, SalesQuerySerializer, SalesReportSerializer
 
 # Create your views here.
 
-class ProductViewSet(ReadOnlyModelViewSet):
+
+class SparseFieldsetViewMixin:
+    """
+    View mixin for the `?fields=` and `?exclude=` query parameters.
+    
+    Trims the serializer to the requested fields and restricts the SELECT to the
+    columns those fields need.
+    """
+    # Model columns needed by serializer fields whose name is not a column
+    sparse_field_columns = {}
+    
+    def get_sparse_fields(self):
+        """
+        Returns the list of requested fields, or None when all fields are requested
+        
+        Raises:
+            ValidationError: If an unknown field is requested or every field is excluded
+        """
+        fields = self.request.query_params.get('fields')
+        exclude = self.request.query_params.get('exclude')
+        if not fields and not exclude:
+            return None
+        
+        available = self.serializer_class.Meta.fields
+        fields = [name for name in (fields or '').split(',') if name]
+        exclude = [name for name in (exclude or '').split(',') if name]
+        unknown = [name for name in fields + exclude if name not in available]
+        if unknown:
+            raise ValidationError({"detail": f"Unknown field(s): {', '.join(unknown)}."})
+        
+        selected = [name for name in available if (not fields or name in fields) and name not in exclude]
+        if not selected:
+            raise ValidationError({"detail": "At least one field must be returned."})
+        return selected
+    
+    def only_columns(self, queryset, selected):
+        """
+        Defers every model column the selected fields do not need
+        """
+        if selected is None:
+            return queryset
+        columns = [column for name in selected for column in self.sparse_field_columns.get(name, [name])]
+        return queryset.only(*columns or ['pk'])
+    
+    def get_sparse_serializer_class(self, selected):
+        if selected is None:
+            return self.serializer_class
+        return partial(self.serializer_class, fields=selected)
+
+
+class ProductViewSet(SparseFieldsetViewMixin, ReadOnlyModelViewSet):
     """ 
     View to get products from the Brew Ha Ha database
     """
     
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
     pagination_class = None 
     serializer_class = ProductSerializer
     queryset = Product.objects.all()
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+    # Number of products fetched and serialized at a time when streaming
+    stream_chunk_size = 2000
     
-    @extend_schema(
-        operation_id="retrieve_products",
-        description="Returns a single product from the database",
-        responses={
-            200: ProductSerializer,
-            400: BadRequestSerializer,
-            401: UnauthorizedSerializer,
-            404: NotFoundSerializer
-        },
-        examples=[
-            OpenApiExample(
-                name="Successful Response",
-                description="",
-                value=[
-                    {
-                        "id": 1,                 
-                        "product_name": "mocha",           
-                        "temperature": "hot",
-                        "caffeine_amount": 105,
-                        "price": 3.75,
-                        "description": "A rich, decadent blend of espresso and chocolate",
-                        "quantity": 8
-                    },
-                ],
-                status_codes=["200"]
-            ),
-            OpenApiExample(
-                name="Bad Request",
-                description="",
-                value={"detail": "The request body could not be read properly."},
-                response_only=True,
-                status_codes=["400"],
-            ),
-            OpenApiExample(
-                name="Unauthorized",
-                description="",
-                value={"detail": "Authentication credentials were not provided."},
-                response_only=True,
-                status_codes=["401"],
-            ),
-            OpenApiExample(
-                name="Not Found",
-                description="",
-                value={"detail": "No product matches the given query."},
-                response_only=True,
-                status_codes=["404"],
-            ),
-        ]
-    )    
     def retrieve(self, request, pk=None):
         """ 
         Handles GET requests to get a specific product
         """
-        queryset = Product.objects.all()
-        user = get_object_or_404(queryset, pk=pk)
-        serializer = ProductSerializer(user)
-        return Response(serializer.data)
+        selected = self.get_sparse_fields()
+        serializer = ProductRowSerializer(fields=selected)
+        
+        def build():
+            row = get_object_or_404(serializer.select(Product.objects.all()), pk=pk)
+            return serializer.to_representation(row)
+        
+        return Response(catalog_cache.get_or_set(self.cache_name(f'product:{pk}', selected), build))
     
-    @extend_schema(
-        operation_id="list_products",
-        description="Returns a list of all products in the database",
-        responses={
-            200: ProductSerializer,
-            400: BadRequestSerializer,
-            401: UnauthorizedSerializer,
-            404: NotFoundSerializer
-        },
-        examples=[
-            OpenApiExample(
-                name="Successful Response",
-                description="",
-                value=[
-                        {
-                            "id": 1,                 
-                            "product_name": "mocha",           
-                            "temperature": "hot",
-                            "caffeine_amount": 105,
-                            "price": 3.75,
-                            "description": "A rich, decadent blend of espresso and chocolate",
-                            "quantity": 8
-                        },
-                        {
-                            "id": 2,                 
-                            "product_name": "muffin",
-                            "price": 2.50,
-                            "description": "A fluffy, warm blueberry muffin",
-                            "quantity": 5
-                        },
-                        {
-                            "id": 3,                 
-                            "product_name": "cortado",
-                            "temperature": "hot",
-                            "caffeine_amount": 130,
-                            "price": 4.0,
-                            "description": "Made with beans picked from the coast of Spain",
-                            "quantity": 5
-                        }
-                    ],
-                status_codes=["200"]
-            ),
-            OpenApiExample(
-                name="Bad Request",
-                description="",
-                value={"detail": "The request body could not be read properly."},
-                response_only=True,
-                status_codes=["400"],
-            ),
-            OpenApiExample(
-                name="Unauthorized",
-                description="",
-                value={"detail": "Authentication credentials were not provided."},
-                response_only=True,
-                status_codes=["401"],
-            ),
-            OpenApiExample(
-                name="Not Found",
-                description="",
-                value={"detail": "No product matches the given query."},
-                response_only=True,
-                status_codes=["404"],
-            ),
-        ]
-    )  
     def list(self, request):
         """
         Handles GET requests to get all products in the database
         """
-        queryset = Product.objects.all()
-        serializer = ProductSerializer(queryset, many=True)
-        return Response(serializer.data)
+        selected = self.get_sparse_fields()
+        serializer = ProductRowSerializer(fields=selected)
+        
+        ndjson = isinstance(request.accepted_renderer, NDJSONRenderer)
+        if ndjson or request.query_params.get('stream') in ('1', 'true'):
+            return StreamingHttpResponse(
+                stream_serialized(serializer.select(Product.objects.order_by('pk')), serializer.serialize, self.stream_chunk_size, ndjson),
+                content_type=NDJSONRenderer.media_type if ndjson else 'application/json'
+            )
+        
+        def build():
+            return serializer.serialize(serializer.select(Product.objects.all()))
+        
+        return Response(catalog_cache.get_or_set(self.cache_name('list', selected), build))
+    
+    def cache_name(self, name, selected):
+        """
+        Returns the catalog cache entry name for a sparse fieldset
+        """
+        if selected is None:
+            return name
+        return f"{name}?fields={','.join(selected)}"
 
 class UserSignupView(APIView):
 
-    @extend_schema(exclude=True)
     def post(self, request):
         """
         Handles POST requests to create a new user in the database
@@ -171,10 +149,9 @@ class UserSignupView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class PingView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
-    @extend_schema(exclude=True)
     def get(self, request, format=None):
         """ 
         Handles GET requests to send a test ping to the server
@@ -184,155 +161,262 @@ class PingView(APIView):
         }
         return Response(content, status=status.HTTP_200_OK)
     
-class OrderViewSet(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
+class MetricsView(APIView):
+    """
+    Request metrics of this process in the Prometheus text format, for a scraper
     """
-    View to create and get orders from the Brew Ha Ha database
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+    
+    def get(self, request, format=None):
+        """
+        Handles GET requests to get the request metrics, cache counters and order queue depth
+        """
+        cache_stats = catalog_cache.stats()
+        gauges = [
+            ('brew_catalog_cache_hits_total', 'counter', 'Catalog lookups served from the cache', cache_stats['hits']),
+            ('brew_catalog_cache_misses_total', 'counter', 'Catalog lookups that were rebuilt', cache_stats['misses']),
+            ('brew_password_hash_rejected_total', 'counter', 'Password hashes rejected because the hashing pool was full', hashing_pool.rejected),
+            ('brew_order_queue_depth', 'gauge', 'Orders waiting to be processed', Order.objects.filter(status=Order.IN_PROGRESS).count()),
+        ]
+        return HttpResponse(request_metrics.render(gauges), content_type=self.content_type)
+    
+class SalesView(APIView):
     """
+    Units sold and revenue in a date range, per day or per product, from the DailySales rollup
     
-    authentication_classes = [JWTAuthentication]
+    The rollup has one row per product per day, so the cost of a report depends on the
+    number of days and products in it, not on the number of orders.
+    """
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
-    pagination_class = None
-    serializer_class = OrderSerializer
-    queryset = Order.objects.all()
+    def get(self, request, format=None):
+        """
+        Handles GET requests to get a sales report
+        """
+        query = SalesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        
+        sales = DailySales.objects.filter(day__gte=params['start'], day__lte=params['end'])
+        if 'product_id' in params:
+            sales = sales.filter(product_id=params['product_id'])
+        
+        if params['group_by'] == 'day':
+            rows = [
+                {'day': row['day'], 'units': row['sold'], 'revenue': row['sales']}
+                for row in sales.values('day').annotate(sold=Sum('units'), sales=Sum('revenue')).order_by('day')
+            ]
+        else:
+            grouped = sales.values('product_id', 'product__product_name').annotate(sold=Sum('units'), sales=Sum('revenue')).order_by('-sales', 'product_id')
+            rows = [
+                {'product_id': row['product_id'], 'product_name': row['product__product_name'], 'units': row['sold'], 'revenue': row['sales']}
+                for row in (grouped[:params['top']] if 'top' in params else grouped)
+            ]
+        
+        if 'top' in params:
+            # The rows left out still count towards the totals
+            totals = sales.aggregate(units=Sum('units'), revenue=Sum('revenue'))
+        else:
+            totals = {'units': sum(row['units'] for row in rows), 'revenue': sum(row['revenue'] for row in rows)}
+        report = {
+            'start': params['start'],
+            'end': params['end'],
+            'group_by': params['group_by'],
+            'currency': Order.CURRENCY,
+            'units': totals['units'] or 0,
+            'revenue': totals['revenue'] or 0,
+            'results': rows,
+        }
+        return Response(SalesReportSerializer(report).data)
     
-    @extend_schema(
-        operation_id="retrieve_orders",
-        description="Returns a single order from the database",
-        responses={
-            200: OrderSerializer,
-            400: BadRequestSerializer,
-            401: UnauthorizedSerializer,
-            404: NotFoundSerializer
-        },
-        examples=[
-            OpenApiExample(
-                name="Successful Response",
-                description="",
-                value=[
-                    {
-                        "id": "13",
-                        "payment_method": "Credit",
-                        "order_date": "2025-01-11T03:17:47.746025Z",
-                        "status": "in progress",
-                        "order_items": [
-                            {
-                                "product_id": 2,
-                                "quantity": 1
-                            }
-                        ]
-                    },
-                ],
-                status_codes=["200"]
-            ),
-            OpenApiExample(
-                name="Bad Request",
-                description="",
-                value={"detail": "The request body could not be read properly."},
-                response_only=True,
-                status_codes=["400"],
-            ),
-            OpenApiExample(
-                name="Unauthorized",
-                description="",
-                value={"detail": "Authentication credentials were not provided."},
-                response_only=True,
-                status_codes=["401"],
-            ),
-            OpenApiExample(
-                name="Not Found",
-                description="",
-                value={"detail": "No product matches the given query."},
-                response_only=True,
-                status_codes=["404"],
-            ),
-        ]
+class SchemaView(View):
+    """
+    Serves the OpenAPI schema from memory, as YAML or with `?format=json` or an
+    `Accept: application/json` header as JSON, gzipped for clients that accept it.
+    
+    The schema is generated once per process. Responses have a strong ETag, so clients
+    revalidate with a 304. The Content-Location header gives the URL of this exact
+    schema version, which is cached for a year because its content never changes.
+    """
+    max_age = 300
+    versioned_max_age = 31536000
+    accepts_gzip = re.compile(r"\bgzip\b")
+    
+    def get(self, request):
+        artifact = schema_store.get()
+        schema_format = request.GET.get('format') or ('json' if 'json' in request.headers.get('Accept', '') else 'yaml')
+        if schema_format not in artifact.content_types:
+            return HttpResponse(f"Unknown format '{schema_format}', use yaml or json.", status=status.HTTP_400_BAD_REQUEST, content_type='text/plain')
+        encoding = 'gzip' if self.accepts_gzip.search(request.headers.get('Accept-Encoding', '')) else 'identity'
+        
+        etag = artifact.etags[schema_format, encoding]
+        versioned = request.GET.get('v') == artifact.version
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={self.versioned_max_age}, immutable' if versioned else f'public, max-age={self.max_age}',
+            'Content-Location': f'{request.path}?format={schema_format}&v={artifact.version}',
+            'Vary': 'Accept, Accept-Encoding',
+        }
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        if encoding == 'gzip':
+            headers['Content-Encoding'] = 'gzip'
+        return HttpResponse(artifact.bodies[schema_format, encoding], content_type=artifact.content_types[schema_format], headers=headers)
+    
+class OrderViewSet(SparseFieldsetViewMixin, CreateModelMixin, ListModelMixin, RetrieveModelMixin, GenericViewSet):
+    """
+    View to create, list and get orders from the Brew Ha Ha database
+    """
+    
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    
+    pagination_class = KeysetPagination
+    serializer_class = OrderSerializer
+    # Load the items and their products up front so reads take a fixed number of queries
+    queryset = Order.objects.prefetch_related(
+        Prefetch('order_items', queryset=OrderItem.objects.select_related('product'))
     )
+    # Items are prefetched separately, so they need no column on the order itself
+    sparse_field_columns = {'order_items': []}
+    # Largest number of orders accepted by one bulk request
+    bulk_max_orders = 500
+    bulk_modes = ['all-or-nothing', 'partial']
+    
+    def list(self, request):
+        """
+        Handles GET requests to list orders in the Brew Ha Ha database
+        """
+        selected = self.get_sparse_fields()
+        # The cursor needs the order date even when it is not returned
+        queryset = self.only_columns(self.filter_orders(self.get_queryset()), selected and [*selected, 'order_date'])
+        if selected is not None and 'order_items' not in selected:
+            queryset = queryset.prefetch_related(None)
+        
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_sparse_serializer_class(selected)(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    def filter_orders(self, queryset):
+        """
+        Applies the status, payment_method and order date range filters
+        
+        Raises:
+            ValidationError: If a date filter is not a valid date or date and time
+        """
+        params = self.request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        if params.get('payment_method'):
+            queryset = queryset.filter(payment_method=params['payment_method'])
+        if params.get('order_date_after'):
+            queryset = queryset.filter(order_date__gte=self.parse_order_date('order_date_after'))
+        if params.get('order_date_before'):
+            queryset = queryset.filter(order_date__lt=self.parse_order_date('order_date_before'))
+        return queryset
+    
+    def parse_order_date(self, param):
+        """
+        Parses a date or date and time query parameter, in the current time zone when it has none
+        """
+        value = self.request.query_params[param]
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None and (date := parse_date(value)) is not None:
+                parsed = datetime.combine(date, time.min)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValidationError({param: "Enter a valid date or date and time, e.g. 2025-01-11 or 2025-01-11T03:17:47Z."})
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+    
     def retrieve(self, request, pk=None):
         """
         Handles GET requests to get a specific order from the database
         """
-        queryset = Order.objects.all()
-        user = get_object_or_404(queryset, pk=pk)
-        serializer = OrderSerializer(user)
+        selected = self.get_sparse_fields()
+        queryset = self.only_columns(self.get_queryset(), selected)
+        if selected is not None and 'order_items' not in selected:
+            queryset = queryset.prefetch_related(None)
+        
+        order = get_object_or_404(queryset, pk=pk)
+        serializer = self.get_sparse_serializer_class(selected)(order)
         return Response(serializer.data)  
     
-    @extend_schema(
-        operation_id="create_order",
-        description="Order available products from the database",
-        responses={
-            201: OrderSerializer,
-            400: BadRequestSerializer,
-            401: UnauthorizedSerializer,
-            404: NotFoundSerializer
-        },
-        examples=[
-            OpenApiExample(
-            name="Example Request",
-            description="Example of a request to create an order",
-            value={
-                "payment_method": "Credit",
-                "order_items": [
-                    {
-                        "product_id": 2,
-                        "quantity": 1,
-                    }
-                ]
-            },
-            request_only=True,  # Indicates this is for the request
-        ),
-            OpenApiExample(
-                name="Example response",
-                description="",
-                value=[
-                    {
-                        "id": 13,
-                        "payment_method": "Credit",
-                        "order_date": "2025-01-11T03:17:47.746025Z",
-                        "status": "in progress",
-                        "order_items": [
-                            {
-                                "product_id": 2,
-                                "quantity": 1,
-                            }
-                        ]
-                    },
-                ],
-                status_codes=["201"],
-                response_only=True
-            ),
-            OpenApiExample(
-                name="Bad Request",
-                description="",
-                value={"detail": "The request body could not be read properly."},
-                response_only=True,
-                status_codes=["400"],
-            ),
-            OpenApiExample(
-                name="Unauthorized",
-                description="",
-                value={"detail": "Authentication credentials were not provided."},
-                response_only=True,
-                status_codes=["401"],
-            ),
-            OpenApiExample(
-                name="Not Found",
-                description="",
-                value={"detail": "The requested resource was not found"},
-                response_only=True,
-                status_codes=["404"]
-            )
-        ]
-    )  
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         Handles POST requests to create an order in the Brew Ha Ha database
         """
         serializer = OrderSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            order = serializer.save()
+            # Reload the new order with its items and products instead of one lazy load per item
+            order = self.get_queryset().get(pk=order.pk)
+            return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    @idempotent
+    def bulk(self, request):
+        """
+        Handles POST requests to create several orders in the Brew Ha Ha database
+        """
+        mode = request.query_params.get('mode', 'all-or-nothing')
+        if mode not in self.bulk_modes:
+            return Response({"detail": f"mode must be one of: {', '.join(self.bulk_modes)}."}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(request.data, list) or not request.data:
+            return Response({"detail": "Provide a non-empty array of orders."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.bulk_max_orders:
+            return Response({"detail": f"A bulk request can contain at most {self.bulk_max_orders} orders."}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Look up every product in the batch once instead of once per order
+        known_product_ids = set(Product.objects.filter(id__in=self.bulk_product_ids(request.data)).values_list('id', flat=True))
+        serializers = [OrderSerializer(data=order_data, context={'known_product_ids': known_product_ids}) for order_data in request.data]
+        valid = [serializer.is_valid() for serializer in serializers]
+        results = [None if is_valid else {'errors': serializer.errors} for serializer, is_valid in zip(serializers, valid)]
+        
+        all_or_nothing = mode == 'all-or-nothing'
+        if all_or_nothing and not all(valid):
+            return Response([result or {} for result in results], status=status.HTTP_400_BAD_REQUEST)
+        
+        accepted = [index for index, is_valid in enumerate(valid) if is_valid]
+        try:
+            created = OrderSerializer.create_many([serializers[index].validated_data for index in accepted], all_or_nothing=all_or_nothing)
+        except BatchOutOfStock as error:
+            # Only the orders holding a product that is short are reported, like invalid orders above
+            return Response([
+                {'errors': {'non_field_errors': order_error.detail}} if order_error else {}
+                for order_error in error.order_errors
+            ], status=status.HTTP_400_BAD_REQUEST)
+        
+        for index, outcome in zip(accepted, created):
+            if isinstance(outcome, ValidationError):
+                results[index] = {'errors': {'non_field_errors': outcome.detail}}
+            else:
+                results[index] = {'id': outcome.id}
+        
+        any_created = any('id' in result for result in results)
+        return Response(results, status=status.HTTP_201_CREATED if any_created else status.HTTP_400_BAD_REQUEST)
     
-    
\ No newline at end of file
+    @staticmethod
+    def bulk_product_ids(orders_data):
+        """
+        Collects the product ids referenced by raw order data, ignoring malformed entries
+        
+        Ids are parsed by the serializer's own product_id field, so "1.0" is the product 1
+        here exactly as it is when the order is validated.
+        """
+        product_id_field = OrderSerializer().fields['order_items'].child.fields['product_id']
+        product_ids = set()
+        for order_data in orders_data:
+            order_items = order_data.get('order_items') if isinstance(order_data, dict) else None
+            for order_item in order_items if isinstance(order_items, list) else []:
+                try:
+                    product_ids.add(product_id_field.run_validation(order_item.get('product_id')))
+                except (AttributeError, ValidationError):
+                    pass
+        return product_ids